@@ -0,0 +1,44 @@
+import streamlit as st
+import auth
+import profiler
+import vendor
+
+# Single entry point: the login page until a vendor signs in, then the vendor
+# pages, all in this server process. launcher.py runs several of these
+# behind one port.
+SESSION_COOKIE="im_session"
+
+def set_session_cookie(token, max_age):
+    # Streamlit cannot set cookies itself; the browser sends this one with the
+    # websocket handshake of every new session, on whichever worker it lands
+    st.html(f"""<script>document.cookie = "{SESSION_COOKIE}={token}; Path=/; Max-Age={max_age}; SameSite=Strict"
+        + (location.protocol === "https:" ? "; Secure" : "");</script>""", unsafe_allow_javascript=True)
+
+# The token is kept in a cookie as well as session_state, so a browser the
+# launcher moves to another worker is still signed in there (the session
+# itself is in the shared cache)
+cookie_token=st.context.cookies.get(SESSION_COOKIE)
+if not isinstance(cookie_token, str):  # AppTest mocks st.context
+    cookie_token=None
+token=st.session_state.get("auth_token") or cookie_token
+user=auth.session_user(token)
+if user is not None:
+    st.session_state.auth_token=token
+    if cookie_token!=token:
+        set_session_cookie(token, int(auth.AUTH_SESSION_TTL))
+elif cookie_token:
+    st.session_state.pop("auth_token", None)
+    set_session_cookie("", 0)
+if user is not None and user.user_type=='vendor':
+    pages=vendor.vendor_pages()
+    with st.sidebar:
+        st.caption(f"signed in as {user.name}")
+        if st.button("logout"):
+            auth.logout(st.session_state.pop("auth_token"))
+            st.rerun()
+else:
+    pages=[st.Page(page="registerUser.py",title="login",icon=":material/login:")]
+
+pg=st.navigation(pages=pages)
+with profiler.rerun(pg.title):
+    pg.run()
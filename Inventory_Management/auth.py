@@ -0,0 +1,204 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+import cache
+import db
+
+# Login and registration. A login is one lookup on the unique users.email
+# index plus a salted scrypt check. Unknown emails are checked against a dummy
+# hash, so every failed login costs the same and does not reveal which emails
+# exist. Hashes are stored as "scrypt$n$r$p$salt$hash". AUTH_SCRYPT_N sets
+# the cost; a successful login with an older cost, or with a legacy plaintext
+# password, rewrites the stored hash with the current parameters. Successful
+# logins get a random session token; the session is cached in-process for
+# AUTH_SESSION_TTL seconds, so later reruns do not touch the database or
+# rehash. With a shared cache backend (see cache.py) sessions are kept there
+# instead, so every worker started by launcher.py knows every session.
+AUTH_SCRYPT_N = int(os.getenv("AUTH_SCRYPT_N", str(2 ** 14)))
+AUTH_SCRYPT_R = int(os.getenv("AUTH_SCRYPT_R", "8"))
+AUTH_SCRYPT_P = int(os.getenv("AUTH_SCRYPT_P", "1"))
+AUTH_SESSION_TTL = float(os.getenv("AUTH_SESSION_TTL", str(8 * 3600)))
+SALT_BYTES = 16
+HASH_BYTES = 32
+USER_TYPES = ("vendor", "customer")
+
+
+class EmailTaken(Exception):
+    pass
+
+
+class User:
+    __slots__ = ("id", "name", "email", "user_type")
+
+    def __init__(self, id, name, email, user_type):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.user_type = user_type
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    # maxmem above the 128 * n * r bytes scrypt needs, so higher costs work
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=HASH_BYTES,
+                          maxmem=256 * n * r * p + 2 ** 20)
+
+
+def hash_password(password, n=None, r=None, p=None):
+    n, r, p = n or AUTH_SCRYPT_N, r or AUTH_SCRYPT_R, p or AUTH_SCRYPT_P
+    salt = secrets.token_bytes(SALT_BYTES)
+    return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
+
+
+def verify_password(password, stored):
+    # Returns (matches, needs_rehash)
+    if not stored or not stored.startswith("scrypt$"):
+        # Legacy plaintext row: compare, and upgrade it on success
+        matches = hmac.compare_digest((stored or "").encode(), password.encode()) and bool(stored)
+        return matches, matches
+    _, n, r, p, salt, expected = stored.split("$")
+    n, r, p = int(n), int(r), int(p)
+    matches = hmac.compare_digest(_scrypt(password, _unb64(salt), n, r, p), _unb64(expected))
+    return matches, matches and (n, r, p) != (AUTH_SCRYPT_N, AUTH_SCRYPT_R, AUTH_SCRYPT_P)
+
+
+_dummy_hash = None
+
+
+def _dummy():
+    # Checked for unknown emails so they take as long as a wrong password
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(secrets.token_urlsafe(16))
+    return _dummy_hash
+
+
+def register(name, email, phone, password, user_type, company_name=None):
+    user_type = user_type.lower()
+    if user_type not in USER_TYPES:
+        raise ValueError(f"unknown user type: {user_type}")
+    if db.query_one("SELECT 1 FROM users WHERE email = %s", (email,)):
+        raise EmailTaken(f"{email} is already registered")
+    try:
+        user_id = db.insert("INSERT INTO users (name, email, phone, password, user_type, company_name) "
+                            "VALUES (%s, %s, %s, %s, %s, %s)",
+                            (name, email, phone, hash_password(password), user_type, company_name))
+    except Exception as e:
+        # Lost a race with another registration of the same email
+        if db.query_one("SELECT 1 FROM users WHERE email = %s", (email,)):
+            raise EmailTaken(f"{email} is already registered") from e
+        raise
+    return user_id
+
+
+def authenticate(email, password):
+    # The User on success, otherwise None
+    row = db.query_one("SELECT id, name, email, password, user_type FROM users WHERE email = %s", (email,))
+    if row is None:
+        verify_password(password, _dummy())
+        return None
+    user_id, name, email, stored, user_type = row
+    matches, needs_rehash = verify_password(password, stored)
+    if not matches:
+        return None
+    if needs_rehash:
+        # Only replaces the hash that was checked, so a concurrent password change wins
+        db.execute("UPDATE users SET password = %s WHERE id = %s AND password = %s",
+                   (hash_password(password), user_id, stored))
+    return User(user_id, name, email, user_type)
+
+
+class SessionStore:
+    def __init__(self, ttl=AUTH_SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = {}  # token -> (User, expires_at)
+        self._lock = threading.Lock()
+
+    def create(self, user):
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._sessions[token] = (user, time.monotonic() + self.ttl)
+            if len(self._sessions) % 1000 == 0:
+                self._purge()
+        return token
+
+    def get(self, token):
+        if not token:
+            return None
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._sessions[token]
+                return None
+            return entry[0]
+
+    def end(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def _purge(self):
+        now = time.monotonic()
+        for token in [token for token, (_, expires_at) in self._sessions.items() if expires_at <= now]:
+            del self._sessions[token]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+class SharedSessionStore:
+    # Same interface as SessionStore, backed by the shared cache file
+    NAMESPACE = "auth.session"
+
+    def __init__(self, backend, ttl=AUTH_SESSION_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    def create(self, user):
+        token = secrets.token_urlsafe(32)
+        self.backend.set(self.NAMESPACE, token, None, [user.id, user.name, user.email, user.user_type], self.ttl)
+        return token
+
+    def get(self, token):
+        if not token:
+            return None
+        entry = self.backend.get(self.NAMESPACE, token)
+        return User(*entry[1]) if entry is not None else None
+
+    def end(self, token):
+        self.backend.delete(self.NAMESPACE, token)
+
+    def __len__(self):
+        return self.backend.count(self.NAMESPACE)
+
+
+sessions = SharedSessionStore(cache.get_backend()) if cache.shared() else SessionStore()
+
+
+def login(email, password):
+    # (token, User) on success, otherwise None
+    user = authenticate(email, password)
+    if user is None:
+        return None
+    return sessions.create(user), user
+
+
+def session_user(token):
+    return sessions.get(token)
+
+
+def logout(token):
+    sessions.end(token)
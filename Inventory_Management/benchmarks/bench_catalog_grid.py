@@ -0,0 +1,117 @@
+import argparse
+import io
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, APP_DIR)
+
+from PIL import Image
+from streamlit.testing.v1 import AppTest
+import db
+import image_store
+
+# Render time of the catalog grid versus catalog size. "full" is the old
+# View Products loop (every product, every original image); "paged" is one
+# keyset page of thumbnails; "page" runs the whole product_catalog.py script.
+CATEGORIES = ["Food", "Electronics", "Toys", "Clothing", "Sports", "Books"]
+IMAGE_COUNT = 20
+
+
+def build_database(path, products):
+    rng = random.Random(7)
+    images = []
+    for i in range(IMAGE_COUNT):
+        out = io.BytesIO()
+        Image.new("RGB", (1200, 900), (rng.randint(0, 255), rng.randint(0, 255), i * 10)).save(out, "JPEG")
+        images.append(image_store.save_image(out.getvalue(), f"image{i}.jpeg"))
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE vendor_products (product_id INTEGER PRIMARY KEY, product_name VARCHAR(255) NOT NULL,
+            category VARCHAR(50), mrp DECIMAL(10, 2) NOT NULL, discount DECIMAL(5, 2), image VARCHAR(255),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP)
+    """)
+    conn.execute("CREATE INDEX idx_vendor_products_category ON vendor_products (category, product_id)")
+    conn.executemany("INSERT INTO vendor_products (product_name, category, mrp, discount, image) VALUES (?, ?, ?, ?, ?)",
+                     ((f"Product {i}", rng.choice(CATEGORIES), round(rng.uniform(5, 900), 2), 0, rng.choice(images))
+                      for i in range(1, products + 1)))
+    conn.commit()
+    conn.close()
+
+
+def full_grid():
+    import streamlit as st
+    import db
+
+    for idx, (product_name, product_image) in enumerate(db.query("SELECT product_name, image FROM vendor_products")):
+        if idx % 3 == 0:
+            cols = st.columns(3)
+        with cols[idx % 3]:
+            st.image(product_image)
+            st.write(f"**{product_name}**")
+
+
+def paged_grid():
+    import streamlit as st
+    import catalog
+    import image_store
+
+    products, has_next = catalog.product_page(0, catalog.CATALOG_PAGE_SIZE)
+    for idx, (product_id, product_name, product_image) in enumerate(products):
+        if idx % 3 == 0:
+            cols = st.columns(3)
+        with cols[idx % 3]:
+            st.image(image_store.thumbnail(product_image))
+            st.write(f"**{product_name}**")
+    st.button("Next", disabled=not has_next)
+
+
+def view_products(page_script):
+    app = AppTest.from_file(page_script, default_timeout=600)
+    app.session_state["catalog_section"] = "View Products"
+    return app
+
+
+def time_run(make_app, repeat):
+    make_app().run()  # warm up caches
+    timings = []
+    for _ in range(repeat):
+        app = make_app()
+        started = time.perf_counter()
+        app.run()
+        timings.append((time.perf_counter() - started) * 1000)
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark catalog grid render time against catalog size")
+    parser.add_argument("--products", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--full-limit", type=int, default=10000,
+                        help="skip the unpaginated grid above this many products")
+    args = parser.parse_args()
+
+    page_script = os.path.join(APP_DIR, "view", "product_catalog.py")
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)  # image paths are relative to the app directory
+        print(f"{'products':>9} {'full ms':>10} {'paged ms':>10} {'page ms':>10}")
+        for products in args.products:
+            path = os.path.join(workdir, f"catalog_{products}.db")
+            build_database(path, products)
+            db.set_pool(db.sqlite_pool(path))
+            full = (f"{time_run(lambda: AppTest.from_function(full_grid, default_timeout=600), args.repeat):>10.1f}"
+                    if products <= args.full_limit else f"{'-':>10}")
+            paged = time_run(lambda: AppTest.from_function(paged_grid, default_timeout=600), args.repeat)
+            page = time_run(lambda: view_products(page_script), args.repeat)
+            print(f"{products:>9} {full} {paged:>10.1f} {page:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, APP_DIR)
+
+import lazy
+
+# Cold start per page: a fresh Python process imports Streamlit (as a new
+# server process would), then renders the page once through AppTest.
+# Reported: time to first render, resident memory before and after it, and
+# the packages whose imports took longest during that first render (from
+# python -X importtime). Each page runs with LAZY_IMPORTS=0 (every heavy
+# import and client set up at load, as before lazy.py) and LAZY_IMPORTS=1.
+PAGES = {
+    "login": "app.py",
+    "dashboard": "view/dashboard.py",
+    "chatbot": "view/chatbot.py",
+    "inventory": "view/inventory.py",
+    "catalog": "view/product_catalog.py",
+}
+MARKER = "-- first render --"
+
+
+def rss_mb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_child(page):
+    from streamlit.testing.v1 import AppTest
+
+    before = rss_mb()
+    print(MARKER, file=sys.stderr, flush=True)
+    started = time.perf_counter()
+    app = AppTest.from_file(os.path.join(APP_DIR, PAGES[page]), default_timeout=600).run()
+    elapsed = (time.perf_counter() - started) * 1000
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    print(json.dumps({"ms": elapsed, "rss_before": before, "rss_after": rss_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first render and memory per page from a cold process")
+    parser.add_argument("--pages", nargs="+", default=list(PAGES), choices=list(PAGES))
+    parser.add_argument("--repeat", type=int, default=3, help="cold starts per page and mode; the median is shown")
+    parser.add_argument("--generate", type=int, default=200_000, metavar="SALES",
+                        help="synthetic sales for a SQLite stand-in; 0 uses the configured database")
+    parser.add_argument("--top", type=int, default=4, help="slowest imported packages to list")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.chdir(APP_DIR)
+    if args.child:
+        run_child(args.child)
+        return
+
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.generate:
+            path = os.path.join(workdir, "bench.db")
+            subprocess.run([sys.executable, os.path.join(APP_DIR, "benchmarks", "synthetic_data.py"), "--sqlite", path,
+                            "--sales", str(args.generate)], check=True, stdout=subprocess.DEVNULL)
+            env["DB_SQLITE_PATH"] = path
+        # Warm the file caches and the database-side state (summary table, snapshot) once
+        for page in args.pages:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--child", page], env=env,
+                           capture_output=True)
+        print(f"{'page':<10} {'lazy':>5} {'first render ms':>16} {'RSS before MB':>14} {'RSS after MB':>13}  "
+              f"slowest imports during first render (ms)")
+        for page in args.pages:
+            for mode in ["0", "1"]:
+                results = []
+                for _ in range(args.repeat):
+                    child = subprocess.run([sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child",
+                                            page], env=dict(env, LAZY_IMPORTS=mode), capture_output=True, text=True)
+                    if child.returncode != 0:
+                        sys.exit(f"{page} failed: {child.stderr.strip().splitlines()[-1]}")
+                    results.append((json.loads(child.stdout.strip().splitlines()[-1]), child.stderr))
+                results.sort(key=lambda result: result[0]["ms"])
+                stats, stderr = results[len(results) // 2]
+                packages = lazy.importtime_packages(stderr.split(MARKER, 1)[-1], args.top)
+                imports = ", ".join(f"{name} {ms:.0f}" for name, ms in packages)
+                print(f"{page:<10} {mode:>5} {stats['ms']:>16.0f} {stats['rss_before']:>14.0f} "
+                      f"{stats['rss_after']:>13.0f}  {imports}")
+
+
+if __name__ == "__main__":
+    main()
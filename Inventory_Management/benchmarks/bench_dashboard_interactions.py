@@ -0,0 +1,115 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, APP_DIR)
+
+from streamlit.testing.v1 import AppTest
+
+# Interaction latency of the sales dashboard, per control: one session changes
+# a control back and forth and each rerun is timed. "before" is the page at
+# --before (every control reruns the whole script, every query and chart);
+# "after" is the working tree page with per-chart fragments, memoized chart
+# data and cross-filtering. A click on a location or channel bar is driven
+# through the cross-filter state the click handler writes, since AppTest
+# cannot click Plotly charts. AppTest also always reruns the whole script,
+# so for "View sales by" (a fragment-only rerun in a browser) the "after"
+# column is an upper bound.
+PAGE = "view/dashboard.py"
+
+
+def sidebar(app, kind, label):
+    return next(widget for widget in getattr(app.sidebar, kind) if widget.label == label)
+
+
+def widget(app, kind, label):
+    return next(widget for widget in getattr(app, kind) if widget.label == label)
+
+
+def set_cross_filter(app, location=(), channel=()):
+    app.session_state["dashboard_cross_filter"] = {"location": list(location), "sale_channel": list(channel)}
+
+
+def controls(location, product, channel):
+    # name -> (change(app, step)); even steps set the value, odd steps set it back
+    return {
+        "Start Date": lambda app, step: sidebar(app, "date_input", "Start Date").set_value(
+            date(2023, 2, 1) if step % 2 == 0 else date(2023, 1, 1)),
+        "Select Location": lambda app, step: sidebar(app, "multiselect", "Select Location").set_value(
+            [location] if step % 2 == 0 else []),
+        "Select Product ID": lambda app, step: sidebar(app, "multiselect", "Select Product ID").set_value(
+            [product] if step % 2 == 0 else []),
+        "View sales by": lambda app, step: widget(app, "selectbox", "View sales by").set_value(
+            "Month" if step % 2 == 0 else "Day"),
+        "Click location": lambda app, step: set_cross_filter(app, location=[location] if step % 2 == 0 else []),
+        "Click channel": lambda app, step: set_cross_filter(app, channel=[channel] if step % 2 == 0 else []),
+    }
+
+
+def time_control(page, change, repeat):
+    app = AppTest.from_file(page, default_timeout=600).run()
+    timings = []
+    for step in range(repeat):
+        change(app, step)
+        started = time.perf_counter()
+        app.run()
+        timings.append((time.perf_counter() - started) * 1000)
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+    return statistics.median(timings)
+
+
+def page_at(revision, page, workdir):
+    source = subprocess.run(["git", "show", f"{revision}:./{page}"], cwd=APP_DIR, check=True,
+                            capture_output=True).stdout
+    path = os.path.join(workdir, page.replace("/", "_"))
+    with open(path, "wb") as f:
+        f.write(source)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard rerun latency per control, before and after fragments")
+    parser.add_argument("--before", help="git revision with the single-script dashboard (omit to time only the current page)")
+    parser.add_argument("--sources", nargs="+", default=["rollup", "sql"], choices=["rollup", "sql", "summary"],
+                        help="DASHBOARD_SOURCE values to time")
+    parser.add_argument("--repeat", type=int, default=6)
+    parser.add_argument("--generate", type=int, default=200_000, metavar="SALES",
+                        help="synthetic sales for a SQLite stand-in; 0 uses the configured database")
+    args = parser.parse_args()
+
+    os.chdir(APP_DIR)  # pages use paths relative to the app directory
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.generate:
+            path = os.path.join(workdir, "bench.db")
+            subprocess.run([sys.executable, os.path.join(APP_DIR, "benchmarks", "synthetic_data.py"), "--sqlite", path,
+                            "--sales", str(args.generate)], check=True, stdout=subprocess.DEVNULL)
+            os.environ["DB_SQLITE_PATH"] = path
+        import sales_queries
+
+        location = sales_queries.distinct_values("location")[0]
+        product = sales_queries.distinct_values("product_id")[0]
+        channel = sales_queries.distinct_values("sale_channel")[0]
+        old_page = page_at(args.before, PAGE, workdir) if args.before else None
+
+        print(f"{'source':<8} {'control':<18} {'before ms':>10} {'after ms':>10}")
+        for source in args.sources:
+            os.environ["DASHBOARD_SOURCE"] = source
+            AppTest.from_file(PAGE, default_timeout=600).run()  # warm up imports, rollups and forecasts
+            for name, change in controls(location, product, channel).items():
+                before = None
+                if old_page and not name.startswith("Click"):
+                    before = time_control(old_page, change, args.repeat)
+                after = time_control(PAGE, change, args.repeat)
+                before_text = f"{before:>10.1f}" if before is not None else f"{'-':>10}"
+                print(f"{source:<8} {name:<18} {before_text} {after:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
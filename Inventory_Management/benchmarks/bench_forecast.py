@@ -0,0 +1,69 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import forecasting
+
+# Fitting the demand models for many product x location series. "per-series"
+# calls forecasting.fit once per series (a Python loop over series, timed on
+# a sample and scaled up); "vectorized" fits every series in one batch;
+# "pool" splits the batch across forecasting.fit_parallel's process pool.
+# Also times folding one new day into all fitted states and checks the
+# forecasts against held-out days and a same-weekday-last-week baseline.
+
+
+def synthetic_series(series, days, seed):
+    rng = np.random.default_rng(seed)
+    t = np.arange(days)
+    base = rng.gamma(2.0, 10.0, (series, 1))
+    trend = rng.normal(0, 0.02, (series, 1)) * t
+    weekly = rng.uniform(0, 0.5, (series, 1)) * base * np.sin(2 * np.pi * (t + rng.integers(0, 7, (series, 1))) / 7)
+    return rng.poisson(np.maximum(base + trend + weekly, 0)).astype(float)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fitting demand forecasts for many series")
+    parser.add_argument("--series", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--holdout", type=int, default=28)
+    parser.add_argument("--sample", type=int, default=200, help="series timed one by one for the per-series loop")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    y = synthetic_series(args.series, args.days + args.holdout, seed=7)
+    history, future = y[:, :args.days], y[:, args.days:]
+    print(f"{args.series} series x {args.days} days, {len(forecasting.ALPHAS) * len(forecasting.BETAS) * len(forecasting.GAMMAS)} "
+          f"parameter combinations")
+
+    loop_seconds, _ = timed(lambda: [forecasting.fit(history[i:i + 1]) for i in range(min(args.sample, args.series))])
+    loop_seconds *= args.series / min(args.sample, args.series)
+    print(f"per-series loop: {loop_seconds:8.2f} s (from {min(args.sample, args.series)} series)")
+    vector_seconds, state = timed(lambda: forecasting.fit(history))
+    print(f"vectorized:      {vector_seconds:8.2f} s ({loop_seconds / vector_seconds:.0f}x)")
+    pool_seconds, pooled = timed(lambda: forecasting.fit_parallel(history, workers=args.workers))
+    same = all(np.allclose(state[name], pooled[name]) for name in state)
+    print(f"pool ({args.workers} workers): {pool_seconds:6.2f} s ({vector_seconds / pool_seconds:.1f}x vectorized, "
+          f"same result: {same})")
+
+    advance_seconds, _ = timed(lambda: forecasting.advance(state, future[:, :1], args.days))
+    print(f"fold in one new day for all series: {advance_seconds * 1000:.1f} ms")
+
+    forecast = forecasting.predict(state, args.days, args.holdout)
+    baseline = np.tile(history[:, -7:], (1, -(-args.holdout // 7)))[:, :args.holdout]
+    print(f"holdout MAE over {args.holdout} days: forecast {np.abs(forecast - future).mean():.2f}, "
+          f"same weekday last week {np.abs(baseline - future).mean():.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, APP_DIR)
+
+import db
+import sales_ingest
+import synthetic_data
+
+# Sustained sale ingestion into a SQLite stand-in, in events per second.
+# "per-row" is how point-of-sale feeds write today: every sale opens its own
+# connection and commits its own transaction (product check, insert, stock
+# decrement, ledger row). "service" runs sales_ingest.py in its own process
+# and drives it with --feeds client threads, each posting --per-request
+# events per request over one keep-alive connection. Each path runs for
+# --seconds; afterwards the sales count and the stock decrements are checked
+# against the events that were accepted.
+
+
+def build_database(path, products):
+    synthetic_data.create_sqlite(path)
+    db.set_pool(db.sqlite_pool(path))
+    synthetic_data.generate(users=10, products=products, sales=0)
+    # Plenty of stock, so every sale is accepted and the runs are comparable
+    db.execute("UPDATE product_stock SET quantity = 1000000000")
+
+
+def make_event(rng, products):
+    return {"product_id": rng.randint(1, products), "quantity": rng.choice([1, 1, 1, 2, 3]),
+            "location": rng.choice(list(synthetic_data.LOCATIONS)), "sale_channel": rng.choice(["Amazon", "NextGen"]),
+            "payment_type": "Card", "customer_age": rng.randint(18, 80), "customer_gender": "Female"}
+
+
+def per_row_writer(path):
+    def write(events):
+        for event in events:
+            conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                price = conn.execute("SELECT mrp FROM vendor_products WHERE product_id = ?",
+                                     (event["product_id"],)).fetchone()[0]
+                conn.execute("INSERT INTO sales (product_id, quantity, sale_amount, sale_date, location, customer_age, "
+                             "customer_gender, payment_type, sale_channel) "
+                             "VALUES (?, ?, ?, datetime('now'), ?, ?, ?, ?, ?)",
+                             (event["product_id"], event["quantity"], price * event["quantity"], event["location"],
+                              event["customer_age"], event["customer_gender"], event["payment_type"],
+                              event["sale_channel"]))
+                conn.execute("UPDATE product_stock SET quantity = quantity - ?, version = version + 1 "
+                             "WHERE product_id = ?", (event["quantity"], event["product_id"]))
+                conn.execute("INSERT INTO stock_movements (product_id, delta, reason) VALUES (?, ?, 'sale')",
+                             (event["product_id"], -event["quantity"]))
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+        return len(events)
+    return write
+
+
+def service_writer(url):
+    clients = threading.local()
+
+    def write(events):
+        if not hasattr(clients, "client"):
+            clients.client = sales_ingest.IngestClient(url)
+        return clients.client.send(events)["accepted"]
+    return write
+
+
+def run(label, write, feeds, per_request, seconds, products):
+    latencies, accepted = [], []
+    deadline = time.perf_counter() + seconds
+
+    def feed(seed):
+        rng = random.Random(seed)
+        count = 0
+        while time.perf_counter() < deadline:
+            events = [make_event(rng, products) for _ in range(per_request)]
+            started = time.perf_counter()
+            count += write(events)
+            latencies.append((time.perf_counter() - started) * 1000)
+        accepted.append(count)
+
+    threads = [threading.Thread(target=feed, args=(seed,)) for seed in range(feeds)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(f"{label:<28} {sum(accepted):>9} {sum(accepted) / elapsed:>10.0f} {statistics.median(latencies):>9.1f} "
+          f"{latencies[int(0.95 * (len(latencies) - 1))]:>9.1f}")
+    return sum(accepted)
+
+
+def check(path, expected_sales):
+    conn = sqlite3.connect(path)
+    sales, sold = conn.execute("SELECT COUNT(*), COALESCE(SUM(quantity), 0) FROM sales").fetchone()
+    stock, = conn.execute("SELECT SUM(1000000000 - quantity) FROM product_stock").fetchone()
+    ledger, = conn.execute("SELECT COALESCE(-SUM(delta), 0) FROM stock_movements WHERE reason = 'sale'").fetchone()
+    conn.close()
+    ok = sales == expected_sales and sold == stock == ledger
+    print(f"{'':<28} {sales} sales, {sold:.0f} units sold, stock down {stock}, ledger {ledger}: "
+          f"{'consistent' if ok else 'MISMATCH'}")
+
+
+def wait_for_service(url, process):
+    client = sales_ingest.IngestClient(url)
+    for _ in range(100):
+        if process.poll() is not None:
+            sys.exit("ingestion service exited")
+        try:
+            client.health()
+            return
+        except OSError:
+            time.sleep(0.1)
+    sys.exit("ingestion service did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sustained sale ingestion throughput")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--feeds", type=int, default=16, help="concurrent point-of-sale feeds")
+    parser.add_argument("--per-request", type=int, nargs="+", default=[1, 20], help="events per service request")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=sales_ingest.INGEST_BATCH_SIZE)
+    parser.add_argument("--max-delay-ms", type=float, default=sales_ingest.INGEST_MAX_DELAY_MS)
+    parser.add_argument("--port", type=int, default=8699)
+    args = parser.parse_args()
+
+    print(f"{'path':<28} {'events':>9} {'per s':>10} {'p50 ms':>9} {'p95 ms':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "per_row.db")
+        build_database(path, args.products)
+        check(path, run("per-row transactions", per_row_writer(path), args.feeds, 1, args.seconds, args.products))
+
+        for per_request in args.per_request:
+            path = os.path.join(workdir, f"service_{per_request}.db")
+            build_database(path, args.products)
+            url = f"http://127.0.0.1:{args.port}"
+            env = dict(os.environ, DB_SQLITE_PATH=path)
+            process = subprocess.Popen([sys.executable, os.path.join(APP_DIR, "sales_ingest.py"), "--port",
+                                        str(args.port), "--batch-size", str(args.batch_size), "--max-delay-ms",
+                                        str(args.max_delay_ms)], env=env, stdout=subprocess.DEVNULL)
+            try:
+                wait_for_service(url, process)
+                accepted = run(f"service, {per_request} per request", service_writer(url), args.feeds, per_request,
+                               args.seconds, args.products)
+                stats = sales_ingest.IngestClient(url).health()
+                print(f"{'':<28} {stats['batches']} batches, {stats['mean_batch']:.0f} events per batch, "
+                      f"{stats['write_ms'] / max(stats['batches'], 1):.1f} ms per batch write")
+            finally:
+                process.terminate()
+                process.wait()
+            check(path, accepted)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, APP_DIR)
+
+from streamlit.testing.v1 import AppTest
+
+# Rerun time per section of the inventory and catalog pages. "before" runs
+# the page as it was at --before (all st.tabs bodies execute on every rerun,
+# whichever tab is showing); "after" runs the working tree page with the
+# section selected, so only that section's queries and charts run.
+# Uses whatever database db.py is configured for (DB_SQLITE_PATH for a stand-in).
+PAGES = {
+    "view/inventory.py": ("inventory_section", ["Add Stock", "Update Stock", "View Stocks"]),
+    "view/product_catalog.py": ("catalog_section", ["Add Products", "Remove Products", "Update Products",
+                                                   "View Products", "Bulk Import/Export"]),
+}
+
+
+def time_runs(make_app, repeat):
+    make_app().run()  # warm up imports and caches
+    timings = []
+    for _ in range(repeat):
+        app = make_app()
+        started = time.perf_counter()
+        app.run()
+        timings.append((time.perf_counter() - started) * 1000)
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+    return statistics.median(timings)
+
+
+def page_at(revision, page, workdir):
+    source = subprocess.run(["git", "show", f"{revision}:./{page}"], cwd=APP_DIR, check=True,
+                            capture_output=True).stdout
+    path = os.path.join(workdir, page.replace("/", "_"))
+    with open(path, "wb") as f:
+        f.write(source)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark eager tabs against lazily rendered page sections")
+    parser.add_argument("--before", help="git revision with the eager st.tabs pages (omit to time only the current pages)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(APP_DIR)  # pages use paths relative to the app directory
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'page':<24} {'section':<20} {'before ms':>10} {'after ms':>10}")
+        for page, (key, sections) in PAGES.items():
+            before = None
+            if args.before:
+                old_page = page_at(args.before, page, workdir)
+                before = time_runs(lambda: AppTest.from_file(old_page, default_timeout=600), args.repeat)
+
+            for section in sections:
+                def make_app():
+                    app = AppTest.from_file(os.path.join(APP_DIR, page), default_timeout=600)
+                    app.session_state[key] = section
+                    return app
+
+                after = time_runs(make_app, args.repeat)
+                before_text = f"{before:>10.1f}" if before is not None else f"{'-':>10}"
+                print(f"{page:<24} {section:<20} {before_text} {after:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
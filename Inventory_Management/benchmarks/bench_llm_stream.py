@@ -0,0 +1,66 @@
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import llm_backend
+
+# Offline latency/throughput of the streaming chat path using the stub
+# backend: time to first chunk, full reply time and aggregate chunks/second
+# across concurrent sessions, each carrying a token-budgeted history.
+
+
+def run_session(backend, prompts, results):
+    history = llm_backend.ChatHistory()
+    for prompt in prompts:
+        started = time.perf_counter()
+        first = None
+        chunks = []
+        for chunk in llm_backend.stream_reply(backend, history, prompt):
+            if first is None:
+                first = time.perf_counter() - started
+            chunks.append(chunk)
+        results.append((first, time.perf_counter() - started, len(chunks)))
+        history.add("user", prompt)
+        history.add("assistant", "".join(chunks))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streamed chat replies with the stub backend")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    args = parser.parse_args()
+
+    backend = llm_backend.StubBackend(args.first_token_delay, args.token_delay, args.reply_tokens)
+    print(f"{'sessions':>8} {'ttft p50 ms':>12} {'ttft p95 ms':>12} {'reply p50 ms':>13} {'chunks/s':>10}")
+    for sessions in args.sessions:
+        results = []
+        threads = [threading.Thread(target=run_session,
+                                    args=(backend, [f"session {s} question {t}" for t in range(args.turns)], results))
+                   for s in range(sessions)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+        first = [r[0] * 1000 for r in results]
+        total = [r[1] * 1000 for r in results]
+        print(f"{sessions:>8} {percentile(first, 50):>12.1f} {percentile(first, 95):>12.1f} "
+              f"{statistics.median(total):>13.1f} {sum(r[2] for r in results) / wall:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import auth
+import db
+
+# Concurrent logins against a large users table. "scan" is the old
+# registerUser.py path: SELECT every email, look for a match in Python, then
+# a second query and a plaintext comparison. "indexed" is auth.authenticate
+# (one lookup on the unique email index plus a scrypt check) at each
+# --costs value. "session" is auth.session_user for already signed-in
+# sessions, i.e. what a rerun costs after login. Every user shares one
+# password hash, since hashing a million distinct salts would take hours and
+# does not change the per-login cost.
+
+
+def build_database(path, users, password, cost):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR(50) NOT NULL, email VARCHAR(100) UNIQUE,
+            phone VARCHAR(15), password VARCHAR(255), user_type VARCHAR(10) NOT NULL, company_name VARCHAR(100),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP);
+    """)
+    stored = auth.hash_password(password, n=cost)
+    conn.executemany("INSERT INTO users (name, email, password, user_type) VALUES (?, ?, ?, 'vendor')",
+                     ((f"User {i}", f"user{i}@example.com", stored) for i in range(1, users + 1)))
+    conn.commit()
+    conn.close()
+    return stored
+
+
+def scan_login(email, password):
+    emails = db.query("SELECT email FROM users")
+    if not any(row[0] == email for row in emails):
+        return None
+    name, stored, user_type = db.query_one("SELECT name, password, user_type FROM users WHERE email = %s", (email,))
+    return name if stored == password else None
+
+
+def run(label, login, threads, logins_per_thread, users):
+    latencies, failures = [], []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(logins_per_thread):
+            started = time.perf_counter()
+            if login(f"user{rng.randint(1, users)}@example.com") is None:
+                failures.append(1)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(f"{label:<22} {len(latencies):>7} {len(latencies) / elapsed:>10.1f} {statistics.median(latencies):>9.2f} "
+          f"{latencies[int(0.95 * (len(latencies) - 1))]:>9.2f} {len(failures):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent login throughput against a large users table")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=50, help="per thread, for the indexed path")
+    parser.add_argument("--scan-logins", type=int, default=2, help="per thread, for the old full-scan path")
+    parser.add_argument("--costs", type=int, nargs="+", default=[2 ** 12, 2 ** 14], help="scrypt n values")
+    args = parser.parse_args()
+
+    password = "correct horse"
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'path':<22} {'logins':>7} {'per s':>10} {'p50 ms':>9} {'p95 ms':>9} {'failed':>7}")
+        for index, cost in enumerate(args.costs):
+            path = os.path.join(workdir, f"users{index}.db")
+            stored = build_database(path, args.users, password, cost)
+            db.set_pool(db.sqlite_pool(path, size=args.threads))
+            auth.AUTH_SCRYPT_N = cost  # stored hashes are current, so no rehash writes
+            if index == 0:
+                # The old table held plaintext, so the typed password equals the stored value
+                run("scan (old)", lambda email: scan_login(email, stored), args.threads, args.scan_logins,
+                    args.users)
+            run(f"indexed, n={cost}", lambda email: auth.authenticate(email, password), args.threads, args.logins,
+                args.users)
+        tokens = [auth.sessions.create(auth.User(i, f"User {i}", f"user{i}@example.com", "vendor"))
+                  for i in range(1, 10_001)]
+        run("session cache", lambda email: auth.session_user(tokens[hash(email) % len(tokens)]), args.threads,
+            args.logins * 1000, args.users)
+
+
+if __name__ == "__main__":
+    main()
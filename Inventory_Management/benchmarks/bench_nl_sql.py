@@ -0,0 +1,87 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, APP_DIR)
+
+# Chatbot questions through nl_sql.py on a synthetic SQLite database: time to
+# translate, to plan (the EXPLAIN row-budget check), the first run and a
+# repeat from the result cache, and which table answered. Questions whose only
+# plan is a full scan over the row budget are rejected at planning time; for
+# those the time the unchecked scan would have taken is shown instead.
+QUESTIONS = [
+    "total sales",
+    "sales by location",
+    "top 5 products by revenue in march 2024",
+    "sales of product 7 since 2024-06-01",
+    "units sold in Dallas last month",
+    "monthly sales in Boston",
+    "sales by gender",
+    "average sale to women under 30 by payment type",
+    "how many sales were paid with PayPal in 2023",
+    "low stock items",
+    "stock by category",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of natural-language questions answered with SQL")
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--budget", type=int, default=500_000, help="NL_SQL_ROW_BUDGET for the run")
+    parser.add_argument("--source", choices=["mysql", "summary"], default="summary", help="CHATBOT_SOURCE")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "bench.db")
+        subprocess.run([sys.executable, os.path.join(APP_DIR, "benchmarks", "synthetic_data.py"), "--sqlite", path,
+                        "--sales", str(args.sales), "--products", str(args.products)], check=True,
+                       stdout=subprocess.DEVNULL)
+        os.environ.update(DB_SQLITE_PATH=path, CHATBOT_SOURCE=args.source, NL_SQL_ROW_BUDGET=str(args.budget))
+        import db
+        import nl_sql
+        import sales_summary
+
+        if args.source == "summary":
+            sales_summary.get_job()
+        print(f"{'question':<48} {'translate':>9} {'plan':>7} {'first':>8} {'cached':>7}  table / outcome (ms)")
+        for question in QUESTIONS:
+            started = time.perf_counter()
+            query, limit = nl_sql.translate(question)
+            translated = (time.perf_counter() - started) * 1000
+            planned = 0.0
+            outcome = None
+            for table, sql, params in query.candidates:
+                started = time.perf_counter()
+                try:
+                    nl_sql.check_plan(sql, params, nl_sql.check_read_only(sql))
+                    outcome = table
+                except nl_sql.QueryRejected:
+                    pass
+                planned += (time.perf_counter() - started) * 1000
+                if outcome:
+                    break
+            if outcome is None:
+                # What the rejected scan would have cost without the check
+                _, sql, params = query.candidates[-1]
+                started = time.perf_counter()
+                db.query(sql, params)
+                unchecked = (time.perf_counter() - started) * 1000
+                print(f"{question:<48} {translated:>9.1f} {planned:>7.1f} {'-':>8} {'-':>7}  "
+                      f"rejected (unchecked scan {unchecked:,.0f})")
+                continue
+            timings = []
+            for _ in range(2):
+                started = time.perf_counter()
+                nl_sql.answer(question)
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f"{question:<48} {translated:>9.1f} {planned:>7.1f} {timings[0]:>8.1f} {timings[1]:>7.1f}  {outcome}")
+        print(nl_sql.stats())
+
+
+if __name__ == "__main__":
+    main()
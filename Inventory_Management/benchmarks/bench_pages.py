@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, APP_DIR)
+
+# End-to-end load benchmark of the pages. Each scenario (a page, with a
+# section selected or a chat message sent) runs headlessly through
+# Streamlit's AppTest in its own process: one cold run, then --runs warm
+# reruns, as a long-lived server process would see them. Reported per
+# scenario: p50/p95 rerun latency, queries and rows per rerun from
+# db.query_stats(), and the process's peak RSS. Runs against the database
+# db.py is configured for, or a SQLite stand-in filled by synthetic_data.py
+# with --generate.
+CHAT_QUESTIONS = ["total sales", "sales by location", "sales by product", "sales by day", "sales by month",
+                  "sales by year", "hello"]
+SCENARIOS = {
+    "dashboard": ("view/dashboard.py", None, None),
+    **{f"inventory/{section}": ("view/inventory.py", ("inventory_section", section), None)
+       for section in ["Add Stock", "Update Stock", "View Stocks", "Reorder Alerts"]},
+    **{f"catalog/{section}": ("view/product_catalog.py", ("catalog_section", section), None)
+       for section in ["Add Products", "Remove Products", "Update Products", "View Products", "Bulk Import/Export"]},
+    **{f"chatbot/{question}": ("view/chatbot.py", None, question) for question in CHAT_QUESTIONS},
+}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def run_child(name, runs):
+    from streamlit.testing.v1 import AppTest
+    import db
+
+    page, section, question = SCENARIOS[name]
+
+    def query_totals():
+        stats = db.query_stats().values()
+        return sum(entry["calls"] for entry in stats), sum(entry["rows"] for entry in stats)
+
+    def rerun():
+        app = AppTest.from_file(os.path.join(APP_DIR, page), default_timeout=600)
+        if section:
+            app.session_state[section[0]] = section[1]
+        if question:
+            # The message is sent on the second run, as in the browser
+            app.run()
+            app.chat_input[0].set_value(question)
+        queries, rows = query_totals()
+        started = time.perf_counter()
+        app.run()
+        elapsed = (time.perf_counter() - started) * 1000
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+        after_queries, after_rows = query_totals()
+        return elapsed, after_queries - queries, after_rows - rows
+
+    cold = rerun()
+    warm = [rerun() for _ in range(runs)]
+    print(json.dumps({"cold_ms": cold[0], "cold_queries": cold[1],
+                      "latencies": [run[0] for run in warm], "queries": [run[1] for run in warm],
+                      "rows": [run[2] for run in warm], "peak_rss_mb": peak_rss_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless load benchmark of every page's data path")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), metavar="SCENARIO",
+                        help=f"any of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--runs", type=int, default=20, help="warm reruns per scenario")
+    parser.add_argument("--generate", type=int, metavar="SALES",
+                        help="fill a temporary SQLite stand-in with this many synthetic sales first")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.chdir(APP_DIR)  # pages use paths relative to the app directory
+    if args.child:
+        run_child(args.child, args.runs)
+        return
+
+    env = dict(os.environ)
+    env.setdefault("LLM_BACKEND", "stub")
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.generate is not None:
+            path = os.path.join(workdir, "bench.db")
+            subprocess.run([sys.executable, os.path.join(APP_DIR, "benchmarks", "synthetic_data.py"), "--sqlite", path,
+                            "--sales", str(args.generate), "--products", str(args.products),
+                            "--users", str(args.users)], check=True, stdout=subprocess.DEVNULL)
+            env["DB_SQLITE_PATH"] = path
+        print(f"{'scenario':<32} {'cold ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'rows':>9} {'peak MB':>8}")
+        for name in args.scenarios:
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, "--runs", str(args.runs)],
+                                    env=env, capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"{name:<32} failed: {result.stderr.strip().splitlines()[-1]}")
+                continue
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"{name:<32} {stats['cold_ms']:>8.0f} {percentile(stats['latencies'], 0.5):>8.1f} "
+                  f"{percentile(stats['latencies'], 0.95):>8.1f} {statistics.mean(stats['queries']):>8.1f} "
+                  f"{statistics.mean(stats['rows']):>9.0f} {stats['peak_rss_mb']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import db
+import reorder
+import stock_ledger
+
+# Cost of the reorder engine at catalog scale: the one-off load, an
+# incremental refresh after a burst of stock movements, and the at-risk and
+# reorder-list reads the inventory page makes. Data lives in a SQLite stand-in.
+
+
+def build_database(path, products, sales):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE vendor_products (product_id INTEGER PRIMARY KEY, product_name VARCHAR(255) NOT NULL);
+        CREATE TABLE product_stock (stock_id INTEGER PRIMARY KEY, product_id INT NOT NULL UNIQUE, quantity INT NOT NULL,
+            minimum_stock INT NOT NULL, maximum_stock INT NOT NULL, version INT NOT NULL DEFAULT 0);
+        CREATE TABLE stock_movements (movement_id INTEGER PRIMARY KEY, product_id INT NOT NULL, delta INT NOT NULL,
+            reason VARCHAR(50) NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE sales (sale_id INTEGER PRIMARY KEY, product_id INT, quantity DECIMAL(10, 2), sale_date DATETIME);
+        CREATE INDEX idx_sales_sale_date ON sales (sale_date);
+    """)
+    rng = random.Random(3)
+    conn.executemany("INSERT INTO vendor_products VALUES (?, ?)", ((i, f"Product {i}") for i in range(1, products + 1)))
+    conn.executemany("INSERT INTO product_stock (product_id, quantity, minimum_stock, maximum_stock) VALUES (?, ?, 20, 150)",
+                     ((i, rng.randint(0, 200)) for i in range(1, products + 1)))
+    now = datetime.now()
+    conn.executemany("INSERT INTO sales (product_id, quantity, sale_date) VALUES (?, ?, ?)",
+                     ((rng.randint(1, products), rng.randint(1, 5),
+                       (now - timedelta(minutes=rng.randint(0, 60 * 24 * 29))).strftime("%Y-%m-%d %H:%M:%S"))
+                      for _ in range(sales)))
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, repeat=1):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the reorder engine at catalog scale")
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--movements", type=int, default=1000, help="stock movements between refreshes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "reorder.db")
+        build_database(path, args.products, args.sales)
+        db.set_pool(db.sqlite_pool(path))
+        engine = reorder.ReorderEngine()
+
+        load_ms, _ = timed(lambda: engine.refresh(force=True))
+        print(f"initial load ({args.products} products, {args.sales} sales): {load_ms:.0f} ms")
+        print(f"  {engine.counts()}")
+
+        rng = random.Random(5)
+        refresh_timings = []
+        for _ in range(args.repeat):
+            stock_ledger.apply_movements([(rng.randint(1, args.products), rng.randint(1, 10), "bench")
+                                          for _ in range(args.movements)])
+            refresh_timings.append(timed(lambda: engine.refresh(force=True))[0])
+        print(f"incremental refresh after {args.movements} movements: {statistics.median(refresh_timings):.1f} ms")
+
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        sales_timings = []
+        for _ in range(args.repeat):
+            with db.transaction() as cur:
+                cur.executemany("INSERT INTO sales (product_id, quantity, sale_date) VALUES (%s, %s, %s)",
+                                [(rng.randint(1, args.products), rng.randint(1, 5), now) for _ in range(args.movements)])
+            sales_timings.append(timed(lambda: engine.refresh(force=True))[0])
+        print(f"incremental refresh after {args.movements} new sales: {statistics.median(sales_timings):.1f} ms")
+        at_risk_ms, rows = timed(lambda: engine.at_risk(limit=200), args.repeat)
+        print(f"at_risk(200): {at_risk_ms:.1f} ms ({len(rows)} rows)")
+        csv_ms, text = timed(engine.reorder_csv, args.repeat)
+        print(f"reorder_csv: {csv_ms:.0f} ms ({text.count(chr(10)) - 1} products)")
+        scan_ms, _ = timed(lambda: db.query("SELECT product_id, quantity, minimum_stock, maximum_stock FROM product_stock"),
+                           args.repeat)
+        print(f"for comparison, one full product_stock scan: {scan_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Compares the old fetchall -> DataFrame -> to_datetime path with the chunked
+# typed loader. Each measurement runs in a fresh process so peak RSS is not
+# polluted by the previous run. Data lives in a SQLite stand-in.
+LOCATIONS = ["Seattle, WA", "San Diego, CA", "Los Angeles, CA", "Chicago, IL", "New York, NY", "San Francisco, CA",
+             "Philadelphia, PA", "Dallas, TX", "Austin, TX", "Houston, TX", "Phoenix, AZ"]
+PAYMENT_TYPES = ["Credit Card", "Debit Card", "Cash", "PayPal"]
+CHANNELS = ["Amazon", "Flipkart", "NextGen"]
+
+
+def build_database(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE sales (sale_id INTEGER PRIMARY KEY, product_id INT, quantity DECIMAL(10, 2),
+            sale_amount DECIMAL(10, 2), sale_date DATETIME, location VARCHAR(100), customer_age INT,
+            customer_gender VARCHAR(6), payment_type VARCHAR(20), sale_channel VARCHAR(50))
+    """)
+    rng = random.Random(42)
+
+    def generate():
+        for sale_id in range(1, rows + 1):
+            yield (sale_id, rng.randint(1, 500), rng.randint(1, 5), round(rng.uniform(5, 5000), 2),
+                   f"202{rng.randint(2, 4)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 00:00:00",
+                   rng.choice(LOCATIONS), rng.randint(18, 70), rng.choice(["Male", "Female"]),
+                   rng.choice(PAYMENT_TYPES), rng.choice(CHANNELS))
+
+    conn.executemany("INSERT INTO sales VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", generate())
+    conn.commit()
+    conn.close()
+
+
+def run_child(method, chunk_size):
+    import pandas as pd
+    import db
+    import sales_loader
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if method == "fetchall":
+        data = db.query("SELECT * FROM sales")
+        df = pd.DataFrame(data, columns=sales_loader.SALES_COLUMNS)
+        df['sale_date'] = pd.to_datetime(df['sale_date'])
+        del data
+    else:
+        df = sales_loader.load_sales(chunk_size=chunk_size)
+    elapsed = time.perf_counter() - started
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "seconds": elapsed,
+        "peak_mb": (peak_rss - baseline_rss) / 1024,
+        "frame_mb": df.memory_usage(deep=True).sum() / 1024 / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sales loading paths")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--workdir", default=tempfile.gettempdir())
+    parser.add_argument("--child", choices=["fetchall", "streaming"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.chunk_size)
+        return
+
+    print(f"{'rows':>10} {'method':>10} {'seconds':>9} {'peak MB':>9} {'frame MB':>9}")
+    for rows in args.rows:
+        path = os.path.join(args.workdir, f"bench_sales_{rows}.db")
+        if not os.path.exists(path):
+            build_database(path, rows)
+        for method in ("fetchall", "streaming"):
+            env = dict(os.environ, DB_SQLITE_PATH=path)
+            output = subprocess.run([sys.executable, __file__, "--child", method, "--chunk-size", str(args.chunk_size)],
+                                    env=env, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{rows:>10} {method:>10} {result['seconds']:>9.2f} {result['peak_mb']:>9.1f} {result['frame_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
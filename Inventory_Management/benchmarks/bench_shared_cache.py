@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, APP_DIR)
+
+# What N worker processes cost the database when each warms its caches: the
+# sales rollup, every chatbot intent and the reference lists. With the
+# per-process cache every worker computes everything itself; with the shared
+# SQLite backend (CACHE_BACKEND=sqlite, as launcher.py sets up) one worker
+# computes each entry and the others load it. Workers start together, like a
+# cluster that has just been launched. Reported: rows read from the database
+# and queries across all workers, and the slowest worker's warm-up time.
+QUESTIONS = ["total sales", "sales by location", "sales by product", "sales by day", "sales by month",
+             "sales by year"]
+
+
+def run_child():
+    import chat_intents
+    import db
+    import reference_data
+    import sales_aggregates
+
+    started = time.perf_counter()
+    sales_aggregates.get_engine().refresh()
+    for question in QUESTIONS:
+        chat_intents.answer(question)
+    reference_data.products()
+    reference_data.stock_levels()
+    stats = db.query_stats().values()
+    print(json.dumps({"seconds": time.perf_counter() - started, "queries": sum(entry["calls"] for entry in stats),
+                      "rows": sum(entry["rows"] for entry in stats)}))
+
+
+def run_cluster(workers, env):
+    processes = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child"], env=env,
+                                  stdout=subprocess.PIPE, text=True) for _ in range(workers)]
+    results = [json.loads(process.communicate()[0].strip().splitlines()[-1]) for process in processes]
+    return (sum(result["rows"] for result in results), sum(result["queries"] for result in results),
+            max(result["seconds"] for result in results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database work of N workers warming per-process vs shared caches")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--sales", type=int, default=500_000)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child()
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "bench.db")
+        subprocess.run([sys.executable, os.path.join(APP_DIR, "benchmarks", "synthetic_data.py"), "--sqlite", path,
+                        "--sales", str(args.sales), "--products", str(args.products)], check=True,
+                       stdout=subprocess.DEVNULL)
+        print(f"{'cache':<10} {'workers':>8} {'rows read':>12} {'queries':>8} {'slowest s':>10}")
+        for workers in args.workers:
+            for backend in ["local", "sqlite"]:
+                cache_path = os.path.join(workdir, f"cache_{workers}.db")
+                env = dict(os.environ, DB_SQLITE_PATH=path, CACHE_BACKEND=backend, CACHE_SQLITE_PATH=cache_path,
+                           DASHBOARD_SOURCE="sql", CHATBOT_SOURCE="sql", LLM_BACKEND="stub")
+                rows, queries, slowest = run_cluster(workers, env)
+                print(f"{backend:<10} {workers:>8} {rows:>12,} {queries:>8} {slowest:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
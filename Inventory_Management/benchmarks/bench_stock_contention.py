@@ -0,0 +1,111 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import db
+import stock_ledger
+
+# Many threads adjusting the stock of a few hot products at once. "naive" is
+# the old read-then-write pattern (SELECT quantity, then UPDATE ... SET
+# quantity = <value computed in Python>); "ledger" is stock_ledger.adjust;
+# "batched" groups movements per thread with stock_ledger.apply_movements.
+# After each run the final quantities are compared with the starting stock
+# plus every delta that was applied, and with the sum of the ledger. "lost"
+# is the total absolute difference between expected and final quantities.
+INITIAL_QUANTITY = 1_000_000
+
+
+def build_database(path, products):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE product_stock (stock_id INTEGER PRIMARY KEY, product_id INT NOT NULL UNIQUE, quantity INT NOT NULL,
+            minimum_stock INT NOT NULL, maximum_stock INT NOT NULL, version INT NOT NULL DEFAULT 0);
+        CREATE TABLE stock_movements (movement_id INTEGER PRIMARY KEY, product_id INT NOT NULL, delta INT NOT NULL,
+            reason VARCHAR(50) NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP);
+    """)
+    conn.executemany("INSERT INTO product_stock (product_id, quantity, minimum_stock, maximum_stock) VALUES (?, ?, 0, 0)",
+                     [(product_id, INITIAL_QUANTITY) for product_id in range(1, products + 1)])
+    conn.commit()
+    conn.close()
+
+
+def naive_adjust(product_id, delta):
+    quantity = db.query_one("SELECT quantity FROM product_stock WHERE product_id = %s", (product_id,))[0]
+    db.execute("UPDATE product_stock SET quantity = %s WHERE product_id = %s", (quantity + delta, product_id))
+
+
+def worker(mode, seed, adjustments, products, batch_size, applied, failures):
+    rng = random.Random(seed)
+    movements = [(rng.randint(1, products), rng.choice([-3, -2, -1, 1, 2, 3, 5]), "bench") for _ in range(adjustments)]
+    batches = ([movements[start:start + batch_size] for start in range(0, len(movements), batch_size)]
+               if mode == "batched" else [[movement] for movement in movements])
+    totals = {}
+    for batch in batches:
+        try:
+            if mode == "batched":
+                stock_ledger.apply_movements(batch)
+            elif mode == "naive":
+                naive_adjust(batch[0][0], batch[0][1])
+            else:
+                stock_ledger.adjust(*batch[0])
+        except Exception:
+            # Only movements that were applied count towards the expected totals
+            failures.append(len(batch))
+            continue
+        for product_id, delta, _ in batch:
+            totals[product_id] = totals.get(product_id, 0) + delta
+    applied.append(totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent stock adjustments: lost updates and throughput")
+    parser.add_argument("--modes", nargs="+", choices=["naive", "ledger", "batched"], default=["naive", "ledger", "batched"])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--adjustments", type=int, default=500, help="per thread")
+    parser.add_argument("--products", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'mode':>8} {'movements':>10} {'failed':>7} {'seconds':>8} {'per s':>8} {'lost':>6} {'ledger ok':>10}")
+        for mode in args.modes:
+            path = os.path.join(workdir, f"{mode}.db")
+            build_database(path, args.products)
+            db.set_pool(db.sqlite_pool(path, size=args.threads))
+            applied, failures = [], []
+            threads = [threading.Thread(target=worker, args=(mode, seed, args.adjustments, args.products,
+                                                             args.batch_size, applied, failures))
+                       for seed in range(args.threads)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            expected = {product_id: INITIAL_QUANTITY for product_id in range(1, args.products + 1)}
+            for totals in applied:
+                for product_id, delta in totals.items():
+                    expected[product_id] += delta
+            actual = dict(db.query("SELECT product_id, quantity FROM product_stock"))
+            lost = sum(abs(expected[product_id] - actual[product_id]) for product_id in expected)
+            ledger = dict(db.query("SELECT product_id, SUM(delta) FROM stock_movements GROUP BY product_id"))
+            # The naive path writes no ledger
+            ledger_ok = "-" if mode == "naive" else str(all(INITIAL_QUANTITY + ledger.get(product_id, 0) == actual[product_id]
+                                                            for product_id in expected))
+            movements = args.threads * args.adjustments - sum(failures)
+            print(f"{mode:>8} {movements:>10} {sum(failures):>7} {elapsed:>8.2f} {movements / elapsed:>8.0f} "
+                  f"{lost:>6} {ledger_ok:>10}")
+
+
+if __name__ == "__main__":
+    main()
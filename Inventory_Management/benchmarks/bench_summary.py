@@ -0,0 +1,115 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import chat_intents
+import db
+import sales_queries
+import sales_summary
+
+# Raw sales versus sales_daily_summary at scale: the one-off summary build,
+# an incremental refresh after new sales, the chatbot's aggregates and a
+# filtered dashboard query against each table, and a full verify() pass. The
+# gain depends on how many sales share a day x location x product x channel
+# key, so the number of sales per summary row is printed too.
+LOCATIONS = ["Seattle, WA", "Dallas, TX", "Chicago, IL", "Boston, MA", "Denver, CO"]
+CHANNELS = ["Amazon", "Flipkart", "NextGen"]
+
+
+def sale_rows(count, products, seed):
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    for _ in range(count):
+        yield (rng.randint(1, products), rng.randint(1, 5), round(rng.uniform(5, 3000), 2),
+               (start + timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60))).strftime("%Y-%m-%d %H:%M:%S"),
+               rng.choice(LOCATIONS), rng.randint(18, 65), rng.choice(["Male", "Female"]), rng.choice(CHANNELS))
+
+
+def build_database(path, rows, products):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        PRAGMA journal_mode=WAL;
+        CREATE TABLE sales (sale_id INTEGER PRIMARY KEY, product_id INT, quantity DECIMAL(10, 2),
+            sale_amount DECIMAL(10, 2), sale_date DATETIME, location VARCHAR(100), customer_age INT,
+            customer_gender VARCHAR(10), sale_channel VARCHAR(50));
+        CREATE TABLE sales_daily_summary (sale_date DATE NOT NULL, location VARCHAR(100) NOT NULL,
+            product_id INT NOT NULL, sale_channel VARCHAR(50) NOT NULL, sale_amount DECIMAL(14, 2) NOT NULL,
+            quantity DECIMAL(14, 2) NOT NULL, sales_count INT NOT NULL,
+            PRIMARY KEY (sale_date, location, product_id, sale_channel));
+        CREATE TABLE summary_state (name VARCHAR(64) PRIMARY KEY, high_water_mark BIGINT NOT NULL);
+    """)
+    generated = sale_rows(rows, products, seed=1)
+    while True:
+        chunk = [row for _, row in zip(range(100_000), generated)]
+        if not chunk:
+            break
+        conn.executemany("""INSERT INTO sales (product_id, quantity, sale_amount, sale_date, location, customer_age,
+                            customer_gender, sale_channel) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", chunk)
+    conn.executescript("""
+        CREATE INDEX idx_sales_sale_date ON sales (sale_date);
+        CREATE INDEX idx_sales_location ON sales (location);
+        CREATE INDEX idx_sales_product_id ON sales (product_id);
+    """)
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, repeat=1):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sales summary table against raw sales")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--new", type=int, default=10_000, help="sales added before the incremental refresh")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "summary.db")
+        started = time.perf_counter()
+        build_database(path, args.rows, args.products)
+        print(f"generated {args.rows} sales in {time.perf_counter() - started:.0f}s")
+        db.set_pool(db.sqlite_pool(path))
+
+        build_ms = timed(sales_summary.refresh)
+        summary_rows = db.query_one(f"SELECT COUNT(*) FROM {sales_summary.SUMMARY_TABLE}")[0]
+        print(f"initial summary build: {build_ms / 1000:.1f}s ({summary_rows} summary rows, "
+              f"{args.rows / max(summary_rows, 1):.1f} sales per row)")
+        with db.transaction() as cur:
+            cur.executemany("""INSERT INTO sales (product_id, quantity, sale_amount, sale_date, location, customer_age,
+                               customer_gender, sale_channel) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+                            list(sale_rows(args.new, args.products, seed=2)))
+        print(f"incremental refresh after {args.new} new sales: {timed(sales_summary.refresh):.0f} ms")
+
+        print(f"{'query':>24} {'sales ms':>10} {'summary ms':>11} {'speedup':>8}")
+        for intent in chat_intents.INTENTS:
+            raw = timed(lambda: db.query(intent.sql.format(table="sales")), args.repeat)
+            summary = timed(lambda: db.query(intent.sql.format(table=sales_summary.SUMMARY_TABLE)), args.repeat)
+            print(f"{'chatbot ' + intent.name:>24} {raw:>10.0f} {summary:>11.1f} {raw / summary:>7.0f}x")
+        sales_filter = sales_queries.SalesFilter("2024-01-01", "2024-06-30", [LOCATIONS[0]])
+        raw = timed(lambda: sales_queries.totals_by(sales_filter, "product_id"), args.repeat)
+        summary = timed(lambda: sales_summary.totals_by(sales_filter, "product_id"), args.repeat)
+        print(f"{'dashboard by product':>24} {raw:>10.0f} {summary:>11.1f} {raw / summary:>7.0f}x")
+
+        started = time.perf_counter()
+        mismatches = sales_summary.verify()
+        print(f"verify: {'ok' if not mismatches else mismatches} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
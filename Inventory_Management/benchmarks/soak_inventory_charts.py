@@ -0,0 +1,102 @@
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Memory soak of the View Stocks figures over many reruns. "matplotlib" is
+# the old path (three plt.subplots figures rasterized to PNG per rerun and
+# never closed); "plotly" is stock_charts.stock_figures plus the JSON
+# serialization st.plotly_chart performs. Stock rows change every
+# --change-every reruns to exercise the per-version figure cache. Each mode
+# runs in its own process and reports resident memory at checkpoints.
+
+
+def resident_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Peak rather than current RSS where /proc is unavailable (KiB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def stock_rows(products, version):
+    rng = random.Random(version)
+    return [(f"Product {i}", rng.randint(0, 200), 20, 150) for i in range(1, products + 1)]
+
+
+def render_matplotlib(rows):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    df = pd.DataFrame(rows, columns=["Product Name", "Current Stock", "Minimum Stock", "Maximum Stock"])
+    pie_fig, pie_ax = plt.subplots(figsize=(8, 8))
+    pie_ax.pie(df["Current Stock"], labels=df["Product Name"], autopct='%1.1f%%', startangle=90)
+    line_fig, line_ax = plt.subplots(figsize=(10, 6))
+    df.plot(x='Product Name', y=['Current Stock', 'Minimum Stock', 'Maximum Stock'], ax=line_ax, marker='o')
+    hist_fig, hist_ax = plt.subplots(figsize=(10, 6))
+    hist_ax.hist(df["Current Stock"], bins=10, alpha=0.7, color='blue')
+    for fig in (pie_fig, line_fig, hist_fig):
+        fig.savefig(io.BytesIO(), format="png")  # what st.pyplot does
+
+
+def render_plotly(rows):
+    import stock_charts
+
+    for fig in stock_charts.stock_figures(rows).values():
+        fig.to_json()
+
+
+def run_child(mode, reruns, products, change_every, checkpoints):
+    render = render_matplotlib if mode == "matplotlib" else render_plotly
+    samples = []
+    started = time.perf_counter()
+    for rerun in range(1, reruns + 1):
+        render(stock_rows(products, rerun // change_every))
+        if rerun == 1 or rerun % max(1, reruns // checkpoints) == 0:
+            samples.append((rerun, round(resident_mb(), 1)))
+    print(json.dumps({"seconds": time.perf_counter() - started, "samples": samples}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak the inventory figures over many reruns and track memory")
+    parser.add_argument("--modes", nargs="+", choices=["matplotlib", "plotly"], default=["plotly", "matplotlib"])
+    parser.add_argument("--reruns", type=int, default=10000)
+    parser.add_argument("--products", type=int, default=40)
+    parser.add_argument("--change-every", type=int, default=100)
+    parser.add_argument("--checkpoints", type=int, default=10)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.reruns, args.products, args.change_every, args.checkpoints)
+        return
+
+    for mode in args.modes:
+        output = subprocess.run([sys.executable, __file__, "--child", mode, "--reruns", str(args.reruns),
+                                 "--products", str(args.products), "--change-every", str(args.change_every),
+                                 "--checkpoints", str(args.checkpoints)],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples = result["samples"]
+        growth = samples[-1][1] - samples[0][1]
+        print(f"{mode}: {args.reruns} reruns in {result['seconds']:.1f}s, "
+              f"RSS {samples[0][1]:.1f} MB -> {samples[-1][1]:.1f} MB (+{growth:.1f} MB)")
+        print("  " + "  ".join(f"{rerun}:{rss:.0f}" for rerun, rss in samples))
+
+
+if __name__ == "__main__":
+    main()
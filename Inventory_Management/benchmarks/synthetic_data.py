@@ -0,0 +1,202 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import db
+
+# Deterministic synthetic data for users, vendor_products, product_stock and
+# sales. The same seed, sizes and chunk size always give the same rows. Sales are
+# generated and inserted in chunks, each from its own seeded generator, so
+# memory stays flat at tens of millions of rows. Skew follows a real shop
+# rather than uniform noise:
+# - product popularity is Zipf-like, so a few products carry most sales;
+# - locations and channels have fixed unequal shares;
+# - volume grows over the period, with weekends and November/December busier;
+# - quantities are mostly 1 to 2, and amounts follow each product's price.
+# Writes through db.py, so it fills either MySQL (tables from the README must
+# exist) or a SQLite file created with create_sqlite().
+LOCATIONS = {
+    "New York, NY": 0.18, "Los Angeles, CA": 0.14, "Chicago, IL": 0.11, "Houston, TX": 0.09,
+    "Dallas, TX": 0.08, "Seattle, WA": 0.08, "Miami, FL": 0.07, "Boston, MA": 0.07,
+    "Denver, CO": 0.06, "Atlanta, GA": 0.05, "Portland, OR": 0.04, "Phoenix, AZ": 0.03,
+}
+CHANNELS = {"Amazon": 0.5, "Flipkart": 0.3, "NextGen": 0.2}
+PAYMENT_TYPES = {"Card": 0.55, "UPI": 0.2, "PayPal": 0.15, "Cash": 0.1}
+CATEGORIES = {"Electronics": 0.25, "Clothing": 0.3, "Books": 0.15, "Home": 0.2, "Toys": 0.1}
+PRICE_RANGES = {"Electronics": (50, 3000), "Clothing": (5, 200), "Books": (5, 60), "Home": (10, 800), "Toys": (5, 150)}
+END_DATE = date(2024, 12, 31)
+SQLITE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, name VARCHAR(50) NOT NULL, email VARCHAR(100) UNIQUE,
+        phone VARCHAR(15), password VARCHAR(100), user_type VARCHAR(10) NOT NULL, company_name VARCHAR(100),
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP);
+    CREATE TABLE IF NOT EXISTS vendor_products (product_id INTEGER PRIMARY KEY, product_name VARCHAR(255) NOT NULL,
+        category VARCHAR(50), mrp DECIMAL(10, 2) NOT NULL, discount DECIMAL(5, 2), image VARCHAR(255),
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT (STRFTIME('%Y-%m-%d %H:%M:%f', 'now')));
+    CREATE INDEX IF NOT EXISTS idx_vendor_products_category ON vendor_products (category, product_id);
+    CREATE INDEX IF NOT EXISTS idx_vendor_products_updated_at ON vendor_products (updated_at);
+    -- SQLite has no ON UPDATE CURRENT_TIMESTAMP
+    CREATE TRIGGER IF NOT EXISTS vendor_products_updated_at AFTER UPDATE ON vendor_products
+        WHEN NEW.updated_at IS OLD.updated_at
+    BEGIN
+        UPDATE vendor_products SET updated_at = STRFTIME('%Y-%m-%d %H:%M:%f', 'now') WHERE product_id = NEW.product_id;
+    END;
+    CREATE TABLE IF NOT EXISTS product_stock (stock_id INTEGER PRIMARY KEY, product_id INT NOT NULL UNIQUE,
+        quantity INT NOT NULL, minimum_stock INT NOT NULL, maximum_stock INT NOT NULL, version INT NOT NULL DEFAULT 0);
+    CREATE TABLE IF NOT EXISTS stock_movements (movement_id INTEGER PRIMARY KEY, product_id INT NOT NULL,
+        delta INT NOT NULL, reason VARCHAR(50) NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP);
+    CREATE INDEX IF NOT EXISTS idx_stock_movements_product_id ON stock_movements (product_id, movement_id);
+    CREATE TABLE IF NOT EXISTS sales (sale_id INTEGER PRIMARY KEY, product_id INT, quantity DECIMAL(10, 2),
+        sale_amount DECIMAL(10, 2), sale_date DATETIME, location VARCHAR(100), customer_age INT,
+        customer_gender VARCHAR(10), payment_type VARCHAR(20), sale_channel VARCHAR(50));
+    CREATE TABLE IF NOT EXISTS sales_daily_summary (sale_date DATE NOT NULL, location VARCHAR(100) NOT NULL,
+        product_id INT NOT NULL, sale_channel VARCHAR(50) NOT NULL, sale_amount DECIMAL(14, 2) NOT NULL,
+        quantity DECIMAL(14, 2) NOT NULL, sales_count INT NOT NULL,
+        PRIMARY KEY (sale_date, location, product_id, sale_channel));
+    CREATE TABLE IF NOT EXISTS summary_state (name VARCHAR(64) PRIMARY KEY, high_water_mark BIGINT NOT NULL);
+"""
+SALES_INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_sales_sale_date ON sales (sale_date);
+    CREATE INDEX IF NOT EXISTS idx_sales_location ON sales (location);
+    CREATE INDEX IF NOT EXISTS idx_sales_product_id ON sales (product_id);
+"""
+
+
+def _choice(rng, weights, size):
+    names = list(weights)
+    p = np.array(list(weights.values()), dtype=float)
+    return np.array(names, dtype=object)[rng.choice(len(names), size=size, p=p / p.sum())]
+
+
+def user_rows(count, seed=0):
+    rng = np.random.default_rng([seed, 1])
+    vendors = rng.random(count) < 0.2
+    return [(f"User {i}", f"user{i}@example.com", f"9{rng.integers(100000000, 999999999)}", f"password{i}",
+             "vendor" if vendor else "customer", f"Company {i % 97}" if vendor else None)
+            for i, vendor in enumerate(vendors, start=1)]
+
+
+def product_rows(count, seed=0):
+    rng = np.random.default_rng([seed, 2])
+    categories = _choice(rng, CATEGORIES, count)
+    rows = []
+    for product_id, category in enumerate(categories, start=1):
+        low, high = PRICE_RANGES[category]
+        # Log-uniform: cheap items are more common than expensive ones
+        mrp = round(float(np.exp(rng.uniform(np.log(low), np.log(high)))), 2)
+        discount = float(rng.choice([0, 0, 5, 10, 15, 25]))
+        rows.append((product_id, f"{category} item {product_id}", category, mrp, discount, None))
+    return rows
+
+
+def stock_rows(products, seed=0):
+    rng = np.random.default_rng([seed, 3])
+    minimum = rng.integers(5, 50, products)
+    maximum = minimum * rng.integers(3, 10, products)
+    # Most products sit between the levels; some have run low and a few are overstocked
+    quantity = (rng.uniform(0, 1.2, products) * maximum).astype(int)
+    return [(product_id, int(q), int(lo), int(hi))
+            for product_id, q, lo, hi in zip(range(1, products + 1), quantity, minimum, maximum)]
+
+
+def _day_weights(days):
+    calendar = [END_DATE - timedelta(days=days - 1 - offset) for offset in range(days)]
+    weights = np.array([
+        (1 + offset / days)  # volume doubles over the period
+        * (1.3 if day.weekday() >= 5 else 1.0)
+        * (1.5 if day.month in (11, 12) else 1.0)
+        for offset, day in enumerate(calendar)])
+    return calendar, weights / weights.sum()
+
+
+def sale_chunks(count, products, seed=0, chunk_size=100_000, days=730):
+    # Yields lists of sales rows (product_id, quantity, sale_amount, sale_date,
+    # location, customer_age, customer_gender, payment_type, sale_channel)
+    prices = np.array([mrp * (1 - discount / 100) for _, _, _, mrp, discount, _ in product_rows(products, seed)])
+    popularity = 1 / np.arange(1, products + 1) ** 1.1
+    # Popularity rank is independent of product_id
+    ranked = np.random.default_rng([seed, 4]).permutation(products) + 1
+    popularity /= popularity.sum()
+    calendar, day_weights = _day_weights(days)
+    for chunk, start in enumerate(range(0, count, chunk_size)):
+        size = min(chunk_size, count - start)
+        rng = np.random.default_rng([seed, 5, chunk])
+        product_ids = ranked[rng.choice(products, size=size, p=popularity)]
+        quantities = np.minimum(rng.geometric(0.6, size), 10)
+        amounts = np.round(quantities * prices[product_ids - 1] * rng.uniform(0.9, 1.0, size), 2)
+        day_index = rng.choice(days, size=size, p=day_weights)
+        seconds = rng.integers(0, 86400, size)
+        ages = np.clip(rng.normal(36, 12, size), 18, 80).astype(int)
+        genders = np.where(rng.random(size) < 0.52, "Female", "Male")
+        locations = _choice(rng, LOCATIONS, size)
+        channels = _choice(rng, CHANNELS, size)
+        payments = _choice(rng, PAYMENT_TYPES, size)
+        yield [(int(product_id), int(quantity), float(amount),
+                f"{calendar[day]} {second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}",
+                location, int(age), gender, payment, channel)
+               for product_id, quantity, amount, day, second, location, age, gender, payment, channel
+               in zip(product_ids, quantities, amounts, day_index, seconds, locations, ages, genders, payments,
+                      channels)]
+
+
+def create_sqlite(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(SQLITE_SCHEMA)
+    conn.close()
+
+
+def generate(users=1000, products=2000, sales=1_000_000, seed=0, chunk_size=100_000, progress=None):
+    with db.transaction() as cur:
+        cur.executemany("INSERT INTO users (name, email, phone, password, user_type, company_name) "
+                        "VALUES (%s, %s, %s, %s, %s, %s)", user_rows(users, seed))
+        cur.executemany("INSERT INTO vendor_products (product_id, product_name, category, mrp, discount, image) "
+                        "VALUES (%s, %s, %s, %s, %s, %s)", product_rows(products, seed))
+        cur.executemany("INSERT INTO product_stock (product_id, quantity, minimum_stock, maximum_stock) "
+                        "VALUES (%s, %s, %s, %s)", stock_rows(products, seed))
+    written = 0
+    for rows in sale_chunks(sales, products, seed, chunk_size):
+        with db.transaction() as cur:
+            cur.executemany("INSERT INTO sales (product_id, quantity, sale_amount, sale_date, location, customer_age, "
+                            "customer_gender, payment_type, sale_channel) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                            rows)
+        written += len(rows)
+        if progress:
+            progress(written)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the database with deterministic synthetic data")
+    parser.add_argument("--sqlite", help="create and fill this SQLite file instead of the database in db.py")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    if args.sqlite:
+        create_sqlite(args.sqlite)
+        db.set_pool(db.sqlite_pool(args.sqlite))
+    started = time.perf_counter()
+
+    def progress(written):
+        print(f"\r{written:,} / {args.sales:,} sales ({time.perf_counter() - started:.0f}s)", end="", flush=True)
+
+    generate(args.users, args.products, args.sales, args.seed, args.chunk_size, progress)
+    if args.sqlite:
+        # Indexes after the bulk load are cheaper than maintaining them row by row
+        with sqlite3.connect(args.sqlite) as conn:
+            conn.executescript(SALES_INDEXES)
+    print(f"\n{args.users} users, {args.products} products, {args.sales} sales in {time.perf_counter() - started:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import argparse
+import csv
+import io
+import math
+import os
+import sys
+import cache
+import db
+import stock_ledger
+
+# Bulk import/export of products and stock. Files are streamed in batches:
+# each batch is validated, then written with one executemany inside its own
+# transaction (mysql-connector turns that into a multi-row INSERT). A failing
+# batch is retried row by row so one bad row does not sink its neighbours.
+BATCH_SIZE = 1000
+INT_MAX = 2_147_483_647  # MySQL INT columns
+MRP_MAX = 99_999_999.99  # DECIMAL(10, 2)
+
+
+class Dataset:
+    def __init__(self, table, columns, export_columns, export_types, validate, write=None):
+        self.table = table
+        self.columns = columns
+        self.export_columns = export_columns
+        # "int", "float" or "str" per export column, for a stable Parquet schema
+        self.export_types = export_types
+        self.validate = validate
+        # write(cur, rows) inside the batch transaction; plain INSERTs by default
+        self.write = write or (lambda cur, rows: cur.executemany(self.insert_sql, rows))
+
+    @property
+    def insert_sql(self):
+        return "INSERT INTO {} ({}) VALUES ({})".format(self.table, ", ".join(self.columns),
+                                                        ", ".join(["%s"] * len(self.columns)))
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_written = 0
+        self.errors = []  # (row number, message); row 1 is the first data row
+
+    def error_csv(self):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["row", "error"])
+        writer.writerows(self.errors)
+        return out.getvalue()
+
+
+def _text(row, column, max_length, required=False):
+    value = row.get(column)
+    value = "" if value is None else str(value).strip()
+    if not value:
+        if required:
+            raise ValueError(f"{column} is required")
+        return None
+    if len(value) > max_length:
+        raise ValueError(f"{column} longer than {max_length} characters")
+    return value
+
+
+def _number(row, column, cast, minimum=None, maximum=None, default=None):
+    value = row.get(column)
+    if value is None or str(value).strip() == "":
+        if default is None:
+            raise ValueError(f"{column} is required")
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{column} must be a number")
+    # Rejects NaN, inf and overflowing values such as 1e999
+    if not math.isfinite(number):
+        raise ValueError(f"{column} must be a number")
+    if cast is int:
+        if number != int(number):
+            raise ValueError(f"{column} must be a whole number")
+        number = int(number)
+        maximum = INT_MAX if maximum is None else maximum
+    else:
+        number = cast(number)
+    if minimum is not None and number < minimum:
+        raise ValueError(f"{column} must be at least {minimum}")
+    if maximum is not None and number > maximum:
+        raise ValueError(f"{column} must be at most {maximum}")
+    return number
+
+
+def _validate_products(rows):
+    results = []
+    for row in rows:
+        try:
+            results.append((_text(row, "product_name", 255, required=True), _text(row, "category", 50),
+                            _number(row, "mrp", float, minimum=0, maximum=MRP_MAX), _number(row, "discount", float, 0, 100, 0.0),
+                            _text(row, "image", 255)))
+        except ValueError as e:
+            results.append(e)
+    return results
+
+
+def _validate_stock(rows):
+    parsed = []
+    for row in rows:
+        try:
+            values = (_number(row, "product_id", int, minimum=1), _number(row, "quantity", int, minimum=0),
+                      _number(row, "minimum_stock", int, minimum=0, default=0),
+                      _number(row, "maximum_stock", int, minimum=0, default=0))
+            if values[3] and values[2] > values[3]:
+                raise ValueError("minimum_stock is greater than maximum_stock")
+            parsed.append(values)
+        except ValueError as e:
+            parsed.append(e)
+    # One lookup per batch instead of one per row
+    product_ids = sorted({values[0] for values in parsed if not isinstance(values, ValueError)})
+    known = set()
+    if product_ids:
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        known = {row[0] for row in db.query(f"SELECT product_id FROM vendor_products WHERE product_id IN ({placeholders})",
+                                            tuple(product_ids))}
+    return [values if isinstance(values, ValueError) or values[0] in known
+            else ValueError(f"unknown product_id {values[0]}") for values in parsed]
+
+
+DATASETS = {
+    "products": Dataset("vendor_products", ["product_name", "category", "mrp", "discount", "image"],
+                        ["product_id", "product_name", "category", "mrp", "discount", "image", "created_at"],
+                        ["int", "str", "str", "float", "float", "str", "str"], _validate_products),
+    # Stock rows set each product's quantity and levels through the ledger
+    "stock": Dataset("product_stock", ["product_id", "quantity", "minimum_stock", "maximum_stock"],
+                     ["stock_id", "product_id", "quantity", "minimum_stock", "maximum_stock"],
+                     ["int", "int", "int", "int", "int"], _validate_stock, stock_ledger.import_stock),
+}
+
+
+def _file_format(source, file_format):
+    if file_format:
+        return file_format
+    name = source if isinstance(source, str) else getattr(source, "name", "")
+    return "parquet" if name.lower().endswith((".parquet", ".pq")) else "csv"
+
+
+def read_batches(source, file_format=None, batch_size=BATCH_SIZE):
+    # Yields lists of row dicts; source is a path or a binary file object
+    file_format = _file_format(source, file_format)
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=batch_size):
+            yield batch.to_pylist()
+        return
+    handle = open(source, "rb") if isinstance(source, str) else source
+    text = io.TextIOWrapper(handle, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        batch = []
+        for row in reader:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        # Detach so the caller's file object is left open
+        text.detach()
+        if isinstance(source, str):
+            handle.close()
+
+
+def _write_batch(dataset, rows, report):
+    try:
+        with db.transaction() as cur:
+            dataset.write(cur, [values for _, values in rows])
+        report.rows_written += len(rows)
+    except Exception:
+        for row_number, values in rows:
+            try:
+                with db.transaction() as cur:
+                    dataset.write(cur, [values])
+                report.rows_written += 1
+            except Exception as e:
+                report.errors.append((row_number, str(e)))
+
+
+def import_rows(kind, source, file_format=None, batch_size=BATCH_SIZE, progress=None):
+    dataset = DATASETS[kind]
+    report = ImportReport()
+    for batch in read_batches(source, file_format, batch_size):
+        first_row = report.rows_read + 1
+        valid = []
+        for offset, values in enumerate(dataset.validate(batch)):
+            if isinstance(values, ValueError):
+                report.errors.append((first_row + offset, str(values)))
+            else:
+                valid.append((first_row + offset, values))
+        report.rows_read += len(batch)
+        if valid:
+            _write_batch(dataset, valid, report)
+        if progress:
+            progress(report)
+    if report.rows_written:
+        cache.bump(dataset.table)
+    return report
+
+
+def export_rows(kind, target, file_format="csv", batch_size=BATCH_SIZE):
+    # Streams the table out chunk by chunk; target is a path or a binary file object
+    dataset = DATASETS[kind]
+    sql = f"SELECT {', '.join(dataset.export_columns)} FROM {dataset.table} ORDER BY {dataset.export_columns[0]}"
+    handle = open(target, "wb") if isinstance(target, str) else target
+    rows_written = 0
+    try:
+        with db.cursor() as cur:
+            cur.execute(sql)
+            if file_format == "parquet":
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                arrow_types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+                casts = {"int": int, "float": float, "str": str}
+                schema = pa.schema([(name, arrow_types[kind])
+                                    for name, kind in zip(dataset.export_columns, dataset.export_types)])
+                with pq.ParquetWriter(handle, schema) as writer:
+                    while True:
+                        rows = cur.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        arrays = [pa.array([None if v is None else casts[kind](v) for v in values], arrow_types[kind])
+                                  for kind, values in zip(dataset.export_types, zip(*rows))]
+                        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                        rows_written += len(rows)
+            else:
+                text = io.TextIOWrapper(handle, encoding="utf-8", newline="", write_through=True)
+                writer = csv.writer(text)
+                writer.writerow(dataset.export_columns)
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                    rows_written += len(rows)
+                text.detach()
+    finally:
+        if isinstance(target, str):
+            handle.close()
+    return rows_written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export products and stock")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="load rows from a CSV or Parquet file")
+    import_parser.add_argument("kind", choices=sorted(DATASETS))
+    import_parser.add_argument("path")
+    import_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    import_parser.add_argument("--errors", help="write the per-row error report to this CSV file")
+    export_parser = commands.add_parser("export", help="write all rows to a CSV or Parquet file")
+    export_parser.add_argument("kind", choices=sorted(DATASETS))
+    export_parser.add_argument("path")
+    export_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        def progress(report):
+            print(f"\rread {report.rows_read}  written {report.rows_written}  errors {len(report.errors)}",
+                  end="", file=sys.stderr)
+
+        report = import_rows(args.kind, args.path, batch_size=args.batch_size, progress=progress)
+        print(file=sys.stderr)
+        if args.errors and report.errors:
+            with open(args.errors, "w", newline="") as f:
+                f.write(report.error_csv())
+        return 1 if report.errors else 0
+
+    file_format = "parquet" if os.path.splitext(args.path)[1].lower() in (".parquet", ".pq") else "csv"
+    rows = export_rows(args.kind, args.path, file_format, args.batch_size)
+    print(f"exported {rows} rows to {args.path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,347 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, time as clock_time, timedelta
+from decimal import Decimal
+
+# Process-wide result caching. Entries expire after a TTL and are dropped as
+# soon as the data version they were computed against changes. Writers in
+# this process call bump(table), which is seen on the next lookup; a version
+# function can additionally poll the database for changes made elsewhere.
+#
+# With CACHE_BACKEND=sqlite, entries of named caches, table versions and
+# login sessions live in one SQLite file (CACHE_SQLITE_PATH) shared by every
+# worker process on the host, so launcher.py's workers compute each entry
+# once between them and see each other's bump()s. A missing entry is
+# computed by the worker that claims its lease; the others wait up to
+# CACHE_LEASE_SECONDS for the result instead of running the same query.
+# The file is private to the app's user and values are stored as JSON, so
+# nothing read back from it is ever executed.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")  # "local" or "sqlite"
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache",
+                                                                "inventory_cache.db"))
+CACHE_LEASE_SECONDS = float(os.getenv("CACHE_LEASE_SECONDS", "30"))
+WAIT_INTERVAL = 0.05  # seconds between checks while another worker computes
+PURGE_EVERY = 500  # writes between deletions of expired entries
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))  # per process and cache, least recently used go first
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entries (namespace TEXT NOT NULL, key TEXT NOT NULL, version BLOB,
+        expires_at REAL NOT NULL, value BLOB, PRIMARY KEY (namespace, key));
+    CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL);
+    CREATE TABLE IF NOT EXISTS leases (namespace TEXT NOT NULL, key TEXT NOT NULL, holder TEXT NOT NULL,
+        expires_at REAL NOT NULL, PRIMARY KEY (namespace, key));
+"""
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def _encode(value):
+    # JSON-ready form of a cached value; types JSON lacks are tagged with "$t"
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, tuple):
+        return {"$t": "tuple", "v": [_encode(item) for item in value]}
+    if isinstance(value, dict):
+        return {"$t": "dict", "v": [[_encode(k), _encode(v)] for k, v in value.items()]}
+    if isinstance(value, Decimal):
+        return {"$t": "decimal", "v": str(value)}
+    if isinstance(value, datetime):
+        return {"$t": "datetime", "v": value.isoformat()}
+    if isinstance(value, date):
+        return {"$t": "date", "v": value.isoformat()}
+    if isinstance(value, clock_time):
+        return {"$t": "time", "v": value.isoformat()}
+    if isinstance(value, timedelta):
+        return {"$t": "timedelta", "v": value.total_seconds()}
+    if isinstance(value, bytes):
+        return {"$t": "bytes", "v": base64.b64encode(value).decode()}
+    module = type(value).__module__
+    if module.startswith("pandas") and hasattr(value, "columns"):
+        # Arrow IPC keeps dtypes (datetimes, categoricals) and is plain data
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(value, preserve_index=True)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return {"$t": "frame", "v": base64.b64encode(sink.getvalue().to_pybytes()).decode()}
+    if module.startswith("plotly"):
+        return {"$t": "figure", "v": value.to_json()}
+    if module == "numpy" and hasattr(value, "item"):
+        return _encode(value.item())
+    raise TypeError(f"cannot store {type(value).__name__} in the shared cache")
+
+
+def _decode(value):
+    kind = value.get("$t")
+    data = value.get("v")
+    if kind == "tuple":
+        return tuple(data)
+    if kind == "dict":
+        return {k: v for k, v in data}
+    if kind == "decimal":
+        return Decimal(data)
+    if kind == "datetime":
+        return datetime.fromisoformat(data)
+    if kind == "date":
+        return date.fromisoformat(data)
+    if kind == "time":
+        return clock_time.fromisoformat(data)
+    if kind == "timedelta":
+        return timedelta(seconds=data)
+    if kind == "bytes":
+        return base64.b64decode(data)
+    if kind == "frame":
+        import pyarrow as pa
+
+        return pa.ipc.open_stream(base64.b64decode(data)).read_all().to_pandas()
+    if kind == "figure":
+        import plotly.io
+
+        return plotly.io.from_json(data)
+    return value
+
+
+def dumps(value):
+    return json.dumps(_encode(value), separators=(",", ":"))
+
+
+def loads(text):
+    return json.loads(text, object_hook=_decode)
+
+
+def _private_file(path):
+    # Creates the cache file (and its directory) readable only by this user,
+    # and refuses one that someone else owns or can write
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    for name in (directory, path):
+        info = os.stat(name)
+        if info.st_uid != os.getuid() or info.st_mode & 0o022:
+            raise PermissionError(f"{name} must be owned by this user and not writable by others")
+    os.chmod(path, 0o600)
+
+
+class SQLiteBackend:
+    # Key/value entries with wall-clock expiry, shared through one SQLite file.
+    # Values and versions are stored as tagged JSON (see dumps/loads).
+
+    def __init__(self, path=CACHE_SQLITE_PATH):
+        self.path = path
+        _private_file(path)
+        self._local = threading.local()
+        self._holder = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._writes = 0
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # a cache can lose its last writes on power loss
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key):
+        # (version, value), or None when missing or expired
+        row = self._conn().execute("SELECT version, value, expires_at FROM entries WHERE namespace = ? AND key = ?",
+                                   (namespace, key)).fetchone()
+        if row is None or row[2] <= time.time():
+            return None
+        return loads(row[0]), loads(row[1])
+
+    def set(self, namespace, key, version, value, ttl):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO entries (namespace, key, version, expires_at, value) VALUES (?, ?, ?, ?, ?)",
+                     (namespace, key, dumps(version), time.time() + ttl, dumps(value)))
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, namespace, key=None):
+        if key is None:
+            self._conn().execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+        else:
+            self._conn().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def count(self, namespace):
+        return self._conn().execute("SELECT COUNT(*) FROM entries WHERE namespace = ? AND expires_at > ?",
+                                    (namespace, time.time())).fetchone()[0]
+
+    def claim(self, namespace, key, seconds=CACHE_LEASE_SECONDS):
+        # True if this process now holds the lease; an expired lease can be taken over
+        now = time.time()
+        cur = self._conn().execute("""
+            INSERT INTO leases (namespace, key, holder, expires_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (namespace, key) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+            WHERE leases.expires_at <= ?
+        """, (namespace, key, self._holder, now + seconds, now))
+        return cur.rowcount == 1
+
+    def release(self, namespace, key):
+        self._conn().execute("DELETE FROM leases WHERE namespace = ? AND key = ? AND holder = ?",
+                             (namespace, key, self._holder))
+
+    def bump(self, table):
+        self._conn().execute("INSERT INTO versions (name, version) VALUES (?, 1) "
+                             "ON CONFLICT (name) DO UPDATE SET version = version + 1", (table,))
+
+    def versions(self, tables):
+        placeholders = ", ".join("?" * len(tables))
+        found = dict(self._conn().execute(f"SELECT name, version FROM versions WHERE name IN ({placeholders})",
+                                          tuple(tables)).fetchall())
+        return tuple(found.get(table, 0) for table in tables)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    # The shared backend, or None when caching is per process
+    global _backend
+    if CACHE_BACKEND != "sqlite":
+        return None
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = SQLiteBackend(CACHE_SQLITE_PATH)
+    return _backend
+
+
+def shared():
+    return get_backend() is not None
+
+
+def shared_compute(namespace, key, is_current, compute, ttl):
+    # Cluster-wide compute-once. Returns (version, value, hit): the shared entry
+    # if is_current(version), otherwise compute() -> (version, value), run by
+    # whichever worker claims the lease and published for the rest
+    backend = get_backend()
+    deadline = time.monotonic() + CACHE_LEASE_SECONDS
+    while True:
+        entry = backend.get(namespace, key)
+        if entry is not None and is_current(entry[0]):
+            return entry[0], entry[1], True
+        # A worker that died holding the lease only delays the others until it expires
+        if backend.claim(namespace, key) or time.monotonic() >= deadline:
+            break
+        time.sleep(WAIT_INTERVAL)
+    try:
+        version, value = compute()
+        backend.set(namespace, key, version, value, ttl)
+    finally:
+        backend.release(namespace, key)
+    return version, value, False
+
+
+def bump(table):
+    backend = get_backend()
+    if backend is not None:
+        backend.bump(table)
+        return
+    with _versions_lock:
+        _versions[table] = _versions.get(table, 0) + 1
+
+
+def local_version(*tables):
+    # Bumps made by this process, or by every worker with a shared backend
+    backend = get_backend()
+    if backend is not None:
+        return backend.versions(tables) if tables else ()
+    with _versions_lock:
+        return tuple(_versions.get(table, 0) for table in tables)
+
+
+class ResultCache:
+    def __init__(self, ttl=60, version=None, version_check_interval=5, tables=(), name=None,
+                 max_entries=CACHE_MAX_ENTRIES):
+        # Only named caches go to the shared backend; their keys are stored by repr()
+        self.ttl = ttl
+        self.name = name
+        self.version = version
+        self.tables = tables
+        self.version_check_interval = version_check_interval
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        self._version_token = None
+        self._version_checked_at = None
+
+    def _current_version(self):
+        # Local bumps are free to read, so they are checked on every lookup
+        local = local_version(*self.tables)
+        if self.version is None:
+            return local
+        now = time.monotonic()
+        # Polling the source on every lookup would cost as much as the query itself
+        if self._version_checked_at is None or now - self._version_checked_at >= self.version_check_interval:
+            self._version_token = self.version()
+            self._version_checked_at = now
+        return local, self._version_token
+
+    def get_or_compute(self, key, compute):
+        version = self._current_version()
+        if self.name is not None and shared():
+            _, value, hit = shared_compute(self.name, repr(key), lambda stored: stored == version,
+                                           lambda: (version, compute()), self.ttl)
+            with self._lock:
+                if hit:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            return value, hit
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and now - entry[1] < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[2], True
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._set(key, version, now, value)
+        return value, False
+
+    def _set(self, key, version, now, value):
+        # Entries that expired or were computed against an older version can never hit again
+        for stale in [k for k, entry in self._entries.items() if entry[0] != version or now - entry[1] >= self.ttl]:
+            del self._entries[stale]
+        self._entries[key] = (version, now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key=None):
+        if self.name is not None and shared():
+            get_backend().delete(self.name, None if key is None else repr(key))
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._version_checked_at = None
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        entries = get_backend().count(self.name) if self.name is not None and shared() else None
+        with self._lock:
+            lookups = self.hits + self.misses
+            if entries is None:
+                entries = len(self._entries)
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "evictions": self.evictions,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,45 @@
+import os
+import db
+
+# Keyset-paginated product listing for the catalog grid. Filters are pushed
+# into the WHERE clause and pages are read with "product_id > last seen id"
+# so every page costs the same no matter how deep the user has paged.
+# Category lookups use idx_vendor_products_category (category, product_id).
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "12"))
+PAGE_SIZES = sorted({6, 12, 24, 48, CATALOG_PAGE_SIZE})
+
+
+def _escape_like(text):
+    # "!" rather than backslash, which MySQL and SQLite treat differently in literals
+    return text.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def _where(category=None, search=""):
+    clauses, params = [], []
+    if category:
+        clauses.append("category = %s")
+        params.append(category)
+    if search.strip():
+        clauses.append("product_name LIKE %s ESCAPE '!'")
+        params.append(f"%{_escape_like(search.strip())}%")
+    return clauses, params
+
+
+def product_page(after_id=0, page_size=CATALOG_PAGE_SIZE, category=None, search=""):
+    # Returns (rows, has_next); rows are (product_id, product_name, image)
+    clauses, params = _where(category, search)
+    clauses.append("product_id > %s")
+    params.append(after_id)
+    rows = db.query(f"""
+        SELECT product_id, product_name, image FROM vendor_products
+        WHERE {" AND ".join(clauses)}
+        ORDER BY product_id
+        LIMIT %s
+    """, tuple(params) + (page_size + 1,))
+    return rows[:page_size], len(rows) > page_size
+
+
+def count_products(category=None, search=""):
+    clauses, params = _where(category, search)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return db.query_one(f"SELECT COUNT(*) FROM vendor_products {where}", tuple(params))[0]
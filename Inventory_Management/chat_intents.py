@@ -0,0 +1,138 @@
+import os
+import re
+import threading
+import time
+import pandas as pd
+import cache
+import db
+import lazy
+import sales_summary
+import snapshot
+
+# Table-driven router for the chatbot's sales questions. Every intent pairs a
+# pattern with a SQL template (or snapshot grouping) and a builder that turns
+# the result rows into a reply and optional figure. Results are cached across
+# sessions until the TTL expires or new sales arrive. {table} in a template is
+# sales, or sales_daily_summary with CHATBOT_SOURCE=summary.
+CHATBOT_SOURCE = os.getenv("CHATBOT_SOURCE", "mysql")  # "mysql", "summary" or "snapshot"
+INTENT_CACHE_TTL = float(os.getenv("INTENT_CACHE_TTL", "60"))
+FALLBACK_REPLY = "I can only answer questions related to 'total sales', 'sales by location', 'sales by product', or 'sales by day/month/year' for now."
+# Only needed to build a reply that is not cached yet
+px = lazy.module("plotly.express")
+
+
+class Intent:
+    def __init__(self, name, pattern, sql, group_by, build, params=()):
+        self.name = name
+        self.pattern = pattern
+        self.sql = sql
+        self.params = params
+        self.group_by = group_by
+        self.build = build
+
+
+def _total_reply(rows):
+    return f"Total sales amount is ${rows[0][0] or 0:,.2f}", None
+
+
+def _location_reply(rows):
+    response = "Sales by location:\n"
+    for row in rows:
+        response += f"- {row[0]}: ${row[1]:,.2f}\n"
+    df = pd.DataFrame(rows, columns=["Location", "Total Sales"])
+    return response, px.bar(df, x="Location", y="Total Sales", title="Sales by Location")
+
+
+def _product_reply(rows):
+    response = "Sales by product:\n"
+    for row in rows:
+        response += f"- Product {row[0]}: ${row[1]:,.2f}\n"
+    df = pd.DataFrame(rows, columns=["Product ID", "Total Sales"])
+    return response, px.bar(df, x="Product ID", y="Total Sales", title="Sales by Product")
+
+
+def _period_reply(label, column):
+    def build(rows):
+        df = pd.DataFrame(rows, columns=[column, "Total Sales"])
+        fig = px.line(df, x=column, y="Total Sales", title=f"Sales by {label}")
+        return f"Sales by {label.lower()} visualized below:", fig
+    return build
+
+
+# Earlier entries win when a question matches more than one intent
+INTENTS = [
+    Intent("total", r"total\s+sales",
+           "SELECT SUM(sale_amount) FROM {table}", None, _total_reply),
+    Intent("location", r"sales\s+by\s+location",
+           "SELECT location, SUM(sale_amount) FROM {table} GROUP BY location", "location", _location_reply),
+    Intent("product", r"sales\s+by\s+product",
+           "SELECT product_id, SUM(sale_amount) FROM {table} GROUP BY product_id", "product_id", _product_reply),
+    Intent("day", r"sales\s+by\s+day",
+           "SELECT DATE(sale_date), SUM(sale_amount) FROM {table} GROUP BY DATE(sale_date)", "day",
+           _period_reply("Day", "Sale Date")),
+    Intent("month", r"sales\s+by\s+month",
+           "SELECT DATE_FORMAT(sale_date, '%Y-%m'), SUM(sale_amount) FROM {table} GROUP BY DATE_FORMAT(sale_date, '%Y-%m')",
+           "month", _period_reply("Month", "Month")),
+    Intent("year", r"sales\s+by\s+year",
+           "SELECT YEAR(sale_date), SUM(sale_amount) FROM {table} GROUP BY YEAR(sale_date)", "year",
+           _period_reply("Year", "Year")),
+]
+_INTENTS_BY_NAME = {intent.name: intent for intent in INTENTS}
+_MATCHER = re.compile("|".join(f"(?P<{intent.name}>{intent.pattern})" for intent in INTENTS), re.IGNORECASE)
+
+
+def _sales_version():
+    if CHATBOT_SOURCE == "snapshot":
+        return snapshot.get_snapshot().manifest()["sales_high_water_mark"]
+    if CHATBOT_SOURCE == "summary":
+        return sales_summary.high_water_mark()
+    return db.query_one("SELECT MAX(sale_id) FROM sales")[0]
+
+
+_results = cache.ResultCache(ttl=INTENT_CACHE_TTL, version=_sales_version, tables=("sales",),
+                             name="chat_intents")
+_stats = {intent.name: {"hits": 0, "misses": 0, "total_ms": 0.0, "max_ms": 0.0} for intent in INTENTS}
+_stats_lock = threading.Lock()
+
+
+def route(query):
+    matched = {match.lastgroup for match in _MATCHER.finditer(query)}
+    for intent in INTENTS:
+        if intent.name in matched:
+            return intent
+    return None
+
+
+def _fetch(intent):
+    if CHATBOT_SOURCE == "snapshot":
+        return snapshot.get_snapshot().sales_totals(intent.group_by)
+    if CHATBOT_SOURCE == "summary":
+        sales_summary.get_job()
+        return db.query(intent.sql.format(table=sales_summary.SUMMARY_TABLE), intent.params)
+    return db.query(intent.sql.format(table="sales"), intent.params)
+
+
+def answer(query):
+    intent = route(query)
+    if intent is None:
+        return FALLBACK_REPLY, None
+    started = time.perf_counter()
+    # The built reply (text and figure) is cached, not just the rows
+    reply, hit = _results.get_or_compute((intent.name, intent.params, CHATBOT_SOURCE),
+                                         lambda: intent.build(_fetch(intent)))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _stats_lock:
+        entry = _stats[intent.name]
+        entry["hits" if hit else "misses"] += 1
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+    return reply
+
+
+def invalidate():
+    _results.invalidate()
+
+
+def intent_stats():
+    with _stats_lock:
+        return {name: dict(entry) for name, entry in _stats.items()}
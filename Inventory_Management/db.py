@@ -0,0 +1,401 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connection settings shared by every page. Environment variables override the
+# defaults, and DB_SQLITE_PATH switches the whole app to a SQLite stand-in.
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD", ""),
+    "database": os.getenv("DB_NAME", "inventory"),
+}
+SQLITE_PATH = os.getenv("DB_SQLITE_PATH")
+# Account for statements the app did not write itself (chatbot SQL); grant it
+# SELECT on the tables it may read and nothing else
+READONLY_CONFIG = dict(DB_CONFIG, user=os.getenv("DB_READONLY_USER"), password=os.getenv("DB_READONLY_PASSWORD", ""))
+SQLITE_BUSY_TIMEOUT = float(os.getenv("DB_SQLITE_BUSY_TIMEOUT", "30"))  # seconds to wait for the write lock
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", "10"))
+# Idle connections older than this are pinged before being handed out
+HEALTH_CHECK_AFTER = float(os.getenv("DB_HEALTH_CHECK_AFTER", "30"))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class QueryStats:
+    # Per-statement counters: calls, rows and time spent in execute+fetch
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, sql, elapsed, rows):
+        key = " ".join(sql.split())
+        with self._lock:
+            entry = self._stats.setdefault(key, {"calls": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["calls"] += 1
+            entry["rows"] += max(rows, 0)
+            entry["total_ms"] += elapsed * 1000
+            entry["max_ms"] = max(entry["max_ms"], elapsed * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {sql: dict(entry) for sql, entry in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def _sqlite_date_format(value, fmt):
+    if value is None:
+        return None
+    return datetime.fromisoformat(str(value)).strftime(fmt.replace("%i", "%M"))
+
+
+def _sqlite_year(value):
+    return int(str(value)[:4]) if value is not None else None
+
+
+def _sqlite_month(value):
+    return int(str(value)[5:7]) if value is not None else None
+
+
+def _add_functions(conn):
+    # MySQL functions the pages rely on
+    conn.create_function("DATE_FORMAT", 2, _sqlite_date_format, deterministic=True)
+    conn.create_function("YEAR", 1, _sqlite_year, deterministic=True)
+    conn.create_function("MONTH", 1, _sqlite_month, deterministic=True)
+
+
+def _connect_sqlite(path):
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT)
+    # WAL lets readers run alongside the single writer
+    conn.execute("PRAGMA journal_mode=WAL")
+    _add_functions(conn)
+    return conn
+
+
+def _connect_sqlite_readonly(path, tables):
+    # Opened read-only, and the authorizer refuses anything but SELECTs reading the given tables
+    uri = Path(path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT)
+    _add_functions(conn)
+
+    def authorize(action, table, _column, _database, _trigger):
+        if action == sqlite3.SQLITE_READ:
+            return sqlite3.SQLITE_OK if table and table.lower() in tables else sqlite3.SQLITE_DENY
+        if action in (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION):
+            return sqlite3.SQLITE_OK
+        return sqlite3.SQLITE_DENY
+
+    conn.set_authorizer(authorize)
+    return conn
+
+
+def _connect_mysql(config):
+    import mysql.connector
+
+    conn = mysql.connector.connect(**config)
+    # Reads must not pin a snapshot between reruns; writes use transaction()
+    conn.autocommit = True
+    return conn
+
+
+class ConnectionPool:
+    def __init__(self, factory, dialect, size=POOL_SIZE, timeout=ACQUIRE_TIMEOUT, path=None):
+        self.factory = factory
+        self.dialect = dialect
+        self.path = path  # SQLite file, for readonly_pool()
+        self.size = size
+        self.timeout = timeout
+        self.stats = QueryStats()
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _new_connection(self):
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            return self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _is_healthy(self, conn):
+        try:
+            if self.dialect == "sqlite":
+                conn.execute("SELECT 1").fetchall()
+            else:
+                conn.ping(reconnect=True, attempts=1, delay=0)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._new_connection()
+                if conn is not None:
+                    return conn
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"no database connection available within {self.timeout}s")
+                try:
+                    conn, released_at = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    raise PoolTimeout(f"no database connection available within {self.timeout}s")
+            if time.monotonic() - released_at < HEALTH_CHECK_AFTER or self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn, broken=False):
+        if broken:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, broken=not self._is_healthy(conn))
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+_observer = None
+
+
+def set_query_observer(observer):
+    # observer.active() -> bool, observer.record(sql, elapsed, rows, bytes);
+    # bytes are only estimated while the observer is active (see profiler.py)
+    global _observer
+    _observer = observer
+
+
+def _estimated_bytes(rows):
+    return sum(len(value) if isinstance(value, (str, bytes)) else 8 for row in rows if row is not None for value in row)
+
+
+class InstrumentedCursor:
+    # Thin cursor wrapper: translates placeholders for SQLite and records timings
+
+    def __init__(self, cursor, pool):
+        self._cursor = cursor
+        self._pool = pool
+        self._sql = None
+        self._started = 0.0
+        self._streamed = 0
+        self._streamed_bytes = 0
+
+    def _prepare(self, sql):
+        if self._pool.dialect == "sqlite":
+            return sql.replace("%s", "?")
+        return sql
+
+    def _record(self, sql, elapsed, rows, fetched=()):
+        self._pool.stats.record(sql, elapsed, rows)
+        observer = _observer
+        if observer is not None and observer.active():
+            observer.record(sql, elapsed, rows, _estimated_bytes(fetched))
+
+    def execute(self, sql, params=()):
+        self._sql = sql
+        self._started = time.perf_counter()
+        self._streamed = 0
+        self._streamed_bytes = 0
+        self._cursor.execute(self._prepare(sql), params)
+        if self._cursor.description is None:
+            self._record(sql, time.perf_counter() - self._started, self._cursor.rowcount)
+        return self
+
+    def executemany(self, sql, seq_params):
+        started = time.perf_counter()
+        self._cursor.executemany(self._prepare(sql), seq_params)
+        self._record(sql, time.perf_counter() - started, self._cursor.rowcount)
+        return self
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._record(self._sql, time.perf_counter() - self._started, len(rows), rows)
+        return rows
+
+    def fetchmany(self, size):
+        rows = self._cursor.fetchmany(size)
+        self._streamed += len(rows)
+        observer = _observer
+        if observer is not None and observer.active():
+            self._streamed_bytes += _estimated_bytes(rows)
+        if not rows:
+            # Streamed statements are recorded once, when the result is exhausted
+            self._pool.stats.record(self._sql, time.perf_counter() - self._started, self._streamed)
+            if observer is not None and observer.active():
+                observer.record(self._sql, time.perf_counter() - self._started, self._streamed, self._streamed_bytes)
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        # Drain the rest so an unbuffered MySQL cursor can be reused
+        self._cursor.fetchall()
+        self._record(self._sql, time.perf_counter() - self._started, 0 if row is None else 1, [row])
+        return row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_readonly_pools = {}
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if SQLITE_PATH:
+                    _pool = ConnectionPool(lambda: _connect_sqlite(SQLITE_PATH), "sqlite", path=SQLITE_PATH)
+                else:
+                    _pool = ConnectionPool(lambda: _connect_mysql(DB_CONFIG), "mysql")
+    return _pool
+
+
+def set_pool(pool):
+    # Swap the process-wide pool, e.g. for a SQLite stand-in in benchmarks
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool is not pool:
+            _pool.close()
+        for readonly in _readonly_pools.values():
+            if readonly is not None:
+                readonly.close()
+        _readonly_pools.clear()
+        _pool = pool
+
+
+def sqlite_pool(path, size=POOL_SIZE):
+    return ConnectionPool(lambda: _connect_sqlite(path), "sqlite", size=size, path=path)
+
+
+def readonly_pool(tables):
+    # Pool whose connections can only read the given tables: a read-only SQLite
+    # connection with an authorizer, or DB_READONLY_USER on MySQL. None on MySQL
+    # when no such account is configured.
+    pool = get_pool()
+    tables = frozenset(table.lower() for table in tables)
+    key = (id(pool), tables)
+    with _pool_lock:
+        if key not in _readonly_pools:
+            if pool.dialect == "sqlite":
+                path = pool.path
+                _readonly_pools[key] = ConnectionPool(lambda: _connect_sqlite_readonly(path, tables), "sqlite",
+                                                      size=pool.size, path=path)
+            elif READONLY_CONFIG["user"]:
+                _readonly_pools[key] = ConnectionPool(lambda: _connect_mysql(READONLY_CONFIG), "mysql", size=pool.size)
+            else:
+                _readonly_pools[key] = None
+        return _readonly_pools[key]
+
+
+@contextmanager
+def cursor(pool=None):
+    pool = pool or get_pool()
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        try:
+            yield InstrumentedCursor(cur, pool)
+        finally:
+            cur.close()
+
+
+@contextmanager
+def transaction():
+    # Everything executed on the yielded cursor commits or rolls back together
+    pool = get_pool()
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        try:
+            if pool.dialect == "sqlite":
+                # Take the write lock up front; a deferred transaction that later
+                # needs to write fails with "database is locked" under contention
+                cur.execute("BEGIN IMMEDIATE")
+            else:
+                conn.start_transaction()
+            yield InstrumentedCursor(cur, pool)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+def query(sql, params=()):
+    with cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def query_one(sql, params=()):
+    with cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchone()
+
+
+def execute(sql, params=()):
+    with transaction() as cur:
+        cur.execute(sql, params)
+        return cur.rowcount
+
+
+def insert(sql, params=()):
+    with transaction() as cur:
+        cur.execute(sql, params)
+        return cur.lastrowid
+
+
+def dialect():
+    return get_pool().dialect
+
+
+def query_stats():
+    return get_pool().stats.snapshot()
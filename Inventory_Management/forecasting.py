@@ -0,0 +1,275 @@
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import sales_aggregates
+from sales_queries import SalesFilter
+
+# Demand forecasts per product x location from the sales rollup. Every series
+# is a row of one (series x day) matrix and the damped additive Holt-Winters
+# recurrences (weekly season) run column by column over all rows at once, so
+# fitting 10k series costs one pass over the days per parameter combination
+# instead of one Python loop per series. Parameters are chosen per series
+# from a small grid by one-step-ahead squared error. Between full refits new
+# days are folded into the fitted state with the fitted parameters, which is
+# O(series x new days). The latest day in the rollup is treated as still in
+# progress and is not folded in; sales added later to a day that was already
+# folded in only count from the next full refit. Per-product and
+# per-location figures are sums over the matching series. The dashboard's sql
+# and summary sources feed it from a DailySeries instead of the rollup.
+FORECAST_HORIZON = int(os.getenv("FORECAST_HORIZON", "30"))  # days ahead
+FORECAST_REFIT_INTERVAL = float(os.getenv("FORECAST_REFIT_INTERVAL", "86400"))  # seconds between full refits
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_MIN_SERIES = 2000  # fewer series than this are fitted in-process
+SEASON_LENGTH = 7
+DAMPING = 0.95
+ALPHAS = (0.05, 0.1, 0.2, 0.4)
+BETAS = (0.0, 0.05)
+GAMMAS = (0.05, 0.2)
+SERIES_KEYS = ["product_id", "location"]
+MEASURES = {"revenue": "sale_amount", "units": "quantity"}
+
+
+def _smooth(y, start, level, trend, season, alpha, beta, gamma):
+    # Runs the recurrences over the columns of y (day start, start + 1, ...);
+    # alpha, beta and gamma are scalars or one value per row
+    level, trend, season = level.copy(), trend.copy(), season.copy()
+    sse = np.zeros(len(level))
+    for t in range(y.shape[1]):
+        slot = (start + t) % SEASON_LENGTH
+        seasonal = season[:, slot]
+        damped = DAMPING * trend
+        error = y[:, t] - (level + damped + seasonal)
+        sse += error * error
+        new_level = level + damped + alpha * error
+        trend = damped + beta * (new_level - level - damped)
+        season[:, slot] = seasonal + gamma * (y[:, t] - new_level - seasonal)
+        level = new_level
+    return sse, level, trend, season
+
+
+def fit(y, start=0):
+    # y: (series x days) starting at day index start; returns the per-series
+    # parameters and the state after the last day
+    y = np.asarray(y, dtype=float)
+    n, days = y.shape
+    state = {"alpha": np.full(n, ALPHAS[0]), "beta": np.full(n, BETAS[0]), "gamma": np.full(n, GAMMAS[0])}
+    if days < 2 * SEASON_LENGTH:
+        # Too short to separate a weekly pattern: flat forecast at the mean
+        state.update(level=y.mean(axis=1) if days else np.zeros(n), trend=np.zeros(n),
+                     season=np.zeros((n, SEASON_LENGTH)))
+        return state
+    first_week = y[:, :SEASON_LENGTH]
+    level = first_week.mean(axis=1)
+    season = np.zeros((n, SEASON_LENGTH))
+    season[:, [(start + t) % SEASON_LENGTH for t in range(SEASON_LENGTH)]] = first_week - level[:, None]
+    best = np.full(n, np.inf)
+    for alpha, beta, gamma in itertools.product(ALPHAS, BETAS, GAMMAS):
+        sse, new_level, new_trend, new_season = _smooth(y[:, SEASON_LENGTH:], start + SEASON_LENGTH, level,
+                                                        np.zeros(n), season, alpha, beta, gamma)
+        better = sse < best
+        if not better.any():
+            continue
+        best[better] = sse[better]
+        if "level" not in state:
+            state.update(level=new_level, trend=new_trend, season=new_season)
+        for name, value in (("alpha", alpha), ("beta", beta), ("gamma", gamma)):
+            state[name][better] = value
+        state["level"][better] = new_level[better]
+        state["trend"][better] = new_trend[better]
+        state["season"][better] = new_season[better]
+    return state
+
+
+def fit_parallel(y, start=0, workers=FORECAST_WORKERS):
+    # Same result as fit(); large batches are split by rows across processes
+    if workers <= 1 or len(y) < PARALLEL_MIN_SERIES:
+        return fit(y, start)
+    chunks = np.array_split(np.asarray(y, dtype=float), workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(fit, chunks, [start] * len(chunks)))
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def advance(state, y, start):
+    # Folds new days into a fitted state without refitting the parameters
+    _, level, trend, season = _smooth(y, start, state["level"], state["trend"], state["season"],
+                                      state["alpha"], state["beta"], state["gamma"])
+    return dict(state, level=level, trend=trend, season=season)
+
+
+def predict(state, start, horizon=FORECAST_HORIZON):
+    # (series x horizon) daily forecasts from day index start on
+    steps = np.arange(1, horizon + 1)
+    damped = np.cumsum(DAMPING ** steps)
+    slots = (start + steps - 1) % SEASON_LENGTH
+    values = state["level"][:, None] + state["trend"][:, None] * damped + state["season"][:, slots]
+    return np.maximum(values, 0.0)
+
+
+def _empty_forecasts():
+    return pd.DataFrame(columns=SERIES_KEYS + list(MEASURES))
+
+
+class ForecastEngine:
+    def __init__(self, horizon=FORECAST_HORIZON, refit_interval=FORECAST_REFIT_INTERVAL, workers=FORECAST_WORKERS):
+        self.horizon = horizon
+        self.refit_interval = refit_interval
+        self.workers = workers
+        self.series = None  # MultiIndex of (product_id, location), one per matrix row
+        self.first_day = None  # day index 0
+        self.last_day = None  # last day folded into the states
+        self.states = {}
+        self.forecasts = _empty_forecasts()
+        self._rollup = None
+        self._fitted_at = None
+        self._lock = threading.Lock()
+
+    def _matrix(self, daily, first_day, days):
+        y = {measure: np.zeros((len(self.series), days)) for measure in MEASURES}
+        if daily.empty:
+            return y
+        rows = self.series.get_indexer(pd.MultiIndex.from_frame(daily[SERIES_KEYS]))
+        columns = (daily["sale_date"] - first_day).dt.days.to_numpy()
+        for measure, column in MEASURES.items():
+            y[measure][rows, columns] = daily[column].to_numpy()
+        return y
+
+    def _fit(self, daily, last_day):
+        self.series = pd.MultiIndex.from_frame(daily[SERIES_KEYS].drop_duplicates().sort_values(SERIES_KEYS))
+        self.first_day = daily["sale_date"].min()
+        days = (last_day - self.first_day).days + 1
+        y = self._matrix(daily, self.first_day, days)
+        self.states = {measure: fit_parallel(y[measure], 0, self.workers) for measure in MEASURES}
+        self._fitted_at = time.monotonic()
+
+    def refresh(self, rollup=None):
+        # rollup defaults to the live sales_aggregates rollup
+        with self._lock:
+            if rollup is None:
+                rollup = sales_aggregates.get_engine().refresh()
+            if rollup is self._rollup:
+                return self.forecasts
+            if rollup.empty:
+                self.series, self.states, self.last_day = None, {}, None
+                self.forecasts = _empty_forecasts()
+                self._rollup = rollup
+                return self.forecasts
+            last_day = rollup["sale_date"].max() - pd.Timedelta(days=1)
+            refit_due = self._fitted_at is None or time.monotonic() - self._fitted_at >= self.refit_interval
+            if refit_due or self.series is None or last_day < self.last_day:
+                daily = self._daily(rollup[rollup["sale_date"] <= last_day])
+                if daily.empty:
+                    self.series, self.states = None, {}
+                else:
+                    self._fit(daily, last_day)
+            elif last_day > self.last_day:
+                daily = self._daily(rollup[(rollup["sale_date"] > self.last_day) & (rollup["sale_date"] <= last_day)])
+                known = self.series.get_indexer(pd.MultiIndex.from_frame(daily[SERIES_KEYS])) >= 0
+                if not known.all():
+                    # New product/location pairs need their whole history
+                    self._fit(self._daily(rollup[rollup["sale_date"] <= last_day]), last_day)
+                else:
+                    start = (self.last_day - self.first_day).days + 1
+                    y = self._matrix(daily, self.last_day + pd.Timedelta(days=1), (last_day - self.last_day).days)
+                    self.states = {measure: advance(self.states[measure], y[measure], start) for measure in MEASURES}
+            self.last_day = last_day
+            self._rollup = rollup
+            self.forecasts = self._forecasts()
+            return self.forecasts
+
+    def _daily(self, rollup):
+        # Sales without a location or product are kept as '' / 0, as in
+        # sales_daily_summary; groupby would drop them as NaN keys
+        rollup = rollup.fillna({"location": "", "product_id": 0})
+        return rollup.groupby(["sale_date"] + SERIES_KEYS, as_index=False)[list(MEASURES.values())].sum()
+
+    def _forecasts(self):
+        if self.series is None:
+            return _empty_forecasts()
+        start = (self.last_day - self.first_day).days + 1
+        forecasts = self.series.to_frame(index=False)
+        for measure in MEASURES:
+            forecasts[measure] = predict(self.states[measure], start, self.horizon).sum(axis=1)
+        return forecasts
+
+    def rebuild(self):
+        with self._lock:
+            self._rollup = None
+            self._fitted_at = None
+        return self.refresh()
+
+
+def filter_forecasts(forecasts, locations=None, products=None):
+    mask = pd.Series(True, index=forecasts.index)
+    if locations:
+        mask &= forecasts["location"].isin(locations)
+    if products:
+        mask &= forecasts["product_id"].isin(products)
+    return forecasts[mask]
+
+
+def total(forecasts, measure="revenue"):
+    return float(forecasts[measure].sum())
+
+
+def by_product(forecasts):
+    # Per-SKU forecasts, largest expected revenue first
+    totals = forecasts.groupby("product_id", as_index=False)[list(MEASURES)].sum()
+    return totals.sort_values("revenue", ascending=False, ignore_index=True)
+
+
+def by_location(forecasts):
+    totals = forecasts.groupby("location", as_index=False)[list(MEASURES)].sum()
+    return totals.sort_values("revenue", ascending=False, ignore_index=True)
+
+
+class DailySeries:
+    # Forecast input read through a sales_queries-style source (sales_queries
+    # or sales_summary), so the sql and summary dashboards never load the
+    # sales rollup. When the source's version moves only the days from the
+    # last one loaded on are read again; like the rollup, sales are treated as
+    # append-only.
+
+    def __init__(self, source):
+        self.source = source
+        self.version = None
+        self.daily = None
+        self._lock = threading.Lock()
+
+    def refresh(self, version):
+        with self._lock:
+            if self.daily is not None and version == self.version:
+                return self.daily
+            if self.daily is None or self.daily.empty:
+                self.daily = self.source.daily_series(SalesFilter())
+            else:
+                since = self.daily["sale_date"].max()
+                recent = self.source.daily_series(SalesFilter(start_date=since))
+                self.daily = pd.concat([self.daily[self.daily["sale_date"] < since], recent], ignore_index=True)
+            self.version = version
+            return self.daily
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_daily_series = {}
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = ForecastEngine()
+    return _engine
+
+
+def get_daily_series(source):
+    with _engine_lock:
+        if source.__name__ not in _daily_series:
+            _daily_series[source.__name__] = DailySeries(source)
+        return _daily_series[source.__name__]
@@ -0,0 +1,159 @@
+import hashlib
+import io
+import os
+import sys
+import threading
+from collections import OrderedDict
+import db
+import lazy
+
+# Content-addressed product images: files are named by the SHA-256 of their
+# bytes, so identical uploads are stored once and two vendors uploading
+# "download.jpeg" no longer overwrite each other. A JPEG thumbnail is made once
+# at upload time and the catalog grid serves thumbnails from an LRU cache.
+IMAGE_DIR = "product_images"
+THUMB_DIR = IMAGE_DIR + "/thumbs"
+THUMB_SIZE = (300, 300)
+THUMB_CACHE_BYTES = int(os.getenv("THUMB_CACHE_BYTES", str(32 * 1024 * 1024)))
+EXTENSIONS = {"JPEG": ".jpeg", "PNG": ".png", "GIF": ".gif", "WEBP": ".webp"}
+# Pillow is only needed when an upload is stored or migrated, not to serve thumbnails
+Image = lazy.module("PIL.Image")
+ImageOps = lazy.module("PIL.ImageOps")
+
+
+def read_errors():
+    # What Pillow raises for files it cannot read: unidentified or truncated
+    # images (OSError), broken headers (SyntaxError, ValueError) and
+    # decompression bombs. A function so Pillow still loads only when needed.
+    return (OSError, SyntaxError, ValueError, Image.DecompressionBombError)
+
+
+def _is_content_addressed(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return len(name) == 64 and all(c in "0123456789abcdef" for c in name)
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _make_thumbnail(data):
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(THUMB_SIZE)
+        out = io.BytesIO()
+        image.convert("RGB").save(out, "JPEG", quality=85, optimize=True)
+        return out.getvalue()
+
+
+def _thumb_path(digest):
+    return f"{THUMB_DIR}/{digest}.jpg"
+
+
+def save_image(data, filename=""):
+    # Stores the bytes once and returns the path to keep in vendor_products.image
+    digest = hashlib.sha256(data).hexdigest()
+    with Image.open(io.BytesIO(data)) as image:
+        extension = EXTENSIONS.get(image.format) or os.path.splitext(filename)[1].lower() or ".img"
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    # Forward slashes keep the stored path portable
+    path = f"{IMAGE_DIR}/{digest}{extension}"
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+    if not os.path.exists(_thumb_path(digest)):
+        _write_atomic(_thumb_path(digest), _make_thumbnail(data))
+    return path
+
+
+class _ThumbnailCache:
+    # LRU of thumbnail bytes bounded by total size. Content-addressed keys never
+    # go stale, so entries need no invalidation.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._entries or len(data) > self.max_bytes:
+                return
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+_thumbnails = _ThumbnailCache(THUMB_CACHE_BYTES)
+
+
+def thumbnail(image_path):
+    # Thumbnail bytes for a stored image, or None if the file is missing or
+    # cannot be read as an image
+    data = _thumbnails.get(image_path)
+    if data is not None:
+        return data
+    try:
+        if _is_content_addressed(image_path):
+            digest = os.path.splitext(os.path.basename(image_path))[0]
+            thumb_path = _thumb_path(digest)
+            if not os.path.isfile(thumb_path):
+                if not os.path.isfile(image_path):
+                    return None
+                with open(image_path, "rb") as f:
+                    save_image(f.read())
+            with open(thumb_path, "rb") as f:
+                data = f.read()
+        elif os.path.isfile(image_path):
+            # Not migrated yet: build the thumbnail in memory only
+            with open(image_path, "rb") as f:
+                data = _make_thumbnail(f.read())
+        else:
+            return None
+    except read_errors() as e:
+        print(f"no thumbnail for {image_path}: {e}", file=sys.stderr)
+        return None
+    _thumbnails.put(image_path, data)
+    return data
+
+
+def migrate(directory=IMAGE_DIR):
+    # Renames existing uploads to content-addressed names, builds thumbnails
+    # and repoints vendor_products.image. Duplicate files collapse into one.
+    moved = 0
+    for name in sorted(os.listdir(directory)):
+        old_path = os.path.join(directory, name)
+        if not os.path.isfile(old_path) or _is_content_addressed(name) or name.endswith(".tmp"):
+            continue
+        with open(old_path, "rb") as f:
+            data = f.read()
+        try:
+            new_path = save_image(data, name)
+        except read_errors() as e:
+            print(f"skipping {old_path}: {e}", file=sys.stderr)
+            continue
+        # Rows may store the path with either separator
+        for stored in {old_path, old_path.replace(os.sep, "/")}:
+            db.execute("UPDATE vendor_products SET image = %s WHERE image = %s", (new_path, stored))
+        os.remove(old_path)
+        moved += 1
+        print(f"{old_path} -> {new_path}")
+    return moved
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["migrate"]:
+        sys.exit("usage: python image_store.py migrate")
+    print(f"migrated {migrate()} images")
@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import cache
+
+# Runs the app as several Streamlit worker processes behind one port. The
+# proxy gives every new browser a worker cookie on its first response and
+# sends all of that browser's requests and its websocket to the same worker,
+# since a Streamlit session lives in one process. New browsers go to the
+# healthy worker with the fewest open connections. Workers that exit are
+# restarted, and their browsers are moved to another worker. Every worker
+# uses the shared SQLite cache backend (cache.py), so cached results, table
+# versions, the sales rollup and login sessions are shared: an aggregate is
+# computed once for the whole cluster and a user stays signed in if their
+# browser moves to another worker.
+LAUNCHER_WORKERS = int(os.getenv("LAUNCHER_WORKERS", str(os.cpu_count() or 1)))
+LAUNCHER_PORT = int(os.getenv("LAUNCHER_PORT", "8501"))
+LAUNCHER_WORKER_PORT = int(os.getenv("LAUNCHER_WORKER_PORT", "8510"))  # workers listen on this port and up
+COOKIE = "im_worker"
+HEALTH_INTERVAL = 2.0
+MAX_HEAD_BYTES = 64 * 1024
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Worker:
+    def __init__(self, index, port):
+        self.index = index
+        self.port = port
+        self.process = None
+        self.healthy = False
+        self.connections = 0
+        self.started_at = None
+        self.restarts = -1
+
+    def start(self, app, env):
+        self.process = subprocess.Popen([sys.executable, "-m", "streamlit", "run", app,
+                                         "--server.port", str(self.port), "--server.address", "127.0.0.1",
+                                         "--server.headless", "true", "--browser.gatherUsageStats", "false"],
+                                        cwd=APP_DIR, env=env)
+        self.healthy = False
+        self.started_at = time.monotonic()
+        self.restarts += 1
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.alive():
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def _cookie_worker(head):
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() != b"cookie":
+            continue
+        for part in value.decode("latin-1").split(";"):
+            key, _, number = part.strip().partition("=")
+            if key == COOKIE and number.isdigit():
+                return int(number)
+    return None
+
+
+async def _pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+class Launcher:
+    def __init__(self, workers, app="app.py", port=LAUNCHER_PORT, worker_port=LAUNCHER_WORKER_PORT,
+                 cache_path=cache.CACHE_SQLITE_PATH):
+        self.app = app
+        self.port = port
+        self.workers = [Worker(index, worker_port + index) for index in range(workers)]
+        self.env = dict(os.environ, CACHE_BACKEND="sqlite", CACHE_SQLITE_PATH=cache_path)
+        self._next = 0
+
+    def _pick(self, head):
+        # (worker, newly assigned) for a request; sticky by cookie while that worker is up
+        index = _cookie_worker(head)
+        if index is not None and index < len(self.workers) and self.workers[index].healthy:
+            return self.workers[index], False
+        healthy = [worker for worker in self.workers if worker.healthy]
+        if not healthy:
+            return None, False
+        # Fewest open connections, round robin between equals
+        self._next += 1
+        worker = min(healthy, key=lambda worker: (worker.connections, (worker.index - self._next) % len(self.workers)))
+        return worker, True
+
+    def status(self):
+        return {"workers": [{"index": worker.index, "port": worker.port, "pid": worker.process.pid if worker.process else None,
+                             "healthy": worker.healthy, "connections": worker.connections, "restarts": worker.restarts}
+                            for worker in self.workers]}
+
+    async def _reply(self, writer, status, body):
+        payload = json.dumps(body).encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + payload)
+        await writer.drain()
+        writer.close()
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        if head.split(b" ", 2)[1:2] == [b"/_launcher/status"]:
+            await self._reply(writer, "200 OK", self.status())
+            return
+        worker, assigned = self._pick(head)
+        if worker is None:
+            await self._reply(writer, "503 Service Unavailable", {"error": "no worker is ready"})
+            return
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", worker.port)
+        except OSError:
+            worker.healthy = False
+            await self._reply(writer, "502 Bad Gateway", {"error": f"worker {worker.index} is not reachable"})
+            return
+        worker.connections += 1
+        try:
+            upstream_writer.write(head)
+            if assigned:
+                # Tag the first response so the rest of this browser's requests stick
+                response = await upstream_reader.readuntil(b"\r\n\r\n")
+                writer.write(response[:-2] + f"Set-Cookie: {COOKIE}={worker.index}; Path=/; HttpOnly; "
+                                             f"SameSite=Lax\r\n\r\n".encode())
+            # Anything after the first request on this connection, including a
+            # websocket, is passed through as bytes to the same worker
+            await asyncio.gather(_pipe(reader, upstream_writer), _pipe(upstream_reader, writer))
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            upstream_writer.close()
+        finally:
+            worker.connections -= 1
+
+    async def _is_healthy(self, worker):
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", worker.port), 2)
+            writer.write(b"GET /_stcore/health HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n")
+            status = await asyncio.wait_for(reader.readline(), 2)
+            writer.close()
+            return b" 200 " in status
+        except (OSError, asyncio.TimeoutError):
+            return False
+
+    async def _supervise(self):
+        while True:
+            for worker in self.workers:
+                if not worker.alive():
+                    print(f"worker {worker.index} exited, restarting", flush=True)
+                    worker.start(self.app, self.env)
+                worker.healthy = await self._is_healthy(worker)
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    async def serve(self):
+        for worker in self.workers:
+            worker.start(self.app, self.env)
+        supervisor = asyncio.create_task(self._supervise())
+        server = await asyncio.start_server(self._handle, "0.0.0.0", self.port, limit=MAX_HEAD_BYTES)
+        print(f"{len(self.workers)} workers behind http://localhost:{self.port}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            supervisor.cancel()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the app as several worker processes behind one port")
+    parser.add_argument("--workers", type=int, default=LAUNCHER_WORKERS)
+    parser.add_argument("--port", type=int, default=LAUNCHER_PORT)
+    parser.add_argument("--worker-port", type=int, default=LAUNCHER_WORKER_PORT, help="first worker's port")
+    parser.add_argument("--app", default="app.py")
+    parser.add_argument("--cache-path", default=cache.CACHE_SQLITE_PATH, help="shared cache file for the workers")
+    args = parser.parse_args()
+
+    launcher = Launcher(args.workers, args.app, args.port, args.worker_port, args.cache_path)
+    # SIGTERM takes the same path as Ctrl+C, so workers are always stopped
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        asyncio.run(launcher.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        launcher.stop()
+
+
+if __name__ == "__main__":
+    main()
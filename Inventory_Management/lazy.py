@@ -0,0 +1,145 @@
+import importlib
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+# Deferred imports and client setup. Streamlit only runs the page being
+# visited, but a page script still pays for every import and client at its
+# top before drawing anything, including ones that only some interactions
+# need: the Gemini client on the chatbot page, Plotly Express for chatbot
+# figures, Pillow for image uploads. module() returns a stand-in that imports
+# the real module the first time an attribute is used. Deferred(factory) calls
+# factory on the first get(). Both record how long that first use took and how
+# much it grew the process, for report(). Set LAZY_IMPORTS=0 to import and set
+# up everything immediately instead, e.g. to compare cold starts
+# (benchmarks/bench_cold_start.py). "python lazy.py [module ...]" reports
+# what importing each app module costs a fresh process that already has
+# Streamlit loaded, and which packages that time goes to.
+LAZY_IMPORTS = os.getenv("LAZY_IMPORTS", "1") == "1"
+APP_MODULES = ["auth", "cache", "db", "profiler", "llm_backend", "chat_intents", "sales_queries", "sales_summary",
+               "sales_aggregates", "snapshot", "forecasting", "reorder", "stock_charts", "stock_ledger",
+               "reference_data", "catalog", "image_store", "bulk_io", "nl_sql"]
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)")
+
+_loads = {}  # name -> {"kind", "ms", "rss_mb"}
+_lock = threading.Lock()
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _timed(kind, name, load):
+    rss = _rss_mb()
+    started = time.perf_counter()
+    value = load()
+    with _lock:
+        _loads.setdefault(name, {"kind": kind, "ms": (time.perf_counter() - started) * 1000,
+                                 "rss_mb": _rss_mb() - rss})
+    return value
+
+
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    # Already imported elsewhere: nothing to defer or to report
+                    loaded = sys.modules.get(self._name)
+                    self._module = loaded or _timed("import", self._name, lambda: importlib.import_module(self._name))
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name} ({state})>"
+
+
+def module(name):
+    return LazyModule(name) if LAZY_IMPORTS else importlib.import_module(name)
+
+
+class Deferred:
+    # A client or other expensive object, built by factory() on first get()
+    def __init__(self, factory, name=None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__qualname__", repr(factory))
+        self._value = None
+        self._built = False
+        self._lock = threading.Lock()
+        if not LAZY_IMPORTS:
+            self.get()
+
+    def get(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._value = _timed("client", self._name, self._factory)
+                    self._built = True
+        return self._value
+
+    def built(self):
+        return self._built
+
+
+def report():
+    # [(name, kind, ms, rss_mb)] for everything loaded through this module, slowest first
+    with _lock:
+        entries = [(name, entry["kind"], entry["ms"], entry["rss_mb"]) for name, entry in _loads.items()]
+    return sorted(entries, key=lambda entry: -entry[2])
+
+
+def importtime_packages(text, count=5):
+    # [(top-level package, self ms)] from python -X importtime output, slowest first
+    packages = {}
+    for match in _IMPORTTIME.finditer(text):
+        package = match.group(2).split(".")[0]
+        packages[package] = packages.get(package, 0) + int(match.group(1)) / 1000
+    return sorted(packages.items(), key=lambda item: -item[1])[:count]
+
+
+_PROBE = """
+import sys, time
+import streamlit
+rss = lambda: int(open("/proc/self/status").read().split("VmRSS:")[1].split()[0]) / 1024
+before = rss()
+print("-- import --", file=sys.stderr, flush=True)
+started = time.perf_counter()
+__import__(sys.argv[1])
+print((time.perf_counter() - started) * 1000, rss() - before)
+"""
+
+
+def main(modules):
+    print(f"{'module':<18} {'import ms':>10} {'RSS MB':>7}  slowest packages (self ms)")
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in modules or APP_MODULES:
+        probe = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE, name], cwd=app_dir,
+                               capture_output=True, text=True)
+        if probe.returncode != 0:
+            print(f"{name:<18} failed: {probe.stderr.strip().splitlines()[-1]}")
+            continue
+        ms, rss = map(float, probe.stdout.split())
+        packages = importtime_packages(probe.stderr.split("-- import --", 1)[-1], 4)
+        print(f"{name:<18} {ms:>10.0f} {rss:>7.0f}  {', '.join(f'{package} {ms:.0f}' for package, ms in packages)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
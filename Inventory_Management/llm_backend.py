@@ -0,0 +1,151 @@
+import abc
+import hashlib
+import os
+import queue
+import threading
+import time
+
+# Pluggable chat backends that stream reply text in chunks. Generation runs
+# on a worker thread so the page can render tokens as they arrive, stop
+# waiting after a timeout, and cancel a reply the user has navigated away from.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # "gemini" or "stub"
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # seconds for the whole reply
+LLM_HISTORY_TOKENS = int(os.getenv("LLM_HISTORY_TOKENS", "2000"))
+
+
+class LLMTimeout(Exception):
+    pass
+
+
+class LLMBackend(abc.ABC):
+    @abc.abstractmethod
+    def stream(self, history, prompt, cancel):
+        # Yield reply chunks; stop early once cancel is set
+        pass
+
+
+class GeminiBackend(LLMBackend):
+    def __init__(self, model_name="gemini-pro", api_key=None):
+        import google.generativeai as gen_ai
+
+        gen_ai.configure(api_key=api_key or os.getenv("GOOGLE_API_KEY"))
+        self.model = gen_ai.GenerativeModel(model_name)
+
+    def stream(self, history, prompt, cancel):
+        contents = [{"role": "model" if role == "assistant" else "user", "parts": [text]} for role, text in history]
+        contents.append({"role": "user", "parts": [prompt]})
+        for chunk in self.model.generate_content(contents, stream=True):
+            if cancel.is_set():
+                return
+            yield chunk.text
+
+
+class StubBackend(LLMBackend):
+    # Deterministic offline backend: the same prompt always streams the same
+    # words, with configurable first-token and per-token delays
+
+    WORDS = ("inventory stock vendor product sales order price catalog demand supply report channel "
+             "location customer revenue margin forecast shipment warehouse quantity").split()
+
+    def __init__(self, first_token_delay=0.05, token_delay=0.01, reply_tokens=40):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.reply_tokens = reply_tokens
+
+    def stream(self, history, prompt, cancel):
+        seed = hashlib.sha256(prompt.encode()).digest()
+        time.sleep(self.first_token_delay)
+        for i in range(self.reply_tokens):
+            if cancel.is_set():
+                return
+            word = self.WORDS[seed[i % len(seed)] % len(self.WORDS)]
+            yield word if i == 0 else " " + word
+            time.sleep(self.token_delay)
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name=LLM_BACKEND):
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = StubBackend() if name == "stub" else GeminiBackend()
+        return _backends[name]
+
+
+def stream_reply(backend, history, prompt, timeout=LLM_TIMEOUT, cancel=None):
+    # Generator for st.write_stream: chunks are produced on a worker thread and
+    # handed over through a queue. Closing the generator (e.g. when Streamlit
+    # stops the script for a new interaction) cancels the worker.
+    cancel = cancel or threading.Event()
+    chunks = queue.Queue()
+    done = object()
+
+    def worker():
+        try:
+            for chunk in backend.stream(list(history), prompt, cancel):
+                chunks.put(chunk)
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            chunks.put(done)
+
+    threading.Thread(target=worker, daemon=True).start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMTimeout(f"no complete reply within {timeout}s")
+            try:
+                chunk = chunks.get(timeout=remaining)
+            except queue.Empty:
+                raise LLMTimeout(f"no complete reply within {timeout}s")
+            if chunk is done:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        cancel.set()
+
+
+def estimate_tokens(text):
+    # Rough but cheap: about four characters per token for English text
+    return len(text) // 4 + 1
+
+
+class ChatHistory:
+    # Token-budgeted window of (role, text) turns. Turns that fall out of the
+    # budget are folded into one short summary turn at the front.
+
+    SUMMARY_CHARS = 400
+
+    def __init__(self, max_tokens=LLM_HISTORY_TOKENS):
+        self.max_tokens = max_tokens
+        self.summary = ""
+        self.turns = []
+        # Everything said so far, for display; only turns/summary go to the model
+        self.transcript = []
+
+    def add(self, role, text):
+        self.turns.append((role, text))
+        self.transcript.append((role, text))
+        self._trim()
+
+    def _tokens(self):
+        return estimate_tokens(self.summary) + sum(estimate_tokens(text) for _, text in self.turns)
+
+    def _trim(self):
+        # Keep the latest exchange even if it alone exceeds the budget
+        while len(self.turns) > 2 and self._tokens() > self.max_tokens:
+            role, text = self.turns.pop(0)
+            first_sentence = text.split(". ")[0][:120]
+            self.summary = (self.summary + f" {role}: {first_sentence}.").strip()[-self.SUMMARY_CHARS:]
+
+    def __iter__(self):
+        if self.summary:
+            yield "user", f"Summary of the earlier conversation: {self.summary}"
+            yield "assistant", "Understood."
+        yield from self.turns
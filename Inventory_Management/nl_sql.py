@@ -0,0 +1,804 @@
+import calendar
+import os
+import re
+import sys
+import threading
+import time
+from datetime import date, timedelta
+import pandas as pd
+import cache
+import db
+import lazy
+import reference_data
+import sales_queries
+import sales_summary
+
+# Natural-language questions over sales, vendor_products and product_stock,
+# answered with read-only parameterized SQL. The rule-based translator below
+# needs no network. It recognises a measure, an optional grouping with top or
+# bottom N, and filters on location, channel, payment type, gender, age,
+# product, category and dates. Values always go in as parameters, and
+# identifiers come from the fixed tables below. With
+# NL_SQL_TRANSLATOR=rules+llm, questions the rules cannot parse are sent to
+# the chat backend for SQL, which then goes through the same checks.
+#
+# Every statement, whatever its source, is checked before it runs:
+# - It must be one SELECT over the four known tables.
+# - EXPLAIN must not show a full scan of more than NL_SQL_ROW_BUDGET rows
+#   (MySQL's row estimate; on the SQLite stand-in the table size).
+# - It runs under a NL_SQL_TIMEOUT statement timeout and returns at most
+#   NL_SQL_MAX_ROWS rows.
+# Results are cached by normalized SQL and parameters until the data changes.
+# With CHATBOT_SOURCE=summary, sales questions the daily summary can answer
+# are planned against sales_daily_summary first.
+NL_SQL_ROW_BUDGET = int(os.getenv("NL_SQL_ROW_BUDGET", "1000000"))
+NL_SQL_TIMEOUT = float(os.getenv("NL_SQL_TIMEOUT", "5"))  # seconds per statement
+NL_SQL_MAX_ROWS = int(os.getenv("NL_SQL_MAX_ROWS", "500"))
+NL_SQL_CACHE_TTL = float(os.getenv("NL_SQL_CACHE_TTL", "60"))
+NL_SQL_TRANSLATOR = os.getenv("NL_SQL_TRANSLATOR", "rules")  # "rules" or "rules+llm"
+CHATBOT_SOURCE = os.getenv("CHATBOT_SOURCE", "mysql")
+TABLES = {
+    "sales": ["sale_id", "product_id", "quantity", "sale_amount", "sale_date", "location", "customer_age",
+              "customer_gender", "payment_type", "sale_channel"],
+    "sales_daily_summary": ["sale_date", "location", "product_id", "sale_channel", "sale_amount", "quantity",
+                            "sales_count"],
+    "vendor_products": ["product_id", "product_name", "category", "mrp", "discount", "image", "created_at"],
+    "product_stock": ["stock_id", "product_id", "quantity", "minimum_stock", "maximum_stock", "version"],
+}
+WRITE_KEYWORDS = re.compile(r"\b(insert|update|delete|replace|merge|drop|alter|create|truncate|rename|grant|revoke|"
+                            r"attach|detach|pragma|vacuum|reindex|analyze|lock|unlock|call|handler|load|set|into|"
+                            r"outfile|dumpfile|load_file|sleep|benchmark|get_lock)\b", re.IGNORECASE)
+SQL_TOKEN = re.compile(r"[A-Za-z_][A-Za-z0-9_$]*(?:\s*\.\s*[A-Za-z_*][A-Za-z0-9_$]*)*|\S")
+# Keywords that end a FROM list; the list stays open through JOIN ... ON
+FROM_LIST_END = {"where", "group", "order", "limit", "having", "union", "window", "intersect", "except", "select"}
+ALIAS_STOPWORDS = FROM_LIST_END | {"join", "left", "right", "inner", "outer", "cross", "on", "using", "natural",
+                                   "straight_join", "lateral", "as"}
+DERIVED = object()
+px = lazy.module("plotly.express")
+
+
+class QueryRejected(Exception):
+    pass
+
+
+# What the question asks for: measure name -> (SQL over sales, SQL over the summary, label, money?)
+MEASURES = {
+    "revenue": ("SUM(s.sale_amount)", "SUM(s.sale_amount)", "Total sales", True),
+    "units": ("SUM(s.quantity)", "SUM(s.quantity)", "Units sold", False),
+    "count": ("COUNT(*)", "SUM(s.sales_count)", "Number of sales", False),
+    "average": ("AVG(s.sale_amount)", "SUM(s.sale_amount) / SUM(s.sales_count)", "Average sale", True),
+}
+# Groupings: name -> (expression, label, needs vendor_products, summary can answer)
+GROUPS = {
+    "location": ("s.location", "Location", False, True),
+    "product": ("s.product_id", "Product ID", True, True),
+    "channel": ("s.sale_channel", "Channel", False, True),
+    "payment": ("s.payment_type", "Payment type", False, False),
+    "gender": ("s.customer_gender", "Gender", False, False),
+    "category": ("vp.category", "Category", True, True),
+    "day": ("DATE(s.sale_date)", "Day", False, True),
+    "month": ("DATE_FORMAT(s.sale_date, '%Y-%m')", "Month", False, True),
+    "year": ("YEAR(s.sale_date)", "Year", False, True),
+    "age": (f"s.customer_age - s.customer_age % {sales_queries.AGE_BUCKET_SIZE}", "Customer age", False, False),
+}
+GROUP_WORDS = [
+    (r"locations?|cit(?:y|ies)|stores?|regions?", "location"),
+    (r"products?|items?", "product"),
+    (r"channels?|platforms?|marketplaces?", "channel"),
+    (r"payment(?:\s+(?:types?|methods?))?", "payment"),
+    (r"genders?", "gender"),
+    (r"categor(?:y|ies)", "category"),
+    (r"days?|daily|dates?", "day"),
+    (r"months?|monthly", "month"),
+    (r"years?|yearly|annual(?:ly)?", "year"),
+    (r"ages?(?:\s+groups?)?", "age"),
+]
+SALES_WORDS = re.compile(r"\b(sales?|revenue|sold|sell|orders?|transactions?|purchases?|earn(?:ed|ings)?|income|"
+                         r"turnover|made|spent|bought)\b")
+STOCK_WORDS = re.compile(r"\b(stock|stocks|inventory|reorder|restock|overstock(?:ed)?|understock(?:ed)?|on hand)\b")
+PRODUCT_WORDS = re.compile(r"\b(products?|items?|catalog(?:ue)?|prices?|mrp|discounts?|expensive|cheap(?:est)?)\b")
+AGE_CONTEXT = re.compile(r"\b(age|aged|years?\s+old|customers?|buyers?|people|women|men|females?|males?)\b")
+# Advice, writing and how-to requests go to the chat model even when they mention sales or stock
+NOT_DATA = re.compile(r"^(why|how\s+(?:do|does|can|could|should|to)|should|could|write|draft|explain|suggest|"
+                      r"recommend|tell\s+me\s+about|help)\b")
+MONTHS = {name.lower(): index for index, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): index for index, name in enumerate(calendar.month_abbr) if name})
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+                "ten": 10, "twenty": 20}
+
+
+class Query:
+    # A translated question. candidates are (table, sql, params) in planning
+    # order; the first one within the row budget runs.
+    def __init__(self, question, candidates, columns, kind, money=False, chart=None):
+        self.question = question
+        self.candidates = candidates
+        self.columns = columns
+        self.kind = kind
+        self.money = money
+        self.chart = chart  # None, "bar" or "line"
+
+
+def _number(text, default):
+    if text is None:
+        return default
+    return int(text) if text.isdigit() else NUMBER_WORDS.get(text, default)
+
+
+def _month_range(year, month):
+    start = date(year, month, 1)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+def _date_range(question, today):
+    # Half-open [start, end) from the first date phrase in the question, or None
+    match = re.search(r"\bbetween\s+(\d{4}-\d{2}-\d{2})\s+and\s+(\d{4}-\d{2}-\d{2})\b", question)
+    if match:
+        return date.fromisoformat(match.group(1)), date.fromisoformat(match.group(2)) + timedelta(days=1)
+    match = re.search(r"\b(since|after|from)\s+(\d{4}-\d{2}-\d{2})\b", question)
+    if match:
+        start = date.fromisoformat(match.group(2)) + timedelta(days=1 if match.group(1) == "after" else 0)
+        return start, today + timedelta(days=1)
+    match = re.search(r"\bbefore\s+(\d{4}-\d{2}-\d{2})\b", question)
+    if match:
+        return date.min, date.fromisoformat(match.group(1))
+    match = re.search(r"\bon\s+(\d{4}-\d{2}-\d{2})\b", question)
+    if match:
+        day = date.fromisoformat(match.group(1))
+        return day, day + timedelta(days=1)
+    match = re.search(r"\b(?:last|past|previous)\s+(\d+|\w+)\s+(days?|weeks?|months?|years?)\b", question)
+    if match:
+        count = _number(match.group(1), 1)
+        days = {"d": 1, "w": 7, "m": 30, "y": 365}[match.group(2)[0]] * count
+        return today - timedelta(days=days - 1), today + timedelta(days=1)
+    if re.search(r"\btoday\b", question):
+        return today, today + timedelta(days=1)
+    if re.search(r"\byesterday\b", question):
+        return today - timedelta(days=1), today
+    if re.search(r"\bthis\s+week\b", question):
+        start = today - timedelta(days=today.weekday())
+        return start, today + timedelta(days=1)
+    if re.search(r"\blast\s+week\b", question):
+        start = today - timedelta(days=today.weekday() + 7)
+        return start, start + timedelta(days=7)
+    if re.search(r"\bthis\s+month\b", question):
+        return _month_range(today.year, today.month)
+    if re.search(r"\blast\s+month\b", question):
+        previous = today.replace(day=1) - timedelta(days=1)
+        return _month_range(previous.year, previous.month)
+    if re.search(r"\bthis\s+year\b", question):
+        return date(today.year, 1, 1), date(today.year + 1, 1, 1)
+    if re.search(r"\blast\s+year\b", question):
+        return date(today.year - 1, 1, 1), date(today.year, 1, 1)
+    match = re.search(r"\b(?:in|during|for|of)\s+(" + "|".join(sorted(MONTHS, key=len, reverse=True))
+                      + r")\b\.?(?:\s+(\d{4}))?", question)
+    if match:
+        month = MONTHS[match.group(1)]
+        # Without a year, the latest such month that has started
+        year = int(match.group(2)) if match.group(2) else today.year - (month > today.month)
+        return _month_range(year, month)
+    match = re.search(r"\b(?:in|during|for|of)\s+((?:19|20)\d{2})\b", question)
+    if match:
+        year = int(match.group(1))
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    return None
+
+
+def _known(values, question):
+    # Known values named in the question; "Boston" matches "Boston, MA"
+    found = []
+    for value in values:
+        if value is None:
+            continue
+        text = str(value).lower()
+        names = {text, text.split(",")[0].strip()}
+        if any(name and re.search(r"\b" + re.escape(name) + r"\b", question) for name in names):
+            found.append(value)
+    return found
+
+
+_values_cache = cache.ResultCache(ttl=300, tables=("sales",), name="nl_sql.values")
+
+
+def _values(column):
+    # Distinct location/channel/payment values; index scans, cached for a few minutes
+    return _values_cache.get_or_compute(column, lambda: sales_queries.distinct_values(column))[0]
+
+
+_names = (None, {}, 0)  # (products list it was built from, {name words: [product_id]}, longest name in words)
+_names_lock = threading.Lock()
+
+
+def _product_names():
+    global _names
+    products = reference_data.products()
+    with _names_lock:
+        if _names[0] is not products:
+            index = {}
+            for product_id, name in products:
+                words = tuple(re.findall(r"\w+", str(name or "").lower()))
+                if words and len(" ".join(words)) > 2:
+                    index.setdefault(words, []).append(product_id)
+            _names = (products, index, max(map(len, index), default=0))
+        return _names[1], _names[2]
+
+
+def _product_filter(question):
+    match = re.search(r"\bproducts?\s+(?:id\s+)?#?(\d+)\b|\bproduct_id\s*=?\s*(\d+)\b", question)
+    if match:
+        return [int(match.group(1) or match.group(2))]
+    # Word n-grams of the question looked up among product names, longest
+    # first so "phone case" beats "phone"; one dict lookup per n-gram rather
+    # than a pattern per product
+    index, longest = _product_names()
+    words = re.findall(r"\w+", question)
+    for size in range(min(longest, len(words)), 0, -1):
+        for start in range(len(words) - size + 1):
+            found = index.get(tuple(words[start:start + size]))
+            if found:
+                return list(found)
+    return []
+
+
+def _order(question):
+    # (direction, count or None) for top/bottom questions, or (None, None)
+    for direction, words in [("DESC", r"top|best(?:[\s-]selling)?|highest|biggest|largest|most"),
+                             ("ASC", r"bottom|worst(?:[\s-]selling)?|lowest|least|fewest|smallest")]:
+        match = re.search(r"\b(?:" + words + r")\b(?:\s+(\d+|" + "|".join(NUMBER_WORDS) + r")\b)?", question)
+        if match:
+            return direction, _number(match.group(1), None)
+    return None, None
+
+
+def _group(question):
+    words = "|".join(pattern for pattern, _ in GROUP_WORDS)
+    match = re.search(r"\b(?:by|per|for\s+each|each|across|every|which|what)\s+(" + words + r")\b", question) \
+        or re.search(r"\b(daily|monthly|yearly|annual)\b", question) \
+        or re.search(r"\b(?:top|bottom|best|worst|highest|lowest)\s+(?:(?:\d+|\w+)\s+)?(" + words + r")\b",
+                     question)
+    if not match:
+        return None
+    for pattern, name in GROUP_WORDS:
+        if re.fullmatch(pattern, match.group(1)):
+            return name
+    return None
+
+
+def _measure(question):
+    if re.search(r"\b(average|avg|mean)\b", question):
+        return "average"
+    if re.search(r"\b(units?|quantity|quantities|pieces|items\s+sold)\b", question):
+        return "units"
+    if re.search(r"\b(how\s+many|number\s+of|count\s+of|count)\b", question):
+        return "count"
+    return "revenue"
+
+
+def _sales_query(question, today):
+    measure = _measure(question)
+    group = _group(question)
+    direction, limit = _order(question)
+    if direction and group is None:
+        # "top 5" alone means products
+        group = "product"
+    which = group is not None and re.search(r"\b(which|what)\s+\w+", question)
+    if which and direction is None:
+        direction = "DESC"
+    if direction and limit is None:
+        limit = 1 if which else 10
+
+    filters = []  # (expression, operator, values, summary can answer)
+    dates = _date_range(question, today)
+    if dates:
+        start, end = dates
+        if start != date.min:
+            filters.append(("s.sale_date", ">=", [start.isoformat()], True))
+        filters.append(("s.sale_date", "<", [end.isoformat()], True))
+    for column, expression, summary in [("location", "s.location", True), ("sale_channel", "s.sale_channel", True),
+                                        ("payment_type", "s.payment_type", False)]:
+        found = _known(_values(column), question)
+        if found:
+            filters.append((expression, "IN", found, summary))
+    if re.search(r"\b(female|women|woman|ladies)\b", question):
+        filters.append(("s.customer_gender", "=", ["Female"], False))
+    elif re.search(r"\b(male|men|man|gentlemen)\b", question):
+        filters.append(("s.customer_gender", "=", ["Male"], False))
+    match = re.search(r"\b(?:under|below|younger\s+than)\s+(\d{1,3})\b", question)
+    if match and re.search(AGE_CONTEXT, question):
+        filters.append(("s.customer_age", "<", [int(match.group(1))], False))
+    match = re.search(r"\b(?:over|above|older\s+than)\s+(\d{1,3})\b", question)
+    if match and re.search(AGE_CONTEXT, question):
+        filters.append(("s.customer_age", ">", [int(match.group(1))], False))
+    products = _product_filter(question)
+    if products:
+        filters.append(("s.product_id", "IN", products, True))
+    categories = _known(reference_data.categories(), question)
+    if categories:
+        filters.append(("vp.category", "IN", categories, True))
+
+    measure_sql, summary_measure_sql, measure_label, money = MEASURES[measure]
+    join = any(expression.startswith("vp.") for expression, _, _, _ in filters)
+    columns = [measure_label]
+    if group is not None:
+        expression, label, needs_products, group_summary = GROUPS[group]
+        join = join or needs_products
+        columns = [label, measure_label]
+    else:
+        group_summary = True
+    if group == "product":
+        columns = ["Product ID", "Product", measure_label]
+
+    def build(table, measure_expression):
+        # sale_date is a DATE in the summary, so DATE() is a no-op there
+        select = []
+        group_by = []
+        if group is not None:
+            select.append(expression)
+            group_by.append(expression)
+            if group == "product":
+                select.append("vp.product_name")
+                group_by.append("vp.product_name")
+        select.append(measure_expression)
+        sql = f"SELECT {', '.join(select)} FROM {table} s"
+        if join:
+            sql += " LEFT JOIN vendor_products vp ON vp.product_id = s.product_id"
+        clauses, params = [], []
+        for column, operator, values, _ in filters:
+            if operator == "IN":
+                clauses.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+            else:
+                clauses.append(f"{column} {operator} %s")
+            params.extend(values)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if group_by:
+            sql += " GROUP BY " + ", ".join(group_by)
+            sql += f" ORDER BY {measure_expression} {direction}" if direction else f" ORDER BY {expression}"
+        return sql, params
+
+    candidates = []
+    if CHATBOT_SOURCE == "summary" and group_summary and all(summary for _, _, _, summary in filters):
+        sql, params = build(sales_summary.SUMMARY_TABLE, summary_measure_sql)
+        candidates.append((sales_summary.SUMMARY_TABLE, sql, params))
+    sql, params = build("sales", measure_sql)
+    candidates.append(("sales", sql, params))
+    chart = None
+    if group is not None:
+        chart = "line" if group in ("day", "month") and not direction else "bar"
+    return Query(question, [(table, sql, params) for table, sql, params in candidates], columns,
+                 "grouped" if group else "total", money, chart), limit
+
+
+def _stock_query(question):
+    category = _known(reference_data.categories(), question)
+    products = _product_filter(question)
+    where, params = [], []
+    if category:
+        where.append(f"vp.category IN ({', '.join(['%s'] * len(category))})")
+        params.extend(category)
+    if products:
+        where.append(f"ps.product_id IN ({', '.join(['%s'] * len(products))})")
+        params.extend(products)
+    base = " FROM product_stock ps JOIN vendor_products vp ON vp.product_id = ps.product_id"
+    listing = "SELECT ps.product_id, vp.product_name, ps.quantity, ps.minimum_stock, ps.maximum_stock" + base
+    listing_columns = ["Product ID", "Product", "Quantity", "Minimum", "Maximum"]
+    if re.search(r"\bout\s+of\s+stock\b|\bno\s+stock\b|\bsold\s+out\b", question):
+        where.append("ps.quantity <= 0")
+        order = " ORDER BY ps.product_id"
+    elif re.search(r"\b(low|below\s+minimum|under\s*stock(?:ed)?|reorder|restock|running\s+out)\b", question):
+        where.append("ps.quantity < ps.minimum_stock")
+        order = " ORDER BY ps.quantity - ps.minimum_stock"
+    elif re.search(r"\b(over\s*stock(?:ed)?|above\s+maximum|too\s+much)\b", question):
+        where.append("ps.quantity > ps.maximum_stock")
+        order = " ORDER BY ps.quantity - ps.maximum_stock DESC"
+    elif re.search(r"\b(by|per)\s+categor(?:y|ies)\b", question):
+        sql = "SELECT vp.category, SUM(ps.quantity)" + base + (" WHERE " + " AND ".join(where) if where else "") \
+              + " GROUP BY vp.category ORDER BY vp.category"
+        return Query(question, [("product_stock", sql, params)], ["Category", "Units in stock"], "grouped",
+                     chart="bar"), None
+    elif products:
+        order = " ORDER BY ps.product_id"
+    else:
+        sql = "SELECT SUM(ps.quantity)" + base + (" WHERE " + " AND ".join(where) if where else "")
+        return Query(question, [("product_stock", sql, params)], ["Units in stock"], "total"), None
+    sql = listing + " WHERE " + " AND ".join(where) + order
+    return Query(question, [("product_stock", sql, params)], listing_columns, "rows"), None
+
+
+def _product_query(question):
+    category = _known(reference_data.categories(), question)
+    where = f" WHERE category IN ({', '.join(['%s'] * len(category))})" if category else ""
+    if re.search(r"\b(how\s+many|number\s+of|count)\b", question):
+        if re.search(r"\b(by|per)\s+categor(?:y|ies)\b", question):
+            return Query(question, [("vendor_products", "SELECT category, COUNT(*) FROM vendor_products" + where
+                                     + " GROUP BY category ORDER BY category", category)],
+                         ["Category", "Products"], "grouped", chart="bar"), None
+        return Query(question, [("vendor_products", "SELECT COUNT(*) FROM vendor_products" + where, category)],
+                     ["Products"], "total"), None
+    direction, limit = _order(question)
+    if re.search(r"\b(least\s+expensive|cheap(?:est)?|lowest\s+price)\b", question):
+        direction = "ASC"
+    elif re.search(r"\b(expensive|priciest|highest\s+price)\b", question):
+        direction = "DESC"
+    if direction and limit is None:
+        count = re.search(r"\b(\d{1,3})\b", question)
+        limit = int(count.group(1)) if count else 10
+    if direction is None and not category:
+        return None, None
+    sql = ("SELECT product_id, product_name, category, mrp, discount FROM vendor_products" + where
+           + (f" ORDER BY mrp {direction}" if direction else " ORDER BY product_id"))
+    return Query(question, [("vendor_products", sql, category)], ["Product ID", "Product", "Category", "MRP",
+                                                                    "Discount %"], "rows"), limit
+
+
+def translate(question, today=None):
+    # (Query, limit or None) for a question the rules understand, otherwise (None, None)
+    text = " ".join(question.lower().replace("?", " ").split())
+    today = today or date.today()
+    if NOT_DATA.search(text):
+        return None, None
+    if STOCK_WORDS.search(text) and not re.search(r"\b(sales?|revenue|sold)\b", text):
+        return _stock_query(text)
+    if SALES_WORDS.search(text):
+        return _sales_query(text, today)
+    if PRODUCT_WORDS.search(text):
+        return _product_query(text)
+    return None, None
+
+
+def normalize(sql):
+    # Whitespace collapsed and keywords lowercased outside string literals, for cache keys
+    parts = re.split(r"('(?:[^']|'')*')", sql.strip().rstrip(";"))
+    return "".join(part if part.startswith("'") else " ".join(part.lower().split()) for part in parts)
+
+
+def check_read_only(sql):
+    # {alias: table} of a single SELECT over known tables; raises QueryRejected otherwise
+    stripped = re.sub(r"'(?:[^']|'')*'", "''", sql.strip().rstrip(";"))
+    if ";" in stripped or "--" in stripped or "/*" in stripped or "#" in stripped:
+        raise QueryRejected("only a single statement without comments is allowed")
+    if not re.match(r"\s*select\b", stripped, re.IGNORECASE):
+        raise QueryRejected("only SELECT statements are allowed")
+    keyword = WRITE_KEYWORDS.search(stripped)
+    if keyword:
+        raise QueryRejected(f"'{keyword.group(1)}' is not allowed in a read-only query")
+    if "`" in stripped or '"' in stripped or "[" in stripped:
+        raise QueryRejected("quoted identifiers are not allowed")
+    tables = _table_references(stripped)
+    if not any(table is not DERIVED for table in tables.values()):
+        raise QueryRejected("the query reads no known table")
+    return tables
+
+
+def _table_references(sql):
+    # {name or alias: table} for every entry of every FROM list (comma lists,
+    # JOINs and subqueries at any depth); derived tables map to DERIVED
+    tables = {}
+    depth = 0
+    from_lists = []  # depths with an open FROM list
+    derived = set()  # depths of subqueries used as a table
+    expect_table = False
+    expect_subquery = False
+    alias_for = None
+    for token in SQL_TOKEN.findall(sql):
+        word = token.lower()
+        if expect_subquery:
+            # A parenthesis in table position must open a subquery; "(users)" or
+            # "(sales, users)" would otherwise hide a table from the check
+            expect_subquery = False
+            if word != "select":
+                raise QueryRejected("parenthesized table references are not allowed")
+        if alias_for is not None:
+            if word == "as":
+                continue
+            target, alias_for = alias_for, None
+            if re.fullmatch(r"[a-z_][a-z0-9_$]*", word) and word not in ALIAS_STOPWORDS:
+                tables[word] = target
+                continue
+        if expect_table:
+            expect_table = False
+            if token == "(":
+                depth += 1
+                derived.add(depth)
+                expect_subquery = True
+                continue
+            if not re.fullmatch(r"[a-z_][a-z0-9_$]*", word) or word in ALIAS_STOPWORDS:
+                raise QueryRejected(f"unsupported table reference: {token}")
+            if word not in TABLES:
+                raise QueryRejected(f"unknown table: {token}")
+            tables[word] = word
+            alias_for = word
+            continue
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            closed = depth
+            depth -= 1
+            while from_lists and from_lists[-1] > depth:
+                from_lists.pop()
+            if closed in derived:
+                derived.discard(closed)
+                alias_for = DERIVED
+        elif word == "from":
+            from_lists.append(depth)
+            expect_table = True
+        elif word == "join" or word == "straight_join":
+            expect_table = True
+        elif token == ",":
+            expect_table = bool(from_lists) and from_lists[-1] == depth
+        elif word in FROM_LIST_END and from_lists and from_lists[-1] == depth:
+            from_lists.pop()
+    if depth != 0 or expect_table:
+        raise QueryRejected("the query is incomplete")
+    return tables
+
+
+_sizes = {}
+_sizes_lock = threading.Lock()
+
+
+def _table_size(table):
+    # Row count estimate for SQLite plans, refreshed every minute
+    now = time.monotonic()
+    with _sizes_lock:
+        entry = _sizes.get(table)
+        if entry is not None and now - entry[1] < 60:
+            return entry[0]
+    # MAX(rowid) is a single index probe; COUNT(*) would itself be a full scan
+    with _cursor() as cur:
+        cur.execute(f"SELECT MAX(rowid) FROM {table}")
+        size = cur.fetchone()[0] or 0
+    with _sizes_lock:
+        _sizes[table] = (size, now)
+    return size
+
+
+def _cursor():
+    # Cursor on a connection that can only read TABLES, where one is available
+    return db.cursor(db.readonly_pool(TABLES) or db.get_pool())
+
+
+def _plan_table(name, tables):
+    # Allowed table a plan step reads, DERIVED for subqueries; rejects anything else
+    if name in tables:
+        return tables[name]
+    raise QueryRejected(f"the plan reads a table the query may not use: {name}")
+
+
+def explain(sql, params, tables):
+    # [(table, full scan?, estimated rows, detail)] for each step of the plan
+    steps = []
+    if db.dialect() == "sqlite":
+        with _cursor() as cur:
+            cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = cur.fetchall()
+        for _, _, _, detail in plan:
+            match = re.match(r"(SCAN|SEARCH)\s+(?:TABLE\s+)?(\w+)", detail)
+            if not match or detail.startswith("SCAN CONSTANT ROW"):
+                continue
+            table = _plan_table(match.group(2).lower(), tables)
+            if table is DERIVED:
+                continue
+            full = match.group(1) == "SCAN"
+            steps.append((table, full, _table_size(table) if full else None, detail))
+        return steps
+    with _cursor() as cur:
+        cur.execute("EXPLAIN " + sql, params)
+        names = [column[0] for column in cur.description]
+        for row in cur.fetchall():
+            entry = dict(zip(names, row))
+            name = str(entry.get("table") or "").lower()
+            # <derivedN>, <subqueryN> and <unionM,N> are the query's own intermediate results
+            if not name or name.startswith("<"):
+                continue
+            table = _plan_table(name, tables)
+            if table is DERIVED:
+                continue
+            rows = int(entry.get("rows") or 0)
+            steps.append((table, entry.get("type") in ("ALL", "index"), rows,
+                          f"{entry.get('type')} {entry.get('key') or ''} {entry.get('Extra') or ''}".strip()))
+    return steps
+
+
+def check_plan(sql, params, tables, budget=NL_SQL_ROW_BUDGET):
+    steps = explain(sql, params, tables)
+    for table, full, rows, _ in steps:
+        if full and rows is not None and rows > budget:
+            raise QueryRejected(f"this would scan about {rows:,} rows of {table} (the limit is {budget:,}); "
+                                f"narrow it down, e.g. with a date range, location or product")
+    return steps
+
+
+def _limited(sql, limit):
+    return f"SELECT * FROM ({sql}) AS limited LIMIT {int(limit)}"
+
+
+def _execute(sql, params, limit, timeout):
+    # Rows (at most limit + 1, to tell whether more were cut off) under a statement timeout
+    with _cursor() as cur:
+        if db.dialect() == "sqlite":
+            conn = cur.connection
+            deadline = time.monotonic() + timeout
+            # Called every 10k VM steps; a true return aborts the statement
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+            try:
+                cur.execute(_limited(sql, limit + 1), params)
+                return cur.fetchall()
+            except Exception as e:
+                if "interrupted" in str(e):
+                    raise QueryRejected(f"the query took longer than {timeout:g}s and was stopped")
+                raise
+            finally:
+                conn.set_progress_handler(None, 0)
+        hinted = re.sub(r"^\s*select\b", f"SELECT /*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */",
+                        _limited(sql, limit + 1), count=1, flags=re.IGNORECASE)
+        try:
+            cur.execute(hinted, params)
+            return cur.fetchall()
+        except Exception as e:
+            # ER_QUERY_TIMEOUT (3024)
+            if getattr(e, "errno", None) == 3024:
+                raise QueryRejected(f"the query took longer than {timeout:g}s and was stopped")
+            raise
+
+
+def _data_version():
+    # Index probes only. Every quantity change appends to stock_movements, and the
+    # app's own writes (including stock levels) also bump the cache's table versions
+    version = db.query_one("SELECT (SELECT MAX(sale_id) FROM sales), (SELECT MAX(product_id) FROM vendor_products), "
+                           "(SELECT MAX(updated_at) FROM vendor_products), "
+                           "(SELECT MAX(movement_id) FROM stock_movements)")
+    if CHATBOT_SOURCE == "summary":
+        return (*version, sales_summary.high_water_mark())
+    return version
+
+
+_results = cache.ResultCache(ttl=NL_SQL_CACHE_TTL, version=_data_version,
+                             tables=("sales", "vendor_products", "product_stock"), name="nl_sql")
+_stats = {"answered": 0, "rejected": 0, "untranslated": 0, "planned_on_summary": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def run(candidates, limit=None, timeout=NL_SQL_TIMEOUT, budget=NL_SQL_ROW_BUDGET):
+    # Plans and runs the first (table, sql, params) candidate within budget.
+    # Returns (table, rows, truncated); raises QueryRejected if none qualifies.
+    limit = min(limit or NL_SQL_MAX_ROWS, NL_SQL_MAX_ROWS)
+    rejection = None
+    for table, sql, params in candidates:
+        tables = check_read_only(sql)
+        if table == "llm" and db.readonly_pool(TABLES) is None:
+            raise QueryRejected("SQL written by the LLM needs a read-only database account (DB_READONLY_USER)")
+        try:
+            check_plan(sql, params, tables, budget)
+        except QueryRejected as e:
+            rejection = e
+            continue
+        rows, _ = _results.get_or_compute((normalize(sql), tuple(params), limit),
+                                          lambda: _execute(sql, params, limit, timeout))
+        return table, rows[:limit], len(rows) > limit
+    if rejection is None:
+        raise QueryRejected("there is no query to run")
+    raise rejection
+
+
+_llm_lock = threading.Lock()
+
+
+def _llm_sql(question):
+    # Asks the chat backend for one SELECT; None if it does not give one
+    import llm_backend
+
+    schema = "\n".join(f"{table}({', '.join(columns)})" for table, columns in TABLES.items()
+                       if table != "sales_daily_summary")
+    prompt = (f"Tables:\n{schema}\nvendor_products.product_id joins sales.product_id and product_stock.product_id.\n"
+              f"Write one read-only {db.dialect()} SELECT statement answering: {question}\n"
+              "Reply with only the SQL.")
+    with _llm_lock:
+        reply = "".join(llm_backend.get_backend().stream([], prompt, threading.Event()))
+    match = re.search(r"(select\b.*?)(?:;|```|$)", reply, re.IGNORECASE | re.DOTALL)
+    return match.group(1).strip() if match else None
+
+
+def _format(value, money=False):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) and not hasattr(value, "as_integer_ratio"):
+        return str(value)
+    value = float(value)
+    if money:
+        return f"${value:,.2f}"
+    return f"{value:,.0f}" if value.is_integer() else f"{value:,.2f}"
+
+
+def _reply(query, rows, truncated, table):
+    if query.kind == "total":
+        value = rows[0][0] if rows else None
+        if value is None:
+            return "No matching data found.", None
+        return f"{query.columns[0]}: {_format(value, query.money)}", None
+    if not rows:
+        return "No matching data found.", None
+    shown = rows[:20]
+    if query.kind == "grouped":
+        lines = [f"- {' · '.join(str(value) for value in row[:-1])}: {_format(row[-1], query.money)}"
+                 for row in shown]
+    else:
+        lines = ["| " + " | ".join(query.columns) + " |", "|" + " --- |" * len(query.columns)]
+        lines += ["| " + " | ".join(_format(value) for value in row) + " |" for row in shown]
+    text = "\n".join(lines)
+    if len(rows) > len(shown):
+        text += f"\n\n... and {len(rows) - len(shown)} more"
+    if truncated:
+        text += f"\n\n(only the first {len(rows)} rows are shown)"
+    if table == sales_summary.SUMMARY_TABLE:
+        text += "\n\n(from the daily sales summary)"
+    figure = None
+    if query.chart and len(rows) > 1:
+        frame = pd.DataFrame(rows, columns=query.columns)
+        measure = frame.columns[-1]
+        frame[measure] = frame[measure].astype(float)
+        x = "Product" if "Product" in frame.columns else frame.columns[0]
+        plot = px.line if query.chart == "line" else px.bar
+        figure = plot(frame, x=x, y=measure, title=f"{measure} by {frame.columns[0].lower()}")
+    return text, figure
+
+
+def answer(question):
+    # (text, figure or None) for a question the engine can translate, None
+    # otherwise; raises QueryRejected when the plan is too expensive
+    query, limit = translate(question)
+    if query is None and NL_SQL_TRANSLATOR == "rules+llm":
+        sql = _llm_sql(question)
+        if sql is not None:
+            query = Query(question, [("llm", sql, [])], [], "rows")
+    if query is None:
+        _count("untranslated")
+        return None
+    if any(table == sales_summary.SUMMARY_TABLE for table, _, _ in query.candidates):
+        # Keeps the summary folding in new sales while it is being used
+        sales_summary.get_job()
+    try:
+        table, rows, truncated = run(query.candidates, limit)
+        # A requested top N is not a cut-off
+        truncated = truncated and limit is None
+    except QueryRejected:
+        _count("rejected")
+        raise
+    _count("answered")
+    if table == sales_summary.SUMMARY_TABLE:
+        _count("planned_on_summary")
+    if not query.columns:
+        query.columns = [f"column {index + 1}" for index in range(len(rows[0]))] if rows else ["result"]
+    return _reply(query, rows, truncated, table)
+
+
+def stats():
+    with _stats_lock:
+        return {**_stats, "cache": _results.stats()}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit('usage: python nl_sql.py "question" [...]')
+    for question in sys.argv[1:]:
+        query, limit = translate(question)
+        if query is None:
+            print(f"{question}\n  not understood\n")
+            continue
+        print(question)
+        for table, sql, params in query.candidates:
+            print(f"  {table}: {sql}  {list(params)}")
+            try:
+                for step in check_plan(sql, params, check_read_only(sql)):
+                    print(f"    plan: {step[3]}" + (f" (~{step[2]:,} rows)" if step[2] is not None else ""))
+            except QueryRejected as e:
+                print(f"    rejected: {e}")
+        try:
+            started = time.perf_counter()
+            text, _ = answer(question)
+            print(f"  {(time.perf_counter() - started) * 1000:.1f} ms\n  " + text.replace("\n", "\n  ") + "\n")
+        except QueryRejected as e:
+            print(f"  rejected: {e}\n")
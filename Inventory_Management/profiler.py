@@ -0,0 +1,288 @@
+import copy
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import streamlit as st
+from streamlit.delta_generator import DeltaGenerator
+import db
+import lazy
+
+# Only needed once enabled; the login page would otherwise load pandas just for this
+pd = lazy.module("pandas")
+
+# Per-rerun profile of where a page spends its time: SQL statements (via the
+# db.py query observer, with rows and an estimate of bytes fetched), DataFrame
+# construction and chart/table rendering. Nothing is patched unless
+# PROFILER_ENABLED=1. When enabled, install() wraps pd.DataFrame construction
+# and the st rendering calls in RENDER_CALLS. Work is attributed to the rerun
+# running on the current thread, so background refresh threads and other
+# sessions do not leak into a page's numbers. Each finished rerun is shown in
+# a sidebar panel, logged as one JSON line on the "profiler" logger, and added
+# to process-wide totals served in Prometheus text format on
+# 127.0.0.1:PROFILER_METRICS_PORT.
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+PROFILER_PANEL = os.getenv("PROFILER_PANEL", "1") == "1"
+PROFILER_METRICS_PORT = int(os.getenv("PROFILER_METRICS_PORT", "0"))  # 0 disables the endpoint
+PROFILER_SLOW_MS = float(os.getenv("PROFILER_SLOW_MS", "100"))  # spans at least this slow are highlighted
+TOP_STATEMENTS = 20  # statements exported to /metrics, by total time
+RENDER_CALLS = ["plotly_chart", "pyplot", "dataframe", "image"]
+KINDS = ["sql", "dataframe", "render"]
+
+logger = logging.getLogger("profiler")
+_local = threading.local()
+_lock = threading.Lock()
+_pages = {}  # page -> totals
+_statements = {}  # normalized sql -> {"calls", "seconds", "max_seconds", "rows", "bytes"}
+_installed = False
+
+
+class RunProfile:
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.spans = []  # (kind, label, ms, rows, bytes)
+
+    def add(self, kind, label, ms, rows=None, nbytes=None):
+        self.spans.append((kind, label, ms, rows, nbytes))
+
+    def totals(self):
+        totals = {kind: {"ms": 0.0, "count": 0, "rows": 0, "bytes": 0} for kind in KINDS}
+        for kind, _, ms, rows, nbytes in self.spans:
+            entry = totals[kind]
+            entry["ms"] += ms
+            entry["count"] += 1
+            entry["rows"] += rows or 0
+            entry["bytes"] += nbytes or 0
+        return totals
+
+    def frame(self):
+        frame = pd.DataFrame(self.spans, columns=["kind", "label", "ms", "rows", "bytes"])
+        return frame.sort_values("ms", ascending=False, ignore_index=True)
+
+
+def current():
+    return getattr(_local, "run", None)
+
+
+class _QueryObserver:
+    def active(self):
+        return current() is not None
+
+    def record(self, sql, elapsed, rows, nbytes):
+        run = current()
+        if run is None:
+            return
+        statement = " ".join(sql.split())
+        run.add("sql", statement, elapsed * 1000, max(rows, 0), nbytes)
+        with _lock:
+            entry = _statements.setdefault(statement, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                                       "rows": 0, "bytes": 0})
+            entry["calls"] += 1
+            entry["seconds"] += elapsed
+            entry["max_seconds"] = max(entry["max_seconds"], elapsed)
+            entry["rows"] += max(rows, 0)
+            entry["bytes"] += nbytes
+
+
+def _timed(kind, label, call, count_rows):
+    # Times call() as one span of the current rerun; nested wrapped calls
+    # (e.g. a DataFrame built inside st.dataframe) count only once
+    run = current()
+    if run is None or getattr(_local, "depth", 0):
+        return call()
+    _local.depth = 1
+    started = time.perf_counter()
+    try:
+        return call()
+    finally:
+        _local.depth = 0
+        run.add(kind, label, (time.perf_counter() - started) * 1000, count_rows())
+
+
+def _wrap_dataframe_init(original):
+    @functools.wraps(original)
+    def __init__(self, *args, **kwargs):
+        _timed("dataframe", "DataFrame", lambda: original(self, *args, **kwargs), lambda: len(self))
+    return __init__
+
+
+def _row_count(args):
+    data = args[0] if args else None
+    try:
+        return len(data) if isinstance(data, (pd.DataFrame, list, tuple)) else None
+    except TypeError:
+        return None
+
+
+def _wrap_render(name, original, bound=False):
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        data = args if bound else args[1:]
+        return _timed("render", f"st.{name}", lambda: original(*args, **kwargs), lambda: _row_count(data))
+    return wrapper
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def install():
+    # Idempotent; a no-op unless PROFILER_ENABLED=1
+    global _installed
+    if not PROFILER_ENABLED:
+        return
+    with _lock:
+        if _installed:
+            return
+        _installed = True
+    db.set_query_observer(_QueryObserver())
+    pd.DataFrame.__init__ = _wrap_dataframe_init(pd.DataFrame.__init__)
+    for name in RENDER_CALLS:
+        # st.<name> is bound to the main DeltaGenerator at import time, so both it
+        # and the class method (containers, sidebar, columns) need wrapping
+        setattr(DeltaGenerator, name, _wrap_render(name, getattr(DeltaGenerator, name)))
+        setattr(st, name, _wrap_render(name, getattr(st, name), bound=True))
+    if PROFILER_METRICS_PORT:
+        server = ThreadingHTTPServer(("127.0.0.1", PROFILER_METRICS_PORT), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def start_run(page):
+    install()
+    if PROFILER_ENABLED:
+        _local.run = RunProfile(page)
+
+
+def finish_run(panel=PROFILER_PANEL):
+    run = current()
+    _local.run = None
+    if run is None:
+        return None
+    run.elapsed = (time.perf_counter() - run.started) * 1000
+    totals = run.totals()
+    with _lock:
+        entry = _pages.setdefault(run.page, {"runs": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                             "kinds": {kind: {"seconds": 0.0, "count": 0} for kind in KINDS},
+                                             "rows": 0, "bytes": 0})
+        entry["runs"] += 1
+        entry["seconds"] += run.elapsed / 1000
+        entry["max_seconds"] = max(entry["max_seconds"], run.elapsed / 1000)
+        for kind in KINDS:
+            entry["kinds"][kind]["seconds"] += totals[kind]["ms"] / 1000
+            entry["kinds"][kind]["count"] += totals[kind]["count"]
+        entry["rows"] += totals["sql"]["rows"]
+        entry["bytes"] += totals["sql"]["bytes"]
+    logger.info(json.dumps({"page": run.page, "ms": round(run.elapsed, 1),
+                            **{f"{kind}_ms": round(totals[kind]["ms"], 1) for kind in KINDS},
+                            "queries": totals["sql"]["count"], "rows": totals["sql"]["rows"],
+                            "bytes": totals["sql"]["bytes"],
+                            "slowest": [[kind, label[:120], round(ms, 1)]
+                                        for kind, label, ms, _, _ in sorted(run.spans, key=lambda span: -span[2])[:3]]}))
+    if panel:
+        show_panel(run)
+    return run
+
+
+@contextmanager
+def rerun(page, panel=PROFILER_PANEL):
+    # Profiles everything run inside the block, e.g. pg.run() in vendor.py
+    start_run(page)
+    try:
+        yield
+    finally:
+        finish_run(panel)
+
+
+def show_panel(run):
+    totals = run.totals()
+    with st.sidebar.expander(f"⏱️ Profile: {run.elapsed:,.0f} ms", expanded=False):
+        other = run.elapsed - sum(entry["ms"] for entry in totals.values())
+        st.caption(" · ".join([f"{kind} {totals[kind]['ms']:,.0f} ms ({totals[kind]['count']})" for kind in KINDS]
+                              + [f"other {max(other, 0):,.0f} ms"]))
+        st.caption(f"{totals['sql']['rows']:,} rows, {totals['sql']['bytes'] / 1024:,.1f} KiB fetched")
+        if not run.spans:
+            return
+        frame = run.frame()
+        # The rerun has finished, so the panel's own DataFrame and table are not profiled
+        styled = frame.style.apply(lambda row: ["background-color: #7f1d1d" if row["ms"] >= PROFILER_SLOW_MS else ""
+                                                for _ in row], axis=1).format({"ms": "{:.1f}"})
+        st.dataframe(styled, hide_index=True)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", " ")
+
+
+def prometheus_text():
+    lines = []
+    with _lock:
+        pages = copy.deepcopy(_pages)
+        statements = sorted(_statements.items(), key=lambda item: -item[1]["seconds"])[:TOP_STATEMENTS]
+    lines += ["# HELP profiler_reruns_total Profiled page reruns.", "# TYPE profiler_reruns_total counter"]
+    lines += [f'profiler_reruns_total{{page="{_escape(page)}"}} {entry["runs"]}' for page, entry in pages.items()]
+    lines += ["# HELP profiler_rerun_seconds Time per page rerun.", "# TYPE profiler_rerun_seconds summary"]
+    for page, entry in pages.items():
+        lines.append(f'profiler_rerun_seconds_sum{{page="{_escape(page)}"}} {entry["seconds"]:.6f}')
+        lines.append(f'profiler_rerun_seconds_count{{page="{_escape(page)}"}} {entry["runs"]}')
+    lines += ["# HELP profiler_rerun_max_seconds Slowest rerun per page.", "# TYPE profiler_rerun_max_seconds gauge"]
+    lines += [f'profiler_rerun_max_seconds{{page="{_escape(page)}"}} {entry["max_seconds"]:.6f}'
+              for page, entry in pages.items()]
+    lines += ["# HELP profiler_phase_seconds_total Time per page in SQL, DataFrame construction and rendering.",
+              "# TYPE profiler_phase_seconds_total counter"]
+    lines += [f'profiler_phase_seconds_total{{page="{_escape(page)}",kind="{kind}"}} {entry["kinds"][kind]["seconds"]:.6f}'
+              for page, entry in pages.items() for kind in KINDS]
+    lines += ["# HELP profiler_phase_calls_total Statements, DataFrames and render calls per page.",
+              "# TYPE profiler_phase_calls_total counter"]
+    lines += [f'profiler_phase_calls_total{{page="{_escape(page)}",kind="{kind}"}} {entry["kinds"][kind]["count"]}'
+              for page, entry in pages.items() for kind in KINDS]
+    lines += ["# HELP profiler_rows_fetched_total Rows fetched per page.", "# TYPE profiler_rows_fetched_total counter"]
+    lines += [f'profiler_rows_fetched_total{{page="{_escape(page)}"}} {entry["rows"]}' for page, entry in pages.items()]
+    lines += ["# HELP profiler_bytes_fetched_total Approximate bytes fetched per page.",
+              "# TYPE profiler_bytes_fetched_total counter"]
+    lines += [f'profiler_bytes_fetched_total{{page="{_escape(page)}"}} {entry["bytes"]}' for page, entry in pages.items()]
+    lines += ["# HELP profiler_statement_seconds_total Time in the slowest statements (by total).",
+              "# TYPE profiler_statement_seconds_total counter"]
+    lines += [f'profiler_statement_seconds_total{{statement="{_escape(sql[:200])}"}} {entry["seconds"]:.6f}'
+              for sql, entry in statements]
+    lines += ["# HELP profiler_statement_calls_total Calls of the slowest statements.",
+              "# TYPE profiler_statement_calls_total counter"]
+    lines += [f'profiler_statement_calls_total{{statement="{_escape(sql[:200])}"}} {entry["calls"]}'
+              for sql, entry in statements]
+    lines += ["# HELP profiler_statement_max_seconds Slowest single call of each statement.",
+              "# TYPE profiler_statement_max_seconds gauge"]
+    lines += [f'profiler_statement_max_seconds{{statement="{_escape(sql[:200])}"}} {entry["max_seconds"]:.6f}'
+              for sql, entry in statements]
+    loads = lazy.report()
+    lines += ["# HELP profiler_lazy_load_seconds Time of the first use of each deferred import or client.",
+              "# TYPE profiler_lazy_load_seconds gauge"]
+    lines += [f'profiler_lazy_load_seconds{{name="{_escape(name)}",kind="{kind}"}} {ms / 1000:.6f}'
+              for name, kind, ms, _ in loads]
+    lines += ["# HELP profiler_lazy_load_rss_bytes Resident memory added by that first use.",
+              "# TYPE profiler_lazy_load_rss_bytes gauge"]
+    lines += [f'profiler_lazy_load_rss_bytes{{name="{_escape(name)}",kind="{kind}"}} {int(rss_mb * 1024 * 1024)}'
+              for name, kind, _, rss_mb in loads]
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _pages.clear()
+        _statements.clear()
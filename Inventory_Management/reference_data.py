@@ -0,0 +1,65 @@
+import os
+import cache
+import db
+
+# Reference lists shared by the catalog and inventory pages. Streamlit runs
+# every tab body on each rerun, so the same product and stock lists used to
+# be queried several times per interaction. They are cached process-wide and
+# dropped when this process writes to the underlying tables (cache.bump).
+# Set REFERENCE_POLL_INTERVAL to also notice writes made by other processes.
+REFERENCE_CACHE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "300"))
+REFERENCE_POLL_INTERVAL = float(os.getenv("REFERENCE_POLL_INTERVAL", "0"))  # seconds, 0 disables polling
+
+
+def _products_fingerprint():
+    # Inserts and deletes move the count or highest id; updates move updated_at
+    return db.query_one("SELECT COUNT(*), MAX(product_id), MAX(updated_at) FROM vendor_products")
+
+
+def _stock_fingerprint():
+    # Every stock write bumps product_stock.version, so the sum moves on any change
+    return _products_fingerprint(), db.query_one("SELECT COUNT(*), MAX(stock_id), SUM(version) FROM product_stock")
+
+
+def _reference_cache(name, tables, fingerprint):
+    return cache.ResultCache(ttl=REFERENCE_CACHE_TTL, tables=tables, name=f"reference_data.{name}",
+                             version=fingerprint if REFERENCE_POLL_INTERVAL > 0 else None,
+                             version_check_interval=REFERENCE_POLL_INTERVAL)
+
+
+_caches = {
+    "products": _reference_cache("products", ("vendor_products",), _products_fingerprint),
+    "categories": _reference_cache("categories", ("vendor_products",), _products_fingerprint),
+    "stock": _reference_cache("stock", ("vendor_products", "product_stock"), _stock_fingerprint),
+}
+
+
+def products():
+    # [(product_id, product_name), ...]
+    return _caches["products"].get_or_compute(
+        None, lambda: db.query("SELECT product_id, product_name FROM vendor_products ORDER BY product_id"))[0]
+
+
+def categories():
+    return _caches["categories"].get_or_compute(None, lambda: [row[0] for row in db.query(
+        "SELECT DISTINCT category FROM vendor_products WHERE category IS NOT NULL AND category <> '' ORDER BY category")])[0]
+
+
+def stock_levels():
+    # [(stock_id, product_id, product_name, quantity, minimum_stock, maximum_stock), ...]
+    return _caches["stock"].get_or_compute(None, lambda: db.query("""
+        SELECT ps.stock_id, ps.product_id, vp.product_name, ps.quantity, ps.minimum_stock, ps.maximum_stock
+        FROM product_stock ps
+        JOIN vendor_products vp ON ps.product_id = vp.product_id
+        ORDER BY ps.stock_id
+    """))[0]
+
+
+def invalidate():
+    for result_cache in _caches.values():
+        result_cache.invalidate()
+
+
+def cache_stats():
+    # Per list: hits, misses, entries and hit_rate; hits are queries not sent to the database
+    return {name: result_cache.stats() for name, result_cache in _caches.items()}
@@ -1,19 +1,9 @@
 import streamlit as st
-import mysql.connector
-import subprocess
+import auth
 
 
 
 
-
-mydb=mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",
-    database="inventory"
-)
-cursor=mydb.cursor()
-
 tab1,tab2=st.tabs(['Log-In','Register'])
 
 with tab2:
@@ -29,49 +19,39 @@ with tab2:
             company=st.text_input("company")
         submit=st.button("Register")
         if submit:
-            sql="insert into users(name,email,phone,password,user_type,company_name) value(%s,%s,%s,%s,%s,%s)"
-            value=(name,email,phone,password,user,company)
-            cursor.execute(sql,value)
-            mydb.commit()
-            st.success(f'{user} registred succesfully!')
+            try:
+                auth.register(name,email,phone,password,user,company)
+                st.success(f'{user} registred succesfully!')
+            except auth.EmailTaken:
+                st.warning("this email is already registered")
 
 
-def email_validation(email):
-    cursor.execute("select email from users")
-    usr_email=cursor.fetchall()
-    for emails in usr_email:
-        if emails[0]== email:
-            return 1;
-        
-        
-
 with tab1:
      with st.container(border=True):
         st.markdown("""<h3 style="text-align:center">Sign In</h3>""",unsafe_allow_html=True)
+        # Signed-in sessions come from the session cache, not the database
+        signed_in=auth.session_user(st.session_state.get("auth_token"))
+        if signed_in:
+            st.info(f"signed in as {signed_in.name}")
+            if st.button("logout"):
+                auth.logout(st.session_state.pop("auth_token"))
+                st.rerun()
         session_user=st.text_input("Username",key="session_user")
         session_email=st.text_input("email",key="session_email") 
         session_password=st.text_input("Password",type="password",key="session_password")
         if st.button("login"):
-            if  email_validation(session_email):
-                sql="SELECT name,password,user_type from users WHERE email=%s"
-                value=(session_email,)
-                cursor.execute(sql,value)
-                usr,passw,usr_type=cursor.fetchone()
-                if (usr,passw)==(session_user,session_password):
-                    st.success("login Successfully")
-                    if usr_type=='customer':
-                        st.write("customer")
-                    else:
-                        subprocess.Popen(["streamlit", "run", "vendor.py"])
-
+            result=auth.login(session_email,session_password)
+            if result and result[1].name==session_user:
+                token,usr=result
+                st.session_state.auth_token=token
+                st.success("login Successfully")
+                if usr.user_type=='customer':
+                    st.write("customer")
                 else:
-                    st.warning("invalid username or password")
+                    # app.py shows the vendor pages on the next run, in this same server
+                    st.rerun()
             else:
-               st.warning("inavlid email")        
-            
-            
-
-
-
-
-          
\ No newline at end of file
+                if result:
+                    auth.logout(result[0])
+                # One message for every failure, so it does not reveal which emails exist
+                st.warning("invalid username, email or password")
@@ -0,0 +1,226 @@
+import csv
+import heapq
+import io
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import db
+
+# Reorder alerts from product_stock levels and sales velocity. The engine
+# loads product_stock once, then follows stock_movements by movement_id and
+# re-reads only the products that moved, so keeping the alert sets current
+# costs O(changed products) rather than a table scan. Sales velocity works
+# the same way: per-day, per-product sales over the last VELOCITY_DAYS are
+# kept in memory, new sales are folded in above a sale_id high-water mark and
+# days that leave the window are subtracted. Like sales_aggregates.py this
+# treats sales as append-only. A daemon thread refreshes in the background;
+# reads never touch the database except to look up product names.
+REORDER_REFRESH_INTERVAL = float(os.getenv("REORDER_REFRESH_INTERVAL", "10"))
+VELOCITY_DAYS = int(os.getenv("REORDER_VELOCITY_DAYS", "30"))
+COVER_DAYS = float(os.getenv("REORDER_COVER_DAYS", "7"))  # less cover than this counts as at risk
+REORDER_COLUMNS = ["product_id", "product_name", "quantity", "minimum_stock", "maximum_stock", "daily_sales",
+                   "days_of_cover", "status", "reorder_quantity"]
+
+
+class StockLevel:
+    __slots__ = ("quantity", "minimum_stock", "maximum_stock")
+
+    def __init__(self, quantity, minimum_stock, maximum_stock):
+        self.quantity = quantity
+        self.minimum_stock = minimum_stock
+        self.maximum_stock = maximum_stock
+
+
+class ReorderEngine:
+    def __init__(self, refresh_interval=REORDER_REFRESH_INTERVAL, velocity_days=VELOCITY_DAYS, cover_days=COVER_DAYS):
+        self.refresh_interval = refresh_interval
+        self.velocity_days = velocity_days
+        self.cover_days = cover_days
+        self.high_water_mark = None  # last stock_movements.movement_id applied; None until loaded
+        self.levels = {}
+        self.velocity = {}  # product_id -> average units sold per day
+        self.sales_high_water_mark = None
+        self._daily_sales = {}  # "YYYY-MM-DD" -> {product_id: units}
+        self._window_sales = {}  # product_id -> units sold inside the window
+        self.below_minimum = set()
+        self.above_maximum = set()
+        self.low_cover = set()
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _reindex(self, product_id):
+        level = self.levels.get(product_id)
+        for alerts in (self.below_minimum, self.above_maximum, self.low_cover):
+            alerts.discard(product_id)
+        if level is None:
+            return
+        if level.quantity < level.minimum_stock:
+            self.below_minimum.add(product_id)
+        if level.maximum_stock and level.quantity > level.maximum_stock:
+            self.above_maximum.add(product_id)
+        if self.days_of_cover(product_id) < self.cover_days:
+            self.low_cover.add(product_id)
+
+    def _load_levels(self, product_ids=None):
+        sql = "SELECT product_id, quantity, minimum_stock, maximum_stock FROM product_stock"
+        if product_ids is None:
+            rows = db.query(sql)
+            self.levels = {}
+        else:
+            rows = []
+            for start in range(0, len(product_ids), 1000):
+                chunk = product_ids[start:start + 1000]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                rows += db.query(f"{sql} WHERE product_id IN ({placeholders})", tuple(chunk))
+            for product_id in product_ids:
+                self.levels.pop(product_id, None)
+        for product_id, quantity, minimum_stock, maximum_stock in rows:
+            self.levels[product_id] = StockLevel(quantity, minimum_stock, maximum_stock)
+        for product_id in (self.levels if product_ids is None else product_ids):
+            self._reindex(product_id)
+
+    def _load_velocity(self):
+        first_day = (datetime.now() - timedelta(days=self.velocity_days - 1)).strftime("%Y-%m-%d")
+        latest = db.query_one("SELECT MAX(sale_id) FROM sales")[0] or 0
+        changed = set()
+        if self.sales_high_water_mark is None or latest > self.sales_high_water_mark:
+            rows = db.query("""
+                SELECT DATE(sale_date), product_id, SUM(quantity) FROM sales
+                WHERE sale_id > %s AND sale_id <= %s AND sale_date >= %s
+                GROUP BY DATE(sale_date), product_id
+            """, (self.sales_high_water_mark or 0, latest, first_day))
+            for day, product_id, quantity in rows:
+                day_sales = self._daily_sales.setdefault(str(day)[:10], {})
+                day_sales[product_id] = day_sales.get(product_id, 0.0) + float(quantity or 0)
+                self._window_sales[product_id] = self._window_sales.get(product_id, 0.0) + float(quantity or 0)
+                changed.add(product_id)
+            self.sales_high_water_mark = latest
+        for day in [day for day in self._daily_sales if day < first_day]:
+            for product_id, quantity in self._daily_sales.pop(day).items():
+                self._window_sales[product_id] -= quantity
+                changed.add(product_id)
+        for product_id in changed:
+            self.velocity[product_id] = max(self._window_sales[product_id], 0.0) / self.velocity_days
+            # Cover depends on velocity
+            self._reindex(product_id)
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+                return
+            latest = db.query_one("SELECT MAX(movement_id) FROM stock_movements")[0] or 0
+            if self.high_water_mark is None:
+                # Read the mark first: movements committed during the load are applied again next time
+                self._load_levels()
+            elif latest > self.high_water_mark:
+                moved = [row[0] for row in db.query(
+                    "SELECT DISTINCT product_id FROM stock_movements WHERE movement_id > %s AND movement_id <= %s",
+                    (self.high_water_mark, latest))]
+                self._load_levels(moved)
+            self.high_water_mark = latest
+            self._load_velocity()
+            self._checked_at = now
+
+    def rebuild(self):
+        with self._lock:
+            self.high_water_mark = None
+            self.sales_high_water_mark = None
+            self.velocity, self._daily_sales, self._window_sales = {}, {}, {}
+        self.refresh(force=True)
+
+    def start(self):
+        # Background refresh; the first load happens on the caller's thread
+        self.refresh(force=True)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh(force=True)
+            except Exception:
+                # A failed refresh keeps the last good state; the next one retries
+                self._checked_at = None
+
+    def days_of_cover(self, product_id):
+        level = self.levels.get(product_id)
+        if level is None:
+            return math.inf
+        daily_sales = self.velocity.get(product_id, 0.0)
+        return max(level.quantity, 0) / daily_sales if daily_sales > 0 else math.inf
+
+    def _status(self, product_id):
+        if product_id in self.below_minimum:
+            return "below minimum"
+        if product_id in self.above_maximum:
+            return "above maximum"
+        return "low cover"
+
+    def _rows(self, product_ids):
+        names = {}
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), 1000):
+            chunk = product_ids[start:start + 1000]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            names.update(db.query(f"SELECT product_id, product_name FROM vendor_products WHERE product_id IN ({placeholders})",
+                                  tuple(chunk)))
+        rows = []
+        for product_id in product_ids:
+            level = self.levels[product_id]
+            daily_sales = self.velocity.get(product_id, 0.0)
+            # Order up to the maximum level (the minimum if no maximum is set) or
+            # cover_days of sales, whichever is more
+            target = max(level.maximum_stock or level.minimum_stock, math.ceil(daily_sales * self.cover_days))
+            rows.append((product_id, names.get(product_id), level.quantity, level.minimum_stock, level.maximum_stock,
+                         round(daily_sales, 2), round(self.days_of_cover(product_id), 1),
+                         self._status(product_id), max(0, target - level.quantity)))
+        return rows
+
+    def counts(self):
+        with self._lock:
+            return {"below_minimum": len(self.below_minimum), "above_maximum": len(self.above_maximum),
+                    "low_cover": len(self.low_cover), "products": len(self.levels)}
+
+    def at_risk(self, limit=100):
+        # Most urgent first: least days of cover, then lowest quantity
+        with self._lock:
+            product_ids = self.below_minimum | self.above_maximum | self.low_cover
+            urgent = heapq.nsmallest(limit, product_ids,
+                                     key=lambda product_id: (self.days_of_cover(product_id),
+                                                             self.levels[product_id].quantity))
+            return self._rows(urgent)
+
+    def reorder_list(self):
+        # Products to order now: below minimum or running out within cover_days
+        with self._lock:
+            product_ids = sorted(product_id for product_id in self.below_minimum | self.low_cover
+                                 if product_id not in self.above_maximum)
+            return [row for row in self._rows(product_ids) if row[-1] > 0]
+
+    def reorder_csv(self):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(REORDER_COLUMNS)
+        writer.writerows(self.reorder_list())
+        return out.getvalue()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = ReorderEngine()
+                engine.start()
+                _engine = engine
+    return _engine
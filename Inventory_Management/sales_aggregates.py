@@ -0,0 +1,191 @@
+import threading
+import time
+import pandas as pd
+import cache
+import db
+
+# Rollups are kept per day x location x product x channel x gender x age bucket.
+# Sales rows are treated as append-only: each refresh folds in only the rows
+# above the sale_id high-water mark. Call rebuild() after editing old sales.
+# With a shared cache backend the rollup and its mark are published there, so
+# one worker folds in new sales and the others load its result.
+AGE_BUCKET_SIZE = 5
+REFRESH_INTERVAL = 30  # seconds between high-water-mark checks
+KEYS = ["sale_date", "location", "product_id", "sale_channel", "customer_gender", "age_bucket"]
+MEASURES = ["sale_amount", "quantity", "sales_count"]
+SHARED_TTL = 24 * 3600  # the shared rollup is replaced whenever a worker sees newer sales
+
+DELTA_QUERY = """
+    SELECT DATE(sale_date), location, product_id, sale_channel, customer_gender, customer_age,
+           SUM(sale_amount), SUM(quantity), COUNT(*)
+    FROM sales
+    WHERE sale_id > %s AND sale_id <= %s
+    GROUP BY DATE(sale_date), location, product_id, sale_channel, customer_gender, customer_age
+"""
+
+
+def _empty_rollup():
+    frame = pd.DataFrame(columns=KEYS + MEASURES)
+    frame["sale_date"] = pd.to_datetime(frame["sale_date"])
+    return frame
+
+
+def _to_rollup(rows):
+    frame = pd.DataFrame(rows, columns=["sale_date", "location", "product_id", "sale_channel", "customer_gender",
+                                        "customer_age"] + MEASURES)
+    return _rollup(frame)
+
+
+def _rollup(frame):
+    frame["sale_date"] = pd.to_datetime(frame["sale_date"])
+    frame["age_bucket"] = (frame["customer_age"] // AGE_BUCKET_SIZE) * AGE_BUCKET_SIZE
+    for column in MEASURES:
+        frame[column] = frame[column].astype(float)
+    # Ages inside one bucket collapse onto the same key
+    return frame.groupby(KEYS, dropna=False, as_index=False)[MEASURES].sum()
+
+
+def _merge(rollup, delta):
+    if rollup.empty:
+        return delta
+    if delta.empty:
+        return rollup
+    merged = pd.concat([rollup, delta], ignore_index=True)
+    return merged.groupby(KEYS, dropna=False, as_index=False)[MEASURES].sum()
+
+
+class SalesAggregates:
+    def __init__(self, refresh_interval=REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.high_water_mark = 0
+        self.rollup = _empty_rollup()
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+                return self.rollup
+            latest = db.query_one("SELECT MAX(sale_id) FROM sales")[0] or 0
+            if latest > self.high_water_mark:
+                if cache.shared():
+                    # Swap in a new frame so concurrent readers never see a half-merged rollup
+                    self.high_water_mark, self.rollup, _ = cache.shared_compute(
+                        "sales_aggregates", "rollup", lambda mark: mark >= latest, lambda: self._fold(latest),
+                        SHARED_TTL)
+                else:
+                    self.high_water_mark, self.rollup = self._fold(latest)
+            self._checked_at = now
+            return self.rollup
+
+    def _fold(self, latest):
+        # (latest, rollup with every sale up to latest)
+        mark, rollup = self.high_water_mark, self.rollup
+        if cache.shared():
+            # Start from another worker's newer rollup rather than from our own
+            entry = cache.get_backend().get("sales_aggregates", "rollup")
+            if entry is not None and mark < entry[0] <= latest:
+                mark, rollup = entry
+        if latest > mark:
+            rollup = _merge(rollup, _to_rollup(db.query(DELTA_QUERY, (mark, latest))))
+        return latest, rollup
+
+    def rebuild(self):
+        with self._lock:
+            self.high_water_mark = 0
+            self.rollup = _empty_rollup()
+            self._checked_at = None
+            if cache.shared():
+                cache.get_backend().delete("sales_aggregates", "rollup")
+        return self.refresh(force=True)
+
+
+def rollup_from_sales(sales):
+    # Same rollup, built from raw sale rows (e.g. a local snapshot) instead of SQL
+    frame = pd.DataFrame({
+        "sale_date": sales["sale_date"].dt.normalize(),
+        "location": sales["location"].astype(object),
+        "product_id": sales["product_id"],
+        "sale_channel": sales["sale_channel"].astype(object),
+        "customer_gender": sales["customer_gender"].astype(object),
+        "customer_age": sales["customer_age"],
+        "sale_amount": sales["sale_amount"],
+        "quantity": sales["quantity"],
+        "sales_count": 1,
+    })
+    return _rollup(frame)
+
+
+def filter_rollup(rollup, start_date=None, end_date=None, locations=None, products=None):
+    mask = pd.Series(True, index=rollup.index)
+    if start_date is not None:
+        mask &= rollup["sale_date"] >= pd.to_datetime(start_date)
+    if end_date is not None:
+        mask &= rollup["sale_date"] <= pd.to_datetime(end_date)
+    if locations:
+        mask &= rollup["location"].isin(locations)
+    if products:
+        mask &= rollup["product_id"].isin(products)
+    return rollup[mask]
+
+
+def _period(rollup, view_by):
+    if view_by == "Day":
+        return rollup["sale_date"].dt.date
+    if view_by == "Month":
+        return rollup["sale_date"].dt.to_period("M").astype(str)
+    return rollup["sale_date"].dt.year
+
+
+def sales_by_period(rollup, view_by):
+    return rollup.groupby(_period(rollup, view_by))["sale_amount"].sum().reset_index()
+
+
+def totals_by(rollup, column, measure="sale_amount"):
+    return rollup.groupby(column)[measure].sum().reset_index()
+
+
+# Cubes: totals by a few columns x location x channel, much smaller than the
+# rollup, so the dashboard cross-filters them per click without touching the
+# rollup or the database again. One cube can feed several charts.
+def cube(rollup, columns, measure="sale_amount"):
+    keys = list(dict.fromkeys(list(columns) + ["location", "sale_channel"]))
+    return rollup.groupby(keys, dropna=False, as_index=False)[measure].sum()
+
+
+def cube_by_period(rollup, view_by):
+    # Days first on the datetime column, then periods on the much smaller daily cube
+    daily = rollup.groupby(["sale_date", "location", "sale_channel"], dropna=False, as_index=False)["sale_amount"].sum()
+    keys = [_period(daily, view_by), daily["location"], daily["sale_channel"]]
+    return daily.groupby(keys, dropna=False)["sale_amount"].sum().reset_index()
+
+
+def filter_cube(cube, locations=None, channels=None):
+    mask = pd.Series(True, index=cube.index)
+    if locations:
+        mask &= cube["location"].isin(locations)
+    if channels:
+        mask &= cube["sale_channel"].isin(channels)
+    return cube[mask]
+
+
+def total(rollup, measure="sale_amount"):
+    return float(rollup[measure].sum())
+
+
+def distinct_count(rollup, column):
+    return rollup[column].nunique()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = SalesAggregates()
+    return _engine
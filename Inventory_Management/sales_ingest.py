@@ -0,0 +1,389 @@
+import argparse
+import asyncio
+import http.client
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+import cache
+import db
+import stock_ledger
+
+# Sales ingestion service. Point-of-sale feeds POST sale events to /sales; the
+# server queues them and a single writer coalesces whatever has arrived into
+# one transaction of at most INGEST_BATCH_SIZE events. A batch is written as
+# soon as it is full, or INGEST_MAX_DELAY_MS after its first event, so latency
+# stays bounded when traffic is light. Each batch checks its products against
+# vendor_products and product_stock, inserts the accepted sales with one
+# executemany (a multi-row INSERT on MySQL) and applies the stock decrements
+# through stock_ledger in the same transaction. Events for unknown products
+# or without enough stock are rejected one by one; the rest of the batch is
+# still written. A request gets its answer only once its events have
+# committed. The queue holds at most INGEST_QUEUE_LIMIT events; beyond that,
+# requests wait for room, which pushes back on the feeds.
+#
+# Event fields: product_id and quantity (a positive whole number) are required;
+# sale_amount defaults to the product's price after discount times quantity,
+# sale_date to now; location, customer_age, customer_gender, payment_type and
+# sale_channel are optional.
+INGEST_HOST = os.getenv("INGEST_HOST", "127.0.0.1")
+INGEST_PORT = int(os.getenv("INGEST_PORT", "8600"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+INGEST_MAX_DELAY_MS = float(os.getenv("INGEST_MAX_DELAY_MS", "20"))
+INGEST_QUEUE_LIMIT = int(os.getenv("INGEST_QUEUE_LIMIT", "20000"))
+MAX_BODY_BYTES = 16 * 1024 * 1024
+INSERT_SQL = """
+    INSERT INTO sales (product_id, quantity, sale_amount, sale_date, location, customer_age, customer_gender,
+                       payment_type, sale_channel)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+TEXT_FIELDS = {"location": 100, "customer_gender": 10, "payment_type": 20, "sale_channel": 50}
+# sales_loader and the snapshot keep customer_age as int16 (up to 32767)
+MAX_CUSTOMER_AGE = 129
+# sales.quantity and sales.sale_amount are DECIMAL(10, 2), product_id an INT
+MAX_AMOUNT = 99_999_999.99
+MAX_PRODUCT_ID = 2_147_483_647
+
+
+class IngestError(Exception):
+    pass
+
+
+def _number(value):
+    # JSON numbers only; json.loads also accepts NaN, Infinity and overflowing
+    # literals such as 1e999, which would poison the whole batch insert
+    return not isinstance(value, bool) and isinstance(value, (int, float)) and math.isfinite(value)
+
+
+def _whole_number(value, name):
+    if not _number(value) or value != int(value):
+        raise ValueError(f"{name} must be a whole number")
+    return int(value)
+
+
+def parse_event(event):
+    # Field checks that need no database; returns the sales row with
+    # sale_amount None when it is to be priced from vendor_products
+    if not isinstance(event, dict):
+        raise ValueError("event must be an object")
+    if "product_id" not in event or "quantity" not in event:
+        raise ValueError("product_id and quantity are required")
+    product_id = _whole_number(event["product_id"], "product_id")
+    if not 0 < product_id <= MAX_PRODUCT_ID:
+        raise ValueError("product_id is out of range")
+    quantity = _whole_number(event["quantity"], "quantity")
+    if not 0 < quantity <= MAX_AMOUNT:
+        raise ValueError("quantity must be positive and at most 99999999")
+    amount = event.get("sale_amount")
+    if amount is not None:
+        if not _number(amount) or not 0 <= amount <= MAX_AMOUNT:
+            raise ValueError("sale_amount must be a number from 0 to 99999999.99")
+        amount = round(float(amount), 2)
+    if event.get("sale_date") is None:
+        sale_date = datetime.now().replace(microsecond=0)
+    else:
+        try:
+            sale_date = datetime.fromisoformat(str(event["sale_date"]))
+        except ValueError:
+            raise ValueError("sale_date must be an ISO date or datetime")
+        # sale_date is stored in server local time, like the dates the app writes
+        if sale_date.tzinfo is not None:
+            sale_date = sale_date.astimezone().replace(tzinfo=None)
+        sale_date = sale_date.replace(microsecond=0)
+    age = event.get("customer_age")
+    if age is not None:
+        age = _whole_number(age, "customer_age")
+        if not 0 < age <= MAX_CUSTOMER_AGE:
+            raise ValueError("customer_age is out of range")
+    text = {}
+    for name, limit in TEXT_FIELDS.items():
+        value = event.get(name)
+        if value is not None and (not isinstance(value, str) or len(value) > limit):
+            raise ValueError(f"{name} must be text of at most {limit} characters")
+        text[name] = value
+    return (product_id, quantity, amount, sale_date.strftime("%Y-%m-%d %H:%M:%S"), text["location"], age,
+            text["customer_gender"], text["payment_type"], text["sale_channel"])
+
+
+def write_batch(rows):
+    # Writes parsed rows in one transaction; returns an error message per row,
+    # None for every row that was written
+    product_ids = sorted({row[0] for row in rows})
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    lock = " FOR UPDATE" if db.dialect() == "mysql" else ""
+    errors = []
+    accepted = []
+    sold = {}
+    with db.transaction() as cur:
+        cur.execute(f"SELECT product_id, mrp, discount FROM vendor_products WHERE product_id IN ({placeholders})",
+                    tuple(product_ids))
+        prices = {product_id: float(mrp) * (1 - float(discount or 0) / 100) for product_id, mrp, discount in cur.fetchall()}
+        # Locked in id order, like stock_ledger, so concurrent writers cannot deadlock
+        cur.execute(f"SELECT product_id, quantity FROM product_stock WHERE product_id IN ({placeholders}) "
+                    f"ORDER BY product_id{lock}", tuple(product_ids))
+        available = dict(cur.fetchall())
+        for row in rows:
+            product_id, quantity = row[0], row[1]
+            if product_id not in prices:
+                errors.append(f"unknown product_id {product_id}")
+            elif available.get(product_id, 0) - sold.get(product_id, 0) < quantity:
+                errors.append(f"not enough stock for product {product_id}")
+            else:
+                amount = row[2] if row[2] is not None else round(prices[product_id] * quantity, 2)
+                if amount > MAX_AMOUNT:
+                    errors.append(f"sale_amount {amount} is too large")
+                    continue
+                errors.append(None)
+                sold[product_id] = sold.get(product_id, 0) + quantity
+                accepted.append((product_id, quantity, amount) + row[3:])
+        if accepted:
+            cur.executemany(INSERT_SQL, accepted)
+            stock_ledger.record_sales(cur, sold)
+    if accepted:
+        cache.bump("sales")
+        cache.bump("product_stock")
+    return errors
+
+
+def write_each(rows):
+    # Fallback for a batch the database refused as a whole: each row gets its
+    # own transaction, so only the rows that fail are rejected. If none can be
+    # written the problem is the database, not the events, and it is raised
+    errors = []
+    failures = []
+    for row in rows:
+        try:
+            errors.extend(write_batch([row]))
+        except Exception as e:
+            failures.append(e)
+            errors.append(f"not written: {e}")
+    if len(failures) == len(rows):
+        raise failures[0]
+    return errors
+
+
+class Ingestor:
+    def __init__(self, batch_size=INGEST_BATCH_SIZE, max_delay_ms=INGEST_MAX_DELAY_MS, queue_limit=INGEST_QUEUE_LIMIT):
+        self.batch_size = batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.queue = asyncio.Queue(queue_limit)
+        # One writer thread: batches commit in arrival order and never contend
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+        self._writer = None
+        self.events = 0
+        self.accepted = 0
+        self.batches = 0
+        self.write_ms = 0.0
+
+    def start(self):
+        self._writer = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, rows):
+        # Queues parsed rows and waits until they are committed
+        loop = asyncio.get_running_loop()
+        futures = []
+        for row in rows:
+            future = loop.create_future()
+            await self.queue.put((row, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_delay
+        while len(batch) < self.batch_size:
+            if self.queue.empty():
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            rows = [row for row, _ in batch]
+            try:
+                try:
+                    errors = await loop.run_in_executor(self._executor, write_batch, rows)
+                except Exception:
+                    errors = await loop.run_in_executor(self._executor, write_each, rows)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(IngestError(f"batch not written: {e}"))
+                continue
+            self.write_ms += (time.perf_counter() - started) * 1000
+            self.batches += 1
+            self.events += len(batch)
+            self.accepted += errors.count(None)
+            for (_, future), error in zip(batch, errors):
+                if not future.done():
+                    future.set_result(error)
+
+    def stats(self):
+        return {"queued": self.queue.qsize(), "events": self.events, "accepted": self.accepted,
+                "batches": self.batches, "mean_batch": self.events / self.batches if self.batches else 0.0,
+                "write_ms": round(self.write_ms, 1)}
+
+    async def handle(self, events):
+        # Returns (status, body) for a decoded POST /sales payload: one event or a list
+        if isinstance(events, dict):
+            events = [events]
+        if not isinstance(events, list):
+            return 400, {"error": "expected an event or a list of events"}
+        rejected = []
+        rows = []
+        indexes = []
+        for index, event in enumerate(events):
+            try:
+                rows.append(parse_event(event))
+                indexes.append(index)
+            except ValueError as e:
+                rejected.append({"index": index, "error": str(e)})
+        try:
+            errors = await self.submit(rows)
+        except IngestError as e:
+            return 503, {"error": str(e)}
+        rejected.extend({"index": index, "error": error} for index, error in zip(indexes, errors) if error)
+        rejected.sort(key=lambda entry: entry["index"])
+        return 200, {"accepted": len(events) - len(rejected), "rejected": rejected}
+
+
+async def _respond(writer, status, body, keep_alive):
+    payload = json.dumps(body).encode()
+    writer.write(f"HTTP/1.1 {status} {http.client.responses.get(status, '')}\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+    await writer.drain()
+
+
+async def _serve_connection(ingestor, reader, writer):
+    # Minimal HTTP/1.1 with keep-alive, so a feed can reuse one connection
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, version = (request_line.decode("latin-1").split() + ["", "", ""])[:3]
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            length = int(headers.get("content-length") or 0)
+            if length > MAX_BODY_BYTES:
+                await _respond(writer, 413, {"error": "request body too large"}, False)
+                break
+            body = await reader.readexactly(length) if length else b""
+            if method == "POST" and path == "/sales":
+                try:
+                    events = json.loads(body)
+                except ValueError:
+                    status, response = 400, {"error": "body is not valid JSON"}
+                else:
+                    status, response = await ingestor.handle(events)
+            elif method == "GET" and path == "/health":
+                status, response = 200, ingestor.stats()
+            else:
+                status, response = 404, {"error": f"no route for {method} {path}"}
+            await _respond(writer, status, response, keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host=INGEST_HOST, port=INGEST_PORT, ingestor=None, ready=None):
+    ingestor = ingestor or Ingestor()
+    ingestor.start()
+    server = await asyncio.start_server(lambda reader, writer: _serve_connection(ingestor, reader, writer), host, port)
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+class IngestClient:
+    # Blocking client over one keep-alive connection; use one per thread
+    def __init__(self, url=f"http://{INGEST_HOST}:{INGEST_PORT}", timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._conn = None
+
+    def _request(self, method, path, body=None):
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+                response = self._conn.getresponse()
+                payload = json.loads(response.read() or b"{}")
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # The server closed an idle keep-alive connection; retry once on a new one
+                self.close()
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise IngestError(payload.get("error", f"HTTP {response.status}"))
+        return payload
+
+    def send(self, events):
+        # {"accepted": n, "rejected": [{"index": i, "error": ...}, ...]}
+        return self._request("POST", "/sales", json.dumps(events if isinstance(events, list) else [events]).encode())
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def run_in_thread(host=INGEST_HOST, port=INGEST_PORT, **options):
+    # Starts the service on a daemon thread, e.g. next to another app; returns once it listens
+    started = threading.Event()
+    thread = threading.Thread(target=lambda: asyncio.run(serve(host, port, Ingestor(**options),
+                                                               lambda server: started.set())), daemon=True)
+    thread.start()
+    if not started.wait(10):
+        raise IngestError(f"ingestion service did not start on {host}:{port}")
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sales ingestion service")
+    parser.add_argument("--host", default=INGEST_HOST)
+    parser.add_argument("--port", type=int, default=INGEST_PORT)
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--max-delay-ms", type=float, default=INGEST_MAX_DELAY_MS)
+    args = parser.parse_args()
+    print(f"ingesting sales on http://{args.host}:{args.port}/sales", flush=True)
+    try:
+        asyncio.run(serve(args.host, args.port, Ingestor(args.batch_size, args.max_delay_ms)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
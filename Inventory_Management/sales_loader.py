@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import db
+
+# Streams the sales table in fixed-size chunks and builds typed columns as it
+# goes, so only one chunk of Python row tuples is alive at a time. The pooled
+# MySQL cursors are unbuffered, which keeps the full result set on the server
+# until it is read.
+CHUNK_SIZE = 50_000
+SALES_COLUMNS = ['sale_id', 'product_id', 'quantity', 'sale_amount', 'sale_date', 'location', 'customer_age',
+                 'customer_gender', 'payment_type', 'sale_channel']
+# customer_age is an INT in the database; int16 holds any age sales_ingest accepts
+INT_COLUMNS = {"sale_id": np.int32, "product_id": np.int32, "customer_age": np.int16}
+FLOAT_COLUMNS = {"quantity": np.float32, "sale_amount": np.float64}
+CATEGORY_COLUMNS = ["location", "payment_type", "sale_channel", "customer_gender"]
+
+
+class _CategoryEncoder:
+    # Assigns stable integer codes across chunks; pd.concat of per-chunk
+    # categoricals would otherwise fall back to object dtype
+
+    def __init__(self):
+        self.codes = {}
+
+    def encode(self, values):
+        local_codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        # Last slot maps factorize's -1 (NULL) through unchanged
+        lookup = np.empty(len(uniques) + 1, dtype=np.int32)
+        lookup[-1] = -1
+        for i, value in enumerate(uniques):
+            lookup[i] = self.codes.setdefault(value, len(self.codes))
+        return lookup[local_codes]
+
+    def categorical(self, chunks):
+        categories = list(self.codes)
+        codes = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int32)
+        code_dtype = np.int8 if len(categories) < 127 else np.int16 if len(categories) < 32767 else np.int32
+        return pd.Categorical.from_codes(codes.astype(code_dtype), categories=categories)
+
+
+def _int_array(values, dtype):
+    array = np.asarray(values, dtype=object)
+    mask = pd.isna(array)
+    if mask.any():
+        array[mask] = 0
+    return array.astype(dtype), mask
+
+
+def _float_array(values, dtype):
+    # NULLs become NaN and MySQL Decimals are converted in the same pass
+    return np.asarray(values, dtype=object).astype(dtype)
+
+
+def load_sales(sales_filter=None, chunk_size=CHUNK_SIZE):
+    where, params = sales_filter.where() if sales_filter is not None else ("", ())
+    sql = f"SELECT {', '.join(SALES_COLUMNS)} FROM sales{where}"
+
+    int_chunks = {column: [] for column in INT_COLUMNS}
+    float_chunks = {column: [] for column in FLOAT_COLUMNS}
+    date_chunks = []
+    encoders = {column: _CategoryEncoder() for column in CATEGORY_COLUMNS}
+    code_chunks = {column: [] for column in CATEGORY_COLUMNS}
+
+    with db.cursor() as cur:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            columns = dict(zip(SALES_COLUMNS, zip(*rows)))
+            del rows
+            for column, dtype in INT_COLUMNS.items():
+                int_chunks[column].append(_int_array(columns[column], dtype))
+            for column, dtype in FLOAT_COLUMNS.items():
+                float_chunks[column].append(_float_array(columns[column], dtype))
+            date_chunks.append(pd.to_datetime(list(columns["sale_date"])).to_numpy("datetime64[ns]"))
+            for column in CATEGORY_COLUMNS:
+                code_chunks[column].append(encoders[column].encode(columns[column]))
+
+    data = {}
+    for column, dtype in INT_COLUMNS.items():
+        values = np.concatenate([chunk[0] for chunk in int_chunks[column]]) if int_chunks[column] else np.empty(0, dtype)
+        mask = np.concatenate([chunk[1] for chunk in int_chunks[column]]) if int_chunks[column] else np.empty(0, bool)
+        # Only pay for a nullable extension array when the column has NULLs
+        data[column] = pd.arrays.IntegerArray(values, mask) if mask.any() else values
+    for column, dtype in FLOAT_COLUMNS.items():
+        data[column] = np.concatenate(float_chunks[column]) if float_chunks[column] else np.empty(0, dtype)
+    data["sale_date"] = np.concatenate(date_chunks) if date_chunks else np.empty(0, "datetime64[ns]")
+    for column in CATEGORY_COLUMNS:
+        data[column] = encoders[column].categorical(code_chunks[column])
+    return pd.DataFrame({column: data[column] for column in SALES_COLUMNS})
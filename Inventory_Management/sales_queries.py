@@ -0,0 +1,153 @@
+from datetime import date, datetime, timedelta
+import pandas as pd
+import db
+from sales_aggregates import AGE_BUCKET_SIZE
+
+# Query builder for the dashboard: filters become parameterized WHERE clauses
+# and every aggregation runs as a GROUP BY in the database, so only the
+# grouped result crosses the wire. Backed by indexes on sales(sale_date),
+# sales(location) and sales(product_id). The same queries run against
+# sales_daily_summary (see sales_summary.py) when given its table name.
+PERIOD_EXPRESSIONS = {
+    "Day": "DATE(sale_date)",
+    "Month": "DATE_FORMAT(sale_date, '%Y-%m')",
+    "Year": "YEAR(sale_date)",
+}
+GROUP_COLUMNS = {
+    "location": "location",
+    "product_id": "product_id",
+    "sale_channel": "sale_channel",
+    "customer_gender": "customer_gender",
+    "customer_age": "customer_age",
+    "payment_type": "payment_type",
+    # Same buckets as the rollup engine so both dashboard sources chart alike
+    "age_bucket": f"customer_age - customer_age % {AGE_BUCKET_SIZE}",
+}
+MEASURES = {"sale_amount", "quantity"}
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.to_datetime(value).date()
+
+
+class SalesFilter:
+    def __init__(self, start_date=None, end_date=None, locations=None, products=None, after_sale_id=None,
+                 through_sale_id=None):
+        self.start_date = _as_date(start_date) if start_date is not None else None
+        self.end_date = _as_date(end_date) if end_date is not None else None
+        self.locations = list(locations or [])
+        self.products = list(products or [])
+        # sale_id window for incremental readers working from a high-water mark
+        self.after_sale_id = after_sale_id
+        self.through_sale_id = through_sale_id
+
+    def where(self):
+        clauses, params = [], []
+        if self.start_date is not None:
+            clauses.append("sale_date >= %s")
+            params.append(self.start_date.isoformat())
+        if self.end_date is not None:
+            # Half-open range keeps the whole end day and stays index-friendly
+            clauses.append("sale_date < %s")
+            params.append((self.end_date + timedelta(days=1)).isoformat())
+        if self.locations:
+            clauses.append("location IN ({})".format(", ".join(["%s"] * len(self.locations))))
+            params.extend(self.locations)
+        if self.products:
+            clauses.append("product_id IN ({})".format(", ".join(["%s"] * len(self.products))))
+            params.extend(int(product) for product in self.products)
+        if self.after_sale_id is not None:
+            clauses.append("sale_id > %s")
+            params.append(self.after_sale_id)
+        if self.through_sale_id is not None:
+            clauses.append("sale_id <= %s")
+            params.append(self.through_sale_id)
+        if not clauses:
+            return "", ()
+        return " WHERE " + " AND ".join(clauses), tuple(params)
+
+
+def _check_measure(measure):
+    if measure not in MEASURES:
+        raise ValueError(f"unsupported measure: {measure}")
+
+
+def _check_column(column):
+    if column not in GROUP_COLUMNS:
+        raise ValueError(f"unsupported column: {column}")
+
+
+def distinct_values(column, table="sales"):
+    _check_column(column)
+    expression = GROUP_COLUMNS[column]
+    rows = db.query(f"SELECT DISTINCT {expression} FROM {table} WHERE {expression} IS NOT NULL ORDER BY {expression}")
+    return [row[0] for row in rows]
+
+
+def total(sales_filter, measure="sale_amount", table="sales"):
+    _check_measure(measure)
+    where, params = sales_filter.where()
+    value = db.query_one(f"SELECT SUM({measure}) FROM {table}{where}", params)[0]
+    return float(value or 0)
+
+
+def distinct_count(sales_filter, column, table="sales"):
+    _check_column(column)
+    where, params = sales_filter.where()
+    return db.query_one(f"SELECT COUNT(DISTINCT {GROUP_COLUMNS[column]}) FROM {table}{where}", params)[0]
+
+
+def _grouped(expression, name, sales_filter, measure, table="sales"):
+    _check_measure(measure)
+    where, params = sales_filter.where()
+    sql = f"SELECT {expression}, SUM({measure}) FROM {table}{where} GROUP BY {expression} ORDER BY {expression}"
+    frame = pd.DataFrame(db.query(sql, params), columns=[name, measure])
+    frame[measure] = frame[measure].astype(float)
+    return frame
+
+
+def sales_by_period(sales_filter, view_by, table="sales"):
+    return _grouped(PERIOD_EXPRESSIONS[view_by], "sale_date", sales_filter, "sale_amount", table)
+
+
+def totals_by(sales_filter, column, measure="sale_amount", table="sales"):
+    _check_column(column)
+    return _grouped(GROUP_COLUMNS[column], column, sales_filter, measure, table)
+
+
+def _cube(expressions, names, sales_filter, measure, table="sales"):
+    # Totals by the given columns x location x channel in one query; the
+    # dashboard cross-filters these in memory instead of querying again per click
+    _check_measure(measure)
+    where, params = sales_filter.where()
+    keys = dict.fromkeys(zip(expressions + ["location", "sale_channel"], names + ["location", "sale_channel"]))
+    group_by = ", ".join(expression for expression, _ in keys)
+    sql = f"SELECT {group_by}, SUM({measure}) FROM {table}{where} GROUP BY {group_by}"
+    frame = pd.DataFrame(db.query(sql, params), columns=[name for _, name in keys] + [measure])
+    frame[measure] = frame[measure].astype(float)
+    return frame
+
+
+def cube(sales_filter, columns, measure="sale_amount", table="sales"):
+    for column in columns:
+        _check_column(column)
+    return _cube([GROUP_COLUMNS[column] for column in columns], list(columns), sales_filter, measure, table)
+
+
+def cube_by_period(sales_filter, view_by, table="sales"):
+    return _cube([PERIOD_EXPRESSIONS[view_by]], ["sale_date"], sales_filter, "sale_amount", table)
+
+
+def daily_series(sales_filter, table="sales"):
+    # Revenue and units per day x location x product, the forecaster's input
+    where, params = sales_filter.where()
+    sql = (f"SELECT DATE(sale_date), location, product_id, SUM(sale_amount), SUM(quantity) FROM {table}{where} "
+           "GROUP BY DATE(sale_date), location, product_id")
+    frame = pd.DataFrame(db.query(sql, params), columns=["sale_date", "location", "product_id", "sale_amount", "quantity"])
+    frame["sale_date"] = pd.to_datetime(frame["sale_date"])
+    frame[["sale_amount", "quantity"]] = frame[["sale_amount", "quantity"]].astype(float)
+    return frame
@@ -0,0 +1,238 @@
+import os
+import sys
+import threading
+import time
+import db
+import sales_queries
+
+# sales_daily_summary holds SUM(sale_amount), SUM(quantity) and COUNT(*) per
+# day x location x product x channel, so totals and GROUP BYs over those
+# columns read a few thousand summary rows instead of scanning sales. A
+# refresh job folds in sales above the high-water mark kept in summary_state,
+# in batches of SUMMARY_BATCH_SIZE sale_ids per transaction; the mark moves in
+# the same transaction as the summary rows, so concurrent or interrupted
+# refreshes never count a sale twice. Like sales_aggregates.py this treats
+# sales as append-only: run rebuild() after editing or deleting old sales.
+# NULL locations, products and channels are stored as '' / 0 (they are part
+# of the primary key). Columns the summary does not have (gender, age,
+# payment type) are answered from sales.
+SUMMARY_TABLE = "sales_daily_summary"
+SUMMARY_COLUMNS = {"location", "product_id", "sale_channel"}
+SUMMARY_REFRESH_INTERVAL = float(os.getenv("SUMMARY_REFRESH_INTERVAL", "30"))
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "1000000"))
+VERIFY_TOLERANCE = 0.01
+
+
+def _fold_sql():
+    if db.dialect() == "sqlite":
+        conflict = "ON CONFLICT (sale_date, location, product_id, sale_channel) DO UPDATE SET"
+        new = "excluded"
+    else:
+        conflict = "ON DUPLICATE KEY UPDATE"
+        new = None
+    updates = ", ".join(f"{column} = {column} + " + (f"{new}.{column}" if new else f"VALUES({column})")
+                        for column in ("sale_amount", "quantity", "sales_count"))
+    return f"""
+        INSERT INTO {SUMMARY_TABLE} (sale_date, location, product_id, sale_channel, sale_amount, quantity, sales_count)
+        SELECT DATE(sale_date), COALESCE(location, ''), COALESCE(product_id, 0), COALESCE(sale_channel, ''),
+               SUM(sale_amount), SUM(quantity), COUNT(*)
+        FROM sales
+        WHERE sale_id > %s AND sale_id <= %s
+        GROUP BY DATE(sale_date), COALESCE(location, ''), COALESCE(product_id, 0), COALESCE(sale_channel, '')
+        {conflict} {updates}
+    """
+
+
+def _save_mark_sql():
+    if db.dialect() == "sqlite":
+        return """INSERT INTO summary_state (name, high_water_mark) VALUES (%s, %s)
+                  ON CONFLICT (name) DO UPDATE SET high_water_mark = excluded.high_water_mark"""
+    return """INSERT INTO summary_state (name, high_water_mark) VALUES (%s, %s)
+              ON DUPLICATE KEY UPDATE high_water_mark = VALUES(high_water_mark)"""
+
+
+def high_water_mark():
+    row = db.query_one("SELECT high_water_mark FROM summary_state WHERE name = %s", (SUMMARY_TABLE,))
+    return row[0] if row else 0
+
+
+def _fold_batch(latest):
+    # One batch per transaction; returns False once the summary is current
+    lock = " FOR UPDATE" if db.dialect() == "mysql" else ""
+    with db.transaction() as cur:
+        cur.execute(f"SELECT high_water_mark FROM summary_state WHERE name = %s{lock}", (SUMMARY_TABLE,))
+        row = cur.fetchone()
+        mark = row[0] if row else 0
+        if mark >= latest:
+            return False
+        through = min(latest, mark + SUMMARY_BATCH_SIZE)
+        cur.execute(_fold_sql(), (mark, through))
+        cur.execute(_save_mark_sql(), (SUMMARY_TABLE, through))
+    return through < latest
+
+
+def refresh():
+    # Folds in every sale committed so far; returns the new high-water mark
+    latest = db.query_one("SELECT MAX(sale_id) FROM sales")[0] or 0
+    while _fold_batch(latest):
+        pass
+    return high_water_mark()
+
+
+def rebuild():
+    with db.transaction() as cur:
+        cur.execute(f"DELETE FROM {SUMMARY_TABLE}")
+        cur.execute(_save_mark_sql(), (SUMMARY_TABLE, 0))
+    return refresh()
+
+
+class SummaryJob:
+    def __init__(self, refresh_interval=SUMMARY_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+                return
+            refresh()
+            self._checked_at = now
+
+    def start(self):
+        self.refresh(force=True)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh(force=True)
+            except Exception:
+                # The next run retries from the same high-water mark
+                self._checked_at = None
+
+
+_job = None
+_job_lock = threading.Lock()
+
+
+def get_job():
+    global _job
+    if _job is None:
+        with _job_lock:
+            if _job is None:
+                job = SummaryJob()
+                job.start()
+                _job = job
+    return _job
+
+
+# Same interface as sales_queries, so the dashboard can use either
+def _table(column=None):
+    return SUMMARY_TABLE if column is None or column in SUMMARY_COLUMNS else "sales"
+
+
+def distinct_values(column):
+    return sales_queries.distinct_values(column, table=_table(column))
+
+
+def total(sales_filter, measure="sale_amount"):
+    return sales_queries.total(sales_filter, measure, table=SUMMARY_TABLE)
+
+
+def distinct_count(sales_filter, column):
+    return sales_queries.distinct_count(sales_filter, column, table=_table(column))
+
+
+def sales_by_period(sales_filter, view_by):
+    return sales_queries.sales_by_period(sales_filter, view_by, table=SUMMARY_TABLE)
+
+
+def totals_by(sales_filter, column, measure="sale_amount"):
+    return sales_queries.totals_by(sales_filter, column, measure, table=_table(column))
+
+
+def cube(sales_filter, columns, measure="sale_amount"):
+    table = SUMMARY_TABLE if set(columns) <= SUMMARY_COLUMNS else "sales"
+    return sales_queries.cube(sales_filter, columns, measure, table=table)
+
+
+def cube_by_period(sales_filter, view_by):
+    return sales_queries.cube_by_period(sales_filter, view_by, table=SUMMARY_TABLE)
+
+
+def daily_series(sales_filter):
+    return sales_queries.daily_series(sales_filter, table=SUMMARY_TABLE)
+
+
+# Aggregates checked by verify(): name -> (group expression or None for the grand total)
+CHECKS = {
+    "total": None,
+    "location": "COALESCE(location, '')",
+    "product_id": "COALESCE(product_id, 0)",
+    "sale_channel": "COALESCE(sale_channel, '')",
+    "day": "DATE(sale_date)",
+    "year": "YEAR(sale_date)",
+}
+
+
+def _sums(cur, table, expression, count, where="", params=()):
+    select = f"SUM(sale_amount), SUM(quantity), {count}"
+    if expression is None:
+        cur.execute(f"SELECT {select} FROM {table}{where}", params)
+        return {None: cur.fetchone()}
+    cur.execute(f"SELECT {expression}, {select} FROM {table}{where} GROUP BY {expression}", params)
+    return {str(row[0]): row[1:] for row in cur.fetchall()}
+
+
+def verify(checks=None):
+    # Compares the summary with the same aggregates over the raw sales up to
+    # the high-water mark; returns {check: [(key, summary, raw), ...]} for
+    # every group that differs, so an empty dict means the summary is correct.
+    # One transaction keeps a refresh from moving the mark mid-check.
+    checks = checks or list(CHECKS)
+    unknown = [name for name in checks if name not in CHECKS]
+    if unknown:
+        raise ValueError(f"unknown check(s): {', '.join(unknown)}")
+    mismatches = {}
+    with db.transaction() as cur:
+        cur.execute("SELECT high_water_mark FROM summary_state WHERE name = %s", (SUMMARY_TABLE,))
+        row = cur.fetchone()
+        mark = row[0] if row else 0
+        for name in checks:
+            raw = _sums(cur, "sales", CHECKS[name], "COUNT(*)", " WHERE sale_id <= %s", (mark,))
+            summary = _sums(cur, SUMMARY_TABLE, CHECKS[name], "SUM(sales_count)")
+            bad = []
+            for key in sorted(set(raw) | set(summary), key=str):
+                expected = [float(value or 0) for value in raw.get(key, (0, 0, 0))]
+                actual = [float(value or 0) for value in summary.get(key, (0, 0, 0))]
+                if any(abs(a - e) > VERIFY_TOLERANCE for a, e in zip(actual, expected)):
+                    bad.append((key, actual, expected))
+            if bad:
+                mismatches[name] = bad
+    return mismatches
+
+
+if __name__ == "__main__":
+    command = sys.argv[1:2]
+    if command == ["refresh"]:
+        print(f"summary current through sale_id {refresh()}")
+    elif command == ["rebuild"]:
+        print(f"summary rebuilt through sale_id {rebuild()}")
+    elif command == ["verify"]:
+        started = time.perf_counter()
+        mismatches = verify(sys.argv[2:] or None)
+        for name, rows in mismatches.items():
+            print(f"{name}: {len(rows)} group(s) differ")
+            for key, actual, expected in rows[:10]:
+                print(f"  {key}: summary {actual} raw {expected}")
+        print(f"checked through sale_id {high_water_mark()} in {time.perf_counter() - started:.1f}s: "
+              f"{'MISMATCH' if mismatches else 'ok'}")
+        sys.exit(1 if mismatches else 0)
+    else:
+        sys.exit("usage: python sales_summary.py refresh | rebuild | verify [check ...]")
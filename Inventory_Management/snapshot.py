@@ -0,0 +1,296 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import db
+import sales_aggregates
+import sales_loader
+from sales_queries import SalesFilter
+
+# Read-only analytics copy of sales, vendor_products and product_stock kept as
+# Arrow IPC files, so dashboards and the chatbot do not compete with OLTP
+# writes. Sales are partitioned by sale month and appended incrementally from
+# the sale_id high-water mark; files are memory-mapped on read.
+#
+# Several processes may share one directory (launcher.py's workers), so a
+# refresh holds a lock file for its whole run. The manifest lists the sales
+# parts that make up the snapshot: parts it does not list (left by a crash
+# before the manifest moved, or replaced by compaction) are never read and
+# are deleted by the next refresh.
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "300"))  # seconds before a read triggers a refresh
+MAX_PARTS_PER_MONTH = 16
+
+SALES_SCHEMA = pa.schema([
+    ("sale_id", pa.int32()),
+    ("product_id", pa.int32()),
+    ("quantity", pa.float32()),
+    ("sale_amount", pa.float64()),
+    ("sale_date", pa.timestamp("ns")),
+    ("location", pa.string()),
+    ("customer_age", pa.int16()),
+    ("customer_gender", pa.string()),
+    ("payment_type", pa.string()),
+    ("sale_channel", pa.string()),
+])
+REFERENCE_TABLES = {
+    "vendor_products": (["product_id", "product_name", "category", "mrp", "discount", "image", "created_at"],
+                        ["mrp", "discount"]),
+    "product_stock": (["stock_id", "product_id", "quantity", "minimum_stock", "maximum_stock"], []),
+}
+SALES_GROUPINGS = ("location", "product_id", "day", "month", "year")
+
+
+def _write_table(table, path):
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    # Readers either see the previous file or the complete new one
+    os.replace(tmp_path, path)
+
+
+def _read_table(path):
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def _part_range(name):
+    # Part names are part-<first sale_id>-<last sale_id>.arrow
+    _, first, last = os.path.basename(name).rsplit(".", 1)[0].split("-")
+    return int(first), int(last)
+
+
+@contextmanager
+def _file_lock(path, shared=False):
+    # Lock held across processes; shared for readers, exclusive for refresh
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after about 10 seconds
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class Snapshot:
+    def __init__(self, directory=SNAPSHOT_DIR, max_age=SNAPSHOT_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._sales_cache = (None, None)
+        self._rollup_cache = (None, None)
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    @property
+    def _sales_dir(self):
+        return os.path.join(self.directory, "sales")
+
+    @property
+    def _lock_path(self):
+        return os.path.join(self.directory, ".lock")
+
+    def manifest(self):
+        try:
+            with open(self._manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"sales_high_water_mark": 0, "refreshed_at": None, "sales_parts": []}
+
+    def _listed_parts(self, manifest):
+        # Sales parts (paths relative to the sales directory) making up the snapshot
+        if "sales_parts" in manifest:
+            return list(manifest["sales_parts"])
+        # Manifests written before parts were listed: take what is on disk
+        return sorted(name for name in self._files_on_disk() if name.endswith(".arrow"))
+
+    def _files_on_disk(self):
+        if not os.path.isdir(self._sales_dir):
+            return []
+        return [f"{month}/{name}" for month in sorted(os.listdir(self._sales_dir))
+                if os.path.isdir(os.path.join(self._sales_dir, month))
+                for name in sorted(os.listdir(os.path.join(self._sales_dir, month)))]
+
+    def refresh(self, max_age=None):
+        # With max_age, returns without refreshing if another process already did
+        with self._lock:
+            os.makedirs(self._sales_dir, exist_ok=True)
+            with _file_lock(self._lock_path):
+                manifest = self.manifest()
+                if max_age is not None and manifest["refreshed_at"] is not None \
+                        and time.time() - manifest["refreshed_at"] <= max_age:
+                    return manifest
+                high_water_mark = manifest["sales_high_water_mark"]
+                parts = self._listed_parts(manifest)
+                latest = db.query_one("SELECT MAX(sale_id) FROM sales")[0] or 0
+                if latest > high_water_mark:
+                    sales = sales_loader.load_sales(SalesFilter(after_sale_id=high_water_mark, through_sale_id=latest))
+                    parts = self._append_sales(parts, sales, high_water_mark, latest)
+                for name in REFERENCE_TABLES:
+                    self._export_reference(name)
+                manifest = {"sales_high_water_mark": max(latest, high_water_mark), "refreshed_at": time.time(),
+                            "sales_parts": parts}
+                with open(self._manifest_path + ".tmp", "w") as f:
+                    json.dump(manifest, f)
+                os.replace(self._manifest_path + ".tmp", self._manifest_path)
+                self._remove_unlisted(parts)
+                return manifest
+
+    def ensure_fresh(self):
+        manifest = self.manifest()
+        if manifest["refreshed_at"] is None or time.time() - manifest["refreshed_at"] > self.max_age:
+            manifest = self.refresh(max_age=self.max_age)
+        return manifest
+
+    def _append_sales(self, parts, sales, after_sale_id, through_sale_id):
+        # Writes the new sales as one part per month; returns the new part list
+        parts = list(parts)
+        months = sales["sale_date"].dt.strftime("%Y-%m").fillna("unknown")
+        for month, part in sales.groupby(months):
+            frame = part.copy()
+            for column in sales_loader.CATEGORY_COLUMNS:
+                frame[column] = frame[column].astype(object)
+            table = pa.Table.from_pandas(frame, schema=SALES_SCHEMA, preserve_index=False)
+            month_dir = f"sale_month={month}"
+            os.makedirs(os.path.join(self._sales_dir, month_dir), exist_ok=True)
+            name = f"{month_dir}/part-{after_sale_id + 1:010d}-{through_sale_id:010d}.arrow"
+            _write_table(table, os.path.join(self._sales_dir, name))
+            parts.append(name)
+            parts = self._compact(parts, month_dir)
+        return parts
+
+    def _compact(self, parts, month_dir):
+        # Merges a month's parts into one once there are too many; the old
+        # files stay until the manifest no longer lists them
+        month_parts = sorted((name for name in parts if name.startswith(month_dir + "/")), key=_part_range)
+        if len(month_parts) <= MAX_PARTS_PER_MONTH:
+            return parts
+        table = pa.concat_tables(_read_table(os.path.join(self._sales_dir, name)) for name in month_parts)
+        first, last = _part_range(month_parts[0])[0], _part_range(month_parts[-1])[1]
+        name = f"{month_dir}/part-{first:010d}-{last:010d}.arrow"
+        _write_table(table, os.path.join(self._sales_dir, name))
+        return [part for part in parts if part not in month_parts] + [name]
+
+    def _remove_unlisted(self, parts):
+        listed = set(parts)
+        for name in self._files_on_disk():
+            if name not in listed:
+                os.remove(os.path.join(self._sales_dir, name))
+
+    def _export_reference(self, name):
+        columns, float_columns = REFERENCE_TABLES[name]
+        frame = pd.DataFrame(db.query(f"SELECT {', '.join(columns)} FROM {name}"), columns=columns)
+        for column in float_columns:
+            frame[column] = frame[column].astype(float)
+        _write_table(pa.Table.from_pandas(frame, preserve_index=False), os.path.join(self.directory, f"{name}.arrow"))
+
+    def read_sales(self, start_month=None, end_month=None):
+        version = self.ensure_fresh()["sales_high_water_mark"]
+        cached_version, table = self._sales_cache
+        if cached_version != version:
+            table = self._load_sales()
+            self._sales_cache = (version, table)
+        if start_month is None and end_month is None:
+            return table
+        months = pc.strftime(table["sale_date"], format="%Y-%m")
+        mask = pc.and_(pc.greater_equal(months, start_month or ""), pc.less_equal(months, end_month or "9999-99"))
+        return table.filter(mask)
+
+    def _load_sales(self):
+        tables = []
+        covered = {}  # month -> last sale_id already loaded
+        os.makedirs(self.directory, exist_ok=True)
+        with _file_lock(self._lock_path, shared=True):
+            parts = self._listed_parts(self.manifest())
+            for name in sorted(parts, key=lambda name: (os.path.dirname(name), _part_range(name))):
+                month = os.path.dirname(name)
+                first, last = _part_range(name)
+                done = covered.get(month, 0)
+                if last <= done:
+                    continue
+                table = _read_table(os.path.join(self._sales_dir, name))
+                if table.schema != SALES_SCHEMA:
+                    # Parts written with an older schema (customer_age was int8)
+                    table = table.cast(SALES_SCHEMA)
+                # Overlapping sale_id ranges (e.g. from an older snapshot) are only counted once
+                if first <= done:
+                    table = table.filter(pc.greater(table["sale_id"], done))
+                tables.append(table)
+                covered[month] = last
+        if not tables:
+            return SALES_SCHEMA.empty_table()
+        return pa.concat_tables(tables)
+
+    def read_table(self, name):
+        if name not in REFERENCE_TABLES:
+            raise ValueError(f"not a snapshot table: {name}")
+        self.ensure_fresh()
+        return _read_table(os.path.join(self.directory, f"{name}.arrow"))
+
+    def sales_rollup(self):
+        version = self.ensure_fresh()["sales_high_water_mark"]
+        cached_version, rollup = self._rollup_cache
+        if cached_version != version:
+            rollup = sales_aggregates.rollup_from_sales(self.read_sales().to_pandas())
+            self._rollup_cache = (version, rollup)
+        return rollup
+
+    def sales_totals(self, group_by=None):
+        # Answers the chatbot's sales questions as (key, total) rows
+        table = self.read_sales()
+        if group_by is None:
+            return [(pc.sum(table["sale_amount"]).as_py() or 0,)]
+        if group_by not in SALES_GROUPINGS:
+            raise ValueError(f"unsupported grouping: {group_by}")
+        if group_by == "day":
+            keys = pc.strftime(table["sale_date"], format="%Y-%m-%d")
+        elif group_by == "month":
+            keys = pc.strftime(table["sale_date"], format="%Y-%m")
+        elif group_by == "year":
+            keys = pc.year(table["sale_date"])
+        else:
+            keys = table[group_by]
+        grouped = pa.table({"key": keys, "sale_amount": table["sale_amount"]}) \
+            .group_by("key").aggregate([("sale_amount", "sum")]).sort_by("key")
+        return list(zip(grouped["key"].to_pylist(), grouped["sale_amount_sum"].to_pylist()))
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = Snapshot()
+    return _snapshot
+
+
+if __name__ == "__main__":
+    print(get_snapshot().refresh())
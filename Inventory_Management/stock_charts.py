@@ -0,0 +1,63 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import plotly.graph_objects as go
+
+# Figures for the View Stocks section. They are Plotly specs rendered in the
+# browser, built once per distinct set of stock rows and shared by every
+# session, instead of Matplotlib figures rasterized to PNG on each rerun.
+# Only the last few stock versions are kept, so memory stays flat.
+MAX_VERSIONS = 4
+COLUMNS = ["Product Name", "Current Stock", "Minimum Stock", "Maximum Stock"]
+
+_figures = OrderedDict()
+_lock = threading.Lock()
+
+
+def fingerprint(stock_rows):
+    return hashlib.sha256(repr(list(stock_rows)).encode()).hexdigest()
+
+
+def _build(stock_rows):
+    # Plain lists rather than DataFrame columns: Plotly keeps part of every
+    # numpy array it serializes, and these figures are serialized on each rerun
+    names, current, minimum, maximum = (list(column) for column in zip(*stock_rows))
+
+    # Current stock against the minimum/maximum levels
+    levels = go.Figure()
+    levels.add_trace(go.Bar(x=names, y=current, name="Current Stock", marker_color='blue'))
+    levels.add_trace(go.Scatter(x=names, y=minimum, mode='lines+markers', name='Minimum Stock',
+                                line=dict(color='red', dash='dash')))
+    levels.add_trace(go.Scatter(x=names, y=maximum, mode='lines+markers', name='Maximum Stock',
+                                line=dict(color='green', dash='dash')))
+    levels.update_layout(title="Current Stock Levels", xaxis_title="Products", yaxis_title="Stock Quantity",
+                         barmode='group', template='plotly_white')
+
+    distribution = go.Figure(go.Pie(labels=names, values=current, textinfo="percent", sort=False))
+
+    comparison = go.Figure()
+    for label, values in zip(COLUMNS[1:], (current, minimum, maximum)):
+        comparison.add_trace(go.Scatter(x=names, y=values, mode='lines+markers', name=label))
+    comparison.update_layout(title="Stock Levels Comparison", xaxis_title="Products", yaxis_title="Stock Quantity")
+
+    histogram = go.Figure(go.Histogram(x=current, nbinsx=10, opacity=0.7, marker_color='blue'))
+    histogram.update_layout(title="Histogram of Current Stock Levels", xaxis_title="Stock Quantity",
+                            yaxis_title="Frequency")
+
+    return {"levels": levels, "distribution": distribution, "comparison": comparison, "histogram": histogram}
+
+
+def stock_figures(stock_rows):
+    # stock_rows are (product_name, quantity, minimum_stock, maximum_stock)
+    key = fingerprint(stock_rows)
+    with _lock:
+        figures = _figures.get(key)
+        if figures is not None:
+            _figures.move_to_end(key)
+            return figures
+    figures = _build(stock_rows)
+    with _lock:
+        _figures[key] = figures
+        while len(_figures) > MAX_VERSIONS:
+            _figures.popitem(last=False)
+    return figures
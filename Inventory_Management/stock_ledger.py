@@ -0,0 +1,158 @@
+import itertools
+import cache
+import db
+
+# Stock changes as an append-only ledger. Every change is a delta recorded in
+# stock_movements and applied to the single product_stock row of its product
+# in the same transaction, as "quantity = quantity + delta", so concurrent
+# adjustments add up instead of overwriting each other. product_stock.version
+# goes up on every write; set_quantity uses it to reject edits based on a
+# quantity that has changed since it was read. Level changes are recorded as
+# zero-delta movements so followers of the ledger (reorder.py) see them too.
+MOVEMENT_SQL = "INSERT INTO stock_movements (product_id, delta, reason) VALUES (%s, %s, %s)"
+
+
+class StockConflict(Exception):
+    pass
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def _upsert_sql(absolute=False):
+    # Creates the product's row on first use (product_stock.product_id is unique)
+    if db.dialect() == "sqlite":
+        new = "excluded.quantity"
+        conflict = "ON CONFLICT (product_id) DO UPDATE SET"
+    else:
+        new = "VALUES(quantity)"
+        conflict = "ON DUPLICATE KEY UPDATE"
+    quantity = new if absolute else f"quantity + {new}"
+    return f"""
+        INSERT INTO product_stock (product_id, quantity, minimum_stock, maximum_stock, version)
+        VALUES (%s, %s, 0, 0, 1)
+        {conflict} quantity = {quantity}, version = version + 1
+    """
+
+
+_DECREMENT_SQL = """
+    UPDATE product_stock SET quantity = quantity + %s, version = version + 1
+    WHERE product_id = %s AND quantity + %s >= 0
+"""
+
+
+def _apply(cur, deltas):
+    # deltas: {product_id: net delta}. Increments and decrements go through
+    # one pass in id order, so concurrent batches lock rows in the same order
+    # and cannot deadlock; consecutive products whose deltas have the same
+    # sign share one executemany.
+    for decrement, run in itertools.groupby(sorted(deltas.items()), key=lambda item: item[1] < 0):
+        run = list(run)
+        if not decrement:
+            cur.executemany(_upsert_sql(), run)
+            continue
+        cur.executemany(_DECREMENT_SQL, [(delta, product_id, delta) for product_id, delta in run])
+        if cur.rowcount != len(run):
+            placeholders = ", ".join(["%s"] * len(run))
+            cur.execute(f"SELECT product_id, quantity FROM product_stock WHERE product_id IN ({placeholders})",
+                        tuple(product_id for product_id, _ in run))
+            available = dict(cur.fetchall())
+            short = [product_id for product_id, delta in run if available.get(product_id, 0) + delta < 0]
+            raise InsufficientStock(f"not enough stock for product(s) {', '.join(map(str, short))}")
+
+
+def adjust(product_id, delta, reason="adjustment"):
+    # Atomically adds delta (negative to remove stock); returns the new quantity
+    with db.transaction() as cur:
+        _apply(cur, {product_id: delta})
+        cur.execute(MOVEMENT_SQL, (product_id, delta, reason))
+        cur.execute("SELECT quantity FROM product_stock WHERE product_id = %s", (product_id,))
+        quantity = cur.fetchone()[0]
+    cache.bump("product_stock")
+    return quantity
+
+
+def apply_movements(movements):
+    # Applies [(product_id, delta, reason), ...] in one transaction: one
+    # statement per product for the net change plus one multi-row insert into
+    # the ledger. Either every movement is applied or none is.
+    movements = list(movements)
+    if not movements:
+        return 0
+    deltas = {}
+    for product_id, delta, _ in movements:
+        deltas[product_id] = deltas.get(product_id, 0) + delta
+    with db.transaction() as cur:
+        _apply(cur, deltas)
+        cur.executemany(MOVEMENT_SQL, movements)
+    cache.bump("product_stock")
+    return len(movements)
+
+
+def set_quantity(product_id, quantity, expected_version, reason="count"):
+    # Sets an absolute quantity, e.g. after a stock count, provided nobody has
+    # changed the row since expected_version was read
+    with db.transaction() as cur:
+        cur.execute("SELECT quantity, version FROM product_stock WHERE product_id = %s", (product_id,))
+        row = cur.fetchone()
+        if row is None or row[1] != expected_version:
+            raise StockConflict("stock was changed by someone else, reload and try again")
+        cur.execute("UPDATE product_stock SET quantity = %s, version = version + 1 WHERE product_id = %s AND version = %s",
+                    (quantity, product_id, expected_version))
+        if cur.rowcount != 1:
+            raise StockConflict("stock was changed by someone else, reload and try again")
+        if quantity != row[0]:
+            cur.execute(MOVEMENT_SQL, (product_id, quantity - row[0], reason))
+    cache.bump("product_stock")
+
+
+def set_levels(product_id, minimum_stock, maximum_stock):
+    with db.transaction() as cur:
+        cur.execute(_upsert_sql(), (product_id, 0))
+        cur.execute("UPDATE product_stock SET minimum_stock = %s, maximum_stock = %s WHERE product_id = %s",
+                    (minimum_stock, maximum_stock, product_id))
+        cur.execute(MOVEMENT_SQL, (product_id, 0, "levels"))
+    cache.bump("product_stock")
+
+
+def import_stock(cur, rows, reason="import"):
+    # Bulk import inside the caller's transaction: rows are (product_id,
+    # quantity, minimum_stock, maximum_stock) with absolute quantities; the
+    # difference to the current quantity goes to the ledger
+    product_ids = sorted({row[0] for row in rows})
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    lock = " FOR UPDATE" if db.dialect() == "mysql" else ""
+    cur.execute(f"SELECT product_id, quantity FROM product_stock WHERE product_id IN ({placeholders}){lock}",
+                tuple(product_ids))
+    current = dict(cur.fetchall())
+    movements = []
+    for product_id, quantity, _, _ in rows:
+        # Recorded even when only the levels change
+        movements.append((product_id, quantity - current.get(product_id, 0), reason))
+        current[product_id] = quantity
+    cur.executemany(_upsert_sql(absolute=True), [(row[0], row[1]) for row in rows])
+    cur.executemany("UPDATE product_stock SET minimum_stock = %s, maximum_stock = %s WHERE product_id = %s",
+                    [(row[2], row[3], row[0]) for row in rows])
+    cur.executemany(MOVEMENT_SQL, movements)
+
+
+def record_sales(cur, quantities, reason="sale"):
+    # Sold quantities {product_id: units} inside the caller's transaction: one
+    # decrement and one ledger row per product, however many sales it covers
+    if not quantities:
+        return
+    _apply(cur, {product_id: -units for product_id, units in quantities.items()})
+    cur.executemany(MOVEMENT_SQL, [(product_id, -units, reason) for product_id, units in sorted(quantities.items())])
+
+
+def stock_version(product_id):
+    # (quantity, version) of the product's stock row, or None
+    return db.query_one("SELECT quantity, version FROM product_stock WHERE product_id = %s", (product_id,))
+
+
+def movements(product_id, limit=50):
+    return db.query("""
+        SELECT movement_id, delta, reason, created_at FROM stock_movements
+        WHERE product_id = %s ORDER BY movement_id DESC LIMIT %s
+    """, (product_id, limit))
@@ -0,0 +1,105 @@
+import sqlite3
+import pytest
+import db
+import nl_sql
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    # A SQLite stand-in with the allowed tables and a users table that must stay out of reach
+    path = str(tmp_path / "app.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT, password TEXT);
+        CREATE TABLE sales (sale_id INTEGER PRIMARY KEY, product_id INT, quantity INT, sale_amount REAL,
+            sale_date TEXT, location TEXT);
+        CREATE TABLE vendor_products (product_id INTEGER PRIMARY KEY, product_name TEXT, category TEXT, updated_at TEXT);
+        CREATE TABLE product_stock (stock_id INTEGER PRIMARY KEY, product_id INT, quantity INT);
+        CREATE TABLE stock_movements (movement_id INTEGER PRIMARY KEY, product_id INT, delta INT);
+        INSERT INTO users VALUES (1, 'vendor@example.com', 'hash');
+        INSERT INTO sales VALUES (1, 1, 2, 20.0, '2024-01-01 10:00:00', 'Dallas, TX');
+        INSERT INTO vendor_products VALUES (1, 'Lamp', 'Home', '2024-01-01 00:00:00');
+        INSERT INTO product_stock VALUES (1, 1, 5);
+    """)
+    conn.commit()
+    conn.close()
+    db.set_pool(db.sqlite_pool(path))
+    yield path
+    db.set_pool(None)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT u.email, u.password FROM sales s, users u WHERE s.sale_id = 1",
+    "SELECT * FROM sales s JOIN vendor_products p ON s.product_id = p.product_id, users",
+    "SELECT * FROM sales JOIN (users) ON 1",
+    "SELECT * FROM (users)",
+    "SELECT * FROM (sales, users)",
+    "SELECT * FROM (SELECT * FROM users) t",
+    "SELECT (SELECT password FROM users LIMIT 1) FROM sales",
+    "SELECT * FROM sales WHERE sale_id IN (SELECT id FROM users)",
+    "SELECT sale_id FROM sales UNION SELECT id FROM users",
+    "SELECT * FROM main.users",
+    "SELECT * FROM sales, `users`",
+    'SELECT * FROM sales, "users"',
+    "SELECT * FROM pragma_table_info('users')",
+    "SELECT * FROM sqlite_master",
+    "DELETE FROM sales",
+    "SELECT * FROM sales; DELETE FROM sales",
+    "SELECT * FROM sales -- comment",
+    "SELECT * INTO OUTFILE '/tmp/x' FROM sales",
+    "SELECT 1",
+])
+def test_check_read_only_rejects(sql):
+    with pytest.raises(nl_sql.QueryRejected):
+        nl_sql.check_read_only(sql)
+
+
+@pytest.mark.parametrize("sql, tables", [
+    ("SELECT location, SUM(sale_amount) FROM sales GROUP BY location", {"sales": "sales"}),
+    ("SELECT s.product_id, vp.product_name FROM sales s LEFT JOIN vendor_products AS vp "
+     "ON vp.product_id = s.product_id, product_stock ps WHERE ps.product_id = s.product_id",
+     {"sales": "sales", "s": "sales", "vendor_products": "vendor_products", "vp": "vendor_products",
+      "product_stock": "product_stock", "ps": "product_stock"}),
+    ("SELECT * FROM (SELECT location FROM sales WHERE sale_id < 5) t",
+     {"sales": "sales", "t": nl_sql.DERIVED}),
+    ("SELECT name FROM sales WHERE location = 'FROM users, x'", {"sales": "sales"}),
+])
+def test_check_read_only_accepts(sql, tables):
+    assert nl_sql.check_read_only(sql) == tables
+
+
+def test_run_without_candidates_is_rejected():
+    with pytest.raises(nl_sql.QueryRejected):
+        nl_sql.run([])
+
+
+def test_run_rejects_comma_join(sqlite_db):
+    with pytest.raises(nl_sql.QueryRejected):
+        nl_sql.run([("llm", "SELECT u.email, u.password FROM sales s, users u WHERE s.sale_id = 1", [])], 3)
+
+
+def test_run_answers_allowed_tables(sqlite_db):
+    table, rows, truncated = nl_sql.run(
+        [("llm", "SELECT location, SUM(sale_amount) FROM sales GROUP BY location", [])], 3)
+    assert (table, rows, truncated) == ("llm", [("Dallas, TX", 20.0)], False)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT email FROM users",
+    "SELECT name FROM sqlite_master",
+    "DELETE FROM sales",
+    "UPDATE product_stock SET quantity = 0",
+    "PRAGMA table_info(users)",
+])
+def test_readonly_connection_only_reads_allowed_tables(sqlite_db, sql):
+    # Holds even for SQL that got past the parser
+    with nl_sql._cursor() as cur:
+        with pytest.raises(sqlite3.DatabaseError):
+            cur.execute(sql)
+
+
+def test_plan_on_a_table_outside_the_query_is_rejected(sqlite_db, monkeypatch):
+    # A parser miss (users not in the references) must still be caught from the plan
+    monkeypatch.setattr(nl_sql, "_cursor", db.cursor)
+    with pytest.raises(nl_sql.QueryRejected):
+        nl_sql.explain("SELECT * FROM sales s, users u", [], {"sales": "sales", "s": "sales"})
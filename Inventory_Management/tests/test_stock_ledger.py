@@ -0,0 +1,86 @@
+import random
+import sqlite3
+import threading
+import pytest
+import db
+import stock_ledger
+
+INITIAL_QUANTITY = 1_000
+
+
+@pytest.fixture
+def stock_db(tmp_path):
+    path = str(tmp_path / "stock.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE product_stock (stock_id INTEGER PRIMARY KEY, product_id INT NOT NULL UNIQUE, quantity INT NOT NULL,
+            minimum_stock INT NOT NULL, maximum_stock INT NOT NULL, version INT NOT NULL DEFAULT 0);
+        CREATE TABLE stock_movements (movement_id INTEGER PRIMARY KEY, product_id INT NOT NULL, delta INT NOT NULL,
+            reason VARCHAR(50) NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP);
+    """)
+    conn.executemany("INSERT INTO product_stock (product_id, quantity, minimum_stock, maximum_stock) VALUES (?, ?, 0, 0)",
+                     [(product_id, INITIAL_QUANTITY) for product_id in range(1, 6)])
+    conn.commit()
+    conn.close()
+    db.set_pool(db.sqlite_pool(path, size=8))
+    yield path
+    db.set_pool(None)
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.touched = []
+        self.rowcount = 0
+
+    def executemany(self, sql, params):
+        params = list(params)
+        # Decrements pass (delta, product_id, delta), upserts (product_id, delta)
+        self.touched.extend(row[1] if len(row) == 3 else row[0] for row in params)
+        self.rowcount = len(params)
+
+
+def test_apply_touches_products_in_id_order_whatever_the_sign():
+    cur = RecordingCursor()
+    stock_ledger._apply(cur, {5: 1, 2: -1, 9: -4, 7: 3, 1: 2})
+    assert cur.touched == [1, 2, 5, 7, 9]
+
+
+def test_apply_movements_is_all_or_nothing(stock_db):
+    with pytest.raises(stock_ledger.InsufficientStock):
+        stock_ledger.apply_movements([(1, 5, "test"), (2, -INITIAL_QUANTITY - 1, "test"), (3, 1, "test")])
+    assert dict(db.query("SELECT product_id, quantity FROM product_stock")) == {
+        product_id: INITIAL_QUANTITY for product_id in range(1, 6)}
+    assert db.query_one("SELECT COUNT(*) FROM stock_movements")[0] == 0
+
+
+def test_concurrent_mixed_batches_lose_no_updates(stock_db):
+    applied = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        totals = {}
+        for _ in range(40):
+            batch = [(rng.randint(1, 5), rng.choice([-3, -1, 1, 2, 4]), "test") for _ in range(4)]
+            if rng.random() < 0.5:
+                stock_ledger.apply_movements(batch)
+            else:
+                for movement in batch:
+                    stock_ledger.adjust(*movement)
+            for product_id, delta, _ in batch:
+                totals[product_id] = totals.get(product_id, 0) + delta
+        applied.append(totals)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(applied) == len(threads)
+
+    expected = {product_id: INITIAL_QUANTITY for product_id in range(1, 6)}
+    for totals in applied:
+        for product_id, delta in totals.items():
+            expected[product_id] += delta
+    assert dict(db.query("SELECT product_id, quantity FROM product_stock")) == expected
+    ledger = dict(db.query("SELECT product_id, SUM(delta) FROM stock_movements GROUP BY product_id"))
+    assert {product_id: INITIAL_QUANTITY + ledger.get(product_id, 0) for product_id in expected} == expected
@@ -1,10 +1,11 @@
-import os
 import streamlit as st
 from dotenv import load_dotenv
-import mysql.connector
-import google.generativeai as gen_ai
-import plotly.express as px
-import pandas as pd
+import lazy
+import llm_backend
+
+# Sales answers need pandas, Plotly and the query modules; load them with the first sales question
+chat_intents = lazy.module("chat_intents")
+nl_sql = lazy.module("nl_sql")
 
 # Load environment variables
 load_dotenv()
@@ -16,109 +17,40 @@ st.set_page_config(
     layout="centered",
 )
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-# Set up Google Gemini-Pro AI model
-gen_ai.configure(api_key=GOOGLE_API_KEY)
-model = gen_ai.GenerativeModel('gemini-pro')
-
-# Connect to MySQL (sales database)
-mydb = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",
-    database="inventory"
-)
-cursor = mydb.cursor()
+# Set up the chat backend (Gemini-Pro, or the offline stub with LLM_BACKEND=stub) on the first
+# message that needs it, so opening the page does not import and configure the Gemini client
+backend = lazy.Deferred(llm_backend.get_backend, "llm_backend")
 
 # Function to handle sales data queries and visualizations
 def handle_sales_query(query):
     try:
-        # Example query for total sales
-        if "total sales" in query.lower():
-            cursor.execute("SELECT SUM(sale_amount) FROM sales")
-            result = cursor.fetchone()
-            return f"Total sales amount is ${result[0]:,.2f}"
-        
-        # Example query for sales by location with visualization
-        elif "sales by location" in query.lower():
-            cursor.execute("SELECT location, SUM(sale_amount) FROM sales GROUP BY location")
-            result = cursor.fetchall()
-            
-            # Prepare text response
-            response = "Sales by location:\n"
-            for row in result:
-                response += f"- {row[0]}: ${row[1]:,.2f}\n"
-            
-            # Prepare data for visualization
-            df = pd.DataFrame(result, columns=["Location", "Total Sales"])
-            fig = px.bar(df, x="Location", y="Total Sales", title="Sales by Location")
-            
-            # Return text and figure
-            return response, fig
-        
-        # Example query for sales by product with visualization
-        elif "sales by product" in query.lower():
-            cursor.execute("SELECT product_id, SUM(sale_amount) FROM sales GROUP BY product_id")
-            result = cursor.fetchall()
-            
-            # Prepare text response
-            response = "Sales by product:\n"
-            for row in result:
-                response += f"- Product {row[0]}: ${row[1]:,.2f}\n"
-            
-            # Prepare data for visualization
-            df = pd.DataFrame(result, columns=["Product ID", "Total Sales"])
-            fig = px.bar(df, x="Product ID", y="Total Sales", title="Sales by Product")
-            
-            # Return text and figure
-            return response, fig
-
-        # Example query for sales by day, month, and year with visualization
-        elif "sales by day" in query.lower():
-            cursor.execute("SELECT DATE(sale_date), SUM(sale_amount) FROM sales GROUP BY DATE(sale_date)")
-            result = cursor.fetchall()
-            df = pd.DataFrame(result, columns=["Sale Date", "Total Sales"])
-            fig = px.line(df, x="Sale Date", y="Total Sales", title="Sales by Day")
-            return "Sales by day visualized below:", fig
-
-        elif "sales by month" in query.lower():
-            cursor.execute("SELECT DATE_FORMAT(sale_date, '%Y-%m'), SUM(sale_amount) FROM sales GROUP BY DATE_FORMAT(sale_date, '%Y-%m')")
-            result = cursor.fetchall()
-            df = pd.DataFrame(result, columns=["Month", "Total Sales"])
-            fig = px.line(df, x="Month", y="Total Sales", title="Sales by Month")
-            return "Sales by month visualized below:", fig
-
-        elif "sales by year" in query.lower():
-            cursor.execute("SELECT YEAR(sale_date), SUM(sale_amount) FROM sales GROUP BY YEAR(sale_date)")
-            result = cursor.fetchall()
-            df = pd.DataFrame(result, columns=["Year", "Total Sales"])
-            fig = px.line(df, x="Year", y="Total Sales", title="Sales by Year")
-            return "Sales by year visualized below:", fig
-        
-        else:
-            return "I can only answer questions related to 'total sales', 'sales by location', 'sales by product', or 'sales by day/month/year' for now.", None
+        return chat_intents.answer(query)
     except Exception as e:
         return f"An error occurred: {str(e)}", None
 
-# Function to translate roles between Gemini-Pro and Streamlit terminology
-def translate_role_for_streamlit(user_role):
-    if user_role == "model":
-        return "assistant"
-    else:
-        return user_role
+# Function to answer data questions; None when the question is not about the data
+def handle_data_query(query):
+    # Sales questions an intent covers are answered from CHATBOT_SOURCE through the intent cache
+    if "sales" in query.lower() and chat_intents.route(query) is not None:
+        return handle_sales_query(query)
+    try:
+        return nl_sql.answer(query)
+    except nl_sql.QueryRejected as e:
+        return f"I can't run that one: {e}.", None
+    except Exception as e:
+        return f"An error occurred: {str(e)}", None
 
-# Initialize chat session in Streamlit if not already present
-if "chat_session" not in st.session_state:
-    st.session_state.chat_session = model.start_chat(history=[])
+# Initialize chat history in Streamlit if not already present
+if "chat_history" not in st.session_state:
+    st.session_state.chat_history = llm_backend.ChatHistory()
 
 # Display the chatbot's title on the page
 st.markdown("<h2 style='text-align: center;'>🤖 Chat with Gemini-Pro & Sales Data</h2>", unsafe_allow_html=True)
 
 # Display the chat history
-for message in st.session_state.chat_session.history:
-    with st.chat_message(translate_role_for_streamlit(message.role)):
-        st.markdown(message.parts[0].text)
+for role, text in st.session_state.chat_history.transcript:
+    with st.chat_message(role):
+        st.markdown(text)
 
 # Input field for user's message
 user_prompt = st.chat_input("Ask anything, including sales queries or visualizations!")
@@ -126,10 +58,14 @@ if user_prompt:
     # Add user's message to chat and display it
     st.chat_message("user").markdown(user_prompt)
 
-    # Check if the query is related to sales data
-    if "sales" in user_prompt.lower():
+    # Questions about sales, stock or products are answered from the database
+    data_answer = handle_data_query(user_prompt)
+    if data_answer is None and "sales" in user_prompt.lower():
+        data_answer = handle_sales_query(user_prompt)
+
+    if data_answer is not None:
         # Handle sales data query and visualization
-        sales_response, sales_fig = handle_sales_query(user_prompt)
+        sales_response, sales_fig = data_answer
         
         # Display text response
         with st.chat_message("assistant"):
@@ -141,12 +77,19 @@ if user_prompt:
                 st.plotly_chart(sales_fig)
 
     else:
-        # Send user's message to Gemini-Pro and get the response
-        gemini_response = st.session_state.chat_session.send_message(user_prompt)
-        # Display Gemini-Pro's response
+        # Stream the reply into the chat as it is generated
+        history = st.session_state.chat_history
         with st.chat_message("assistant"):
-            st.markdown(gemini_response.text)
+            try:
+                reply = st.write_stream(llm_backend.stream_reply(backend.get(), history, user_prompt))
+            except llm_backend.LLMTimeout as e:
+                reply = None
+                st.warning(str(e))
+            except Exception as e:
+                # Provider errors (credentials, network, a blocked reply) end this reply, not the page
+                reply = None
+                st.error(f"The assistant could not answer: {e}")
+        if reply:
+            history.add("user", user_prompt)
+            history.add("assistant", reply)
 
-# Close MySQL connection at the end
-cursor.close()
-mydb.close()
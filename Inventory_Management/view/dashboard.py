@@ -1,7 +1,18 @@
+import os
 import streamlit as st
-import mysql.connector
 import pandas as pd
 import plotly.express as px
+import db
+import forecasting
+import sales_aggregates
+import sales_queries
+import sales_summary
+import snapshot
+
+# "rollup" answers from in-memory aggregates, "sql" pushes every filter and
+# GROUP BY down into MySQL, "summary" does the same against the
+# sales_daily_summary table, "snapshot" reads the local Arrow snapshot
+DASHBOARD_SOURCE = os.getenv("DASHBOARD_SOURCE", "rollup")
 
 # CSS to enhance UI with dark mode background and aligned metric boxes of equal size
 st.markdown("""
@@ -47,52 +58,136 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Connect to MySQL
-mydb = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",
-    database="inventory"
-)
-cursor = mydb.cursor()
-
-# Query data from MySQL
-query = "SELECT * FROM sales"
-cursor.execute(query)
-data = cursor.fetchall()
-
-# Define column names as per the database
-columns = ['sale_id', 'product_id', 'quantity', 'sale_amount', 'sale_date', 'location', 'customer_age', 'customer_gender', 'payment_type', 'sale_channel']
-
-# Create DataFrame
-df = pd.DataFrame(data, columns=columns)
-
-# Convert sale_date to datetime format
-df['sale_date'] = pd.to_datetime(df['sale_date'])
+if DASHBOARD_SOURCE == "sql":
+    sales_source = sales_queries
+    location_options = sales_queries.distinct_values('location')
+    product_options = sales_queries.distinct_values('product_id')
+    data_version = db.query_one("SELECT MAX(sale_id) FROM sales")[0]
+elif DASHBOARD_SOURCE == "summary":
+    # Kept current by a background refresh job; demographics still read sales
+    sales_summary.get_job()
+    sales_source = sales_summary
+    location_options = sales_summary.distinct_values('location')
+    product_options = sales_summary.distinct_values('product_id')
+    data_version = sales_summary.high_water_mark()
+elif DASHBOARD_SOURCE == "snapshot":
+    # Rollup of the local snapshot, refreshed once it is older than SNAPSHOT_MAX_AGE
+    sales_source = sales_aggregates
+    rollup = snapshot.get_snapshot().sales_rollup()
+    location_options = rollup['location'].unique()
+    product_options = rollup['product_id'].unique()
+    data_version = snapshot.get_snapshot().manifest()["sales_high_water_mark"]
+else:
+    # Pre-computed sales rollups, refreshed incrementally from MySQL
+    sales_source = sales_aggregates
+    rollup = sales_aggregates.get_engine().refresh()
+    location_options = rollup['location'].unique()
+    product_options = rollup['product_id'].unique()
+    data_version = sales_aggregates.get_engine().high_water_mark
 
 # Sidebar for filtering data
 st.sidebar.header("Filter Options")
 start_date = st.sidebar.date_input("Start Date", value=pd.to_datetime("2023-01-01"))
 end_date = st.sidebar.date_input("End Date", value=pd.to_datetime("2024-12-31"))
-selected_location = st.sidebar.multiselect("Select Location", df['location'].unique())
-selected_product = st.sidebar.multiselect("Select Product ID", df['product_id'].unique())
+selected_location = st.sidebar.multiselect("Select Location", location_options)
+selected_product = st.sidebar.multiselect("Select Product ID", product_options)
+
+# Everything the sidebar filters feed into; a chart's data is rebuilt only when this
+# (or the chart's own inputs) change, so reruns for other reasons reuse it
+base = (DASHBOARD_SOURCE, data_version, start_date, end_date, tuple(selected_location), tuple(selected_product))
+
+# Locations and channels clicked in their charts, applied to every other chart
+if "dashboard_cross_filter" not in st.session_state:
+    st.session_state.dashboard_cross_filter = {"location": [], "sale_channel": []}
+if "dashboard_chart_generation" not in st.session_state:
+    st.session_state.dashboard_chart_generation = 0
+cross_filter = st.session_state.dashboard_cross_filter
+
+_filtered = {}
+
+
+def filtered_sales(base):
+    # The sidebar filters, applied at most once per rerun and only when a chart needs rebuilding
+    if base not in _filtered:
+        if DASHBOARD_SOURCE in ("sql", "summary"):
+            _filtered[base] = sales_queries.SalesFilter(start_date, end_date, selected_location, selected_product)
+        else:
+            _filtered[base] = sales_aggregates.filter_rollup(rollup, start_date, end_date, selected_location,
+                                                             selected_product)
+    return _filtered[base]
+
+
+def memo(name, inputs, build):
+    # Per-session results of build(), recomputed only when inputs change
+    if "dashboard_memo" not in st.session_state:
+        st.session_state.dashboard_memo = {}
+    entry = st.session_state.dashboard_memo.get(name)
+    if entry is None or entry[0] != inputs:
+        entry = (inputs, build())
+        st.session_state.dashboard_memo[name] = entry
+    return entry[1]
+
+
+def cube(base, columns, measure="sale_amount"):
+    # Totals by columns x location x channel; clicks are answered from these without new queries
+    return memo(f"cube_{'_'.join(columns)}_{measure}", base,
+                lambda: sales_source.cube(filtered_sales(base), columns, measure))
+
+
+def overview_cube(base):
+    # One cube for the metrics and the location, channel, gender and age charts. The
+    # summary table has no demographics, so there locations and channels get their own.
+    if DASHBOARD_SOURCE == "summary":
+        return cube(base, [])
+    return cube(base, ['customer_gender', 'age_bucket'])
+
+
+def cross_filtered(frame, skip=None):
+    # A cube with the clicked locations and channels applied, except the chart's own column
+    return sales_aggregates.filter_cube(frame, None if skip == "location" else cross_filter["location"],
+                                        None if skip == "sale_channel" else cross_filter["sale_channel"])
+
+
+def cross_key(skip=None):
+    return tuple(() if column == skip else tuple(values) for column, values in cross_filter.items())
+
 
-# Filter data based on selections
-filtered_data = df[(df['sale_date'] >= pd.to_datetime(start_date)) & (df['sale_date'] <= pd.to_datetime(end_date))]
+def follow_selection(column, event):
+    # Bars clicked in this chart become the cross-filter for column; rerun the page so
+    # the other charts pick it up (one click, one rerun)
+    selected = sorted({point["x"] for point in event.selection.points})
+    seen = f"dashboard_seen_{column}_{st.session_state.dashboard_chart_generation}"
+    if selected != st.session_state.get(seen, []):
+        st.session_state[seen] = selected
+        cross_filter[column] = selected
+        st.rerun()
 
-if selected_location:
-    filtered_data = filtered_data[filtered_data['location'].isin(selected_location)]
 
-if selected_product:
-    filtered_data = filtered_data[filtered_data['product_id'].isin(selected_product)]
+def clear_cross_filter():
+    st.session_state.dashboard_cross_filter = {"location": [], "sale_channel": []}
+    # New chart keys drop the selections still shown on the charts
+    st.session_state.dashboard_chart_generation += 1
+
 
 # Display key metrics in three small boxes at the top
 st.title("📊 Sales Analytics Dashboard")
 
 # Metrics calculation
-total_sales = filtered_data['sale_amount'].sum()
-unique_locations = filtered_data['location'].nunique()
-expected_revenue = filtered_data['sale_amount'].sum()
+metrics_data = cross_filtered(overview_cube(base))
+total_sales = float(metrics_data['sale_amount'].sum())
+unique_locations = metrics_data['location'].nunique()
+# Forecast revenue for the next FORECAST_HORIZON days; the date filter does not apply
+if DASHBOARD_SOURCE in ("sql", "summary"):
+    # Daily series queried from the same source, not the in-memory rollup
+    forecasts = forecasting.get_engine().refresh(forecasting.get_daily_series(sales_source).refresh(data_version))
+else:
+    forecasts = forecasting.get_engine().refresh(rollup)
+forecast_locations = cross_filter["location"] or selected_location
+# The forecasts frame is replaced on every refit, so its id identifies it (kept alive in the entry)
+forecast_inputs = (id(forecasts), tuple(forecast_locations), tuple(selected_product))
+filtered_forecasts = memo("forecasts", forecast_inputs, lambda: (
+    forecasts, forecasting.filter_forecasts(forecasts, forecast_locations, selected_product)))[1]
+expected_revenue = forecasting.total(filtered_forecasts)
 
 st.markdown("""
     <div class="metric-container">
@@ -105,64 +200,147 @@ st.markdown("""
             <h2>{}</h2>
         </div>
         <div class="metric-box">
-            <h3>📈 Expected Revenue</h3>
+            <h3>📈 Expected Revenue ({} days)</h3>
             <h2>${:,.2f}</h2>
         </div>
     </div>
-""".format(total_sales, unique_locations, expected_revenue), unsafe_allow_html=True)
+""".format(total_sales, unique_locations, forecasting.FORECAST_HORIZON, expected_revenue), unsafe_allow_html=True)
+
+if cross_filter["location"] or cross_filter["sale_channel"]:
+    clicked = [", ".join(map(str, values)) for values in cross_filter.values() if values]
+    st.caption("Filtered by chart selection: " + " · ".join(clicked))
+    st.button("Clear chart selection", on_click=clear_cross_filter)
+
+def restyle(fig, frame, x, y):
+    trace = fig.data[0]
+    if trace.type == "pie":
+        trace.update(labels=frame[x].to_numpy(), values=frame[y].to_numpy())
+        return
+    trace.update(x=frame[x].to_numpy(), y=frame[y].to_numpy())
+    # Bars coloured by their own value keep following it
+    if trace.marker.color is not None and not isinstance(trace.marker.color, str):
+        trace.marker.color = frame[y].to_numpy()
+
+
+def chart(name, layout_inputs, data_inputs, totals, x, y, build):
+    # Plotly Express takes 50-150 ms to build a figure. When only the cross-filter
+    # changed, the new totals are swapped into the chart's existing figure instead.
+    if "dashboard_charts" not in st.session_state:
+        st.session_state.dashboard_charts = {}
+    entry = st.session_state.dashboard_charts.get(name)
+    if entry is None or entry[0] != layout_inputs:
+        entry = [layout_inputs, data_inputs, build(totals())]
+        st.session_state.dashboard_charts[name] = entry
+    elif entry[1] != data_inputs:
+        restyle(entry[2], totals(), x, y)
+        entry[1] = data_inputs
+    return entry[2]
+
+
+# Each chart below is a fragment: its own controls and clicks rerun only that chart.
+# Clicking a location or channel reruns the page, and the other charts are
+# redrawn from their cubes in memory.
+
 
 # Sales by Day, Month, or Year (with selection box)
-st.sidebar.header("Sales View Options")
-view_by = st.sidebar.selectbox("View sales by", ["Day", "Month", "Year"])
-
-st.header(f"Sales Overview ({view_by})")
-
-# Custom resizing for the only sales chart (small-sized one)
-st.markdown("<div class='custom-chart'>", unsafe_allow_html=True)
-fig = None
-
-if view_by == "Day":
-    sales_by_period = filtered_data.groupby(filtered_data['sale_date'].dt.date)['sale_amount'].sum().reset_index()
-    fig = px.line(sales_by_period, x='sale_date', y='sale_amount', title="Sales by Day")
-elif view_by == "Month":
-    sales_by_period = filtered_data.groupby(filtered_data['sale_date'].dt.to_period("M"))['sale_amount'].sum().reset_index()
-    sales_by_period['sale_date'] = sales_by_period['sale_date'].astype(str)  # Convert Period to string
-    fig = px.bar(sales_by_period, x='sale_date', y='sale_amount', title="Sales by Month")
-else:  # Year
-    sales_by_period = filtered_data.groupby(filtered_data['sale_date'].dt.year)['sale_amount'].sum().reset_index()
-    fig = px.bar(sales_by_period, x='sale_date', y='sale_amount', title="Sales by Year")
-
-st.plotly_chart(fig, use_container_width=True)
-st.markdown("</div>", unsafe_allow_html=True)
-
-# Sales by Location with heatmap
-st.header("📍 Sales Heatmap by Location")
-sales_by_location = filtered_data.groupby('location')['sale_amount'].sum().reset_index()
-fig = px.density_heatmap(sales_by_location, x='location', y='sale_amount', title="Sales by Location", labels={'sale_amount': 'Sales Amount', 'location': 'Location'}, color_continuous_scale=px.colors.sequential.Plasma)
-st.plotly_chart(fig)
+@st.fragment
+def sales_overview(base):
+    st.header("Sales Overview")
+    view_by = st.selectbox("View sales by", ["Day", "Month", "Year"], key="dashboard_view_by")
+
+    # Custom resizing for the only sales chart (small-sized one)
+    st.markdown("<div class='custom-chart'>", unsafe_allow_html=True)
+    # Months and years are regrouped from the daily cube, so switching views needs no query
+    daily_cube = memo("cube_period_day", base, lambda: sales_source.cube_by_period(filtered_sales(base), "Day"))
+    period_cube = daily_cube if view_by == "Day" else memo("cube_period", base + (view_by,), lambda: (
+        sales_aggregates.cube_by_period(daily_cube.assign(sale_date=pd.to_datetime(daily_cube['sale_date'])), view_by)))
+
+    def figure(sales_by_period):
+        if view_by == "Day":
+            return px.line(sales_by_period, x='sale_date', y='sale_amount', title="Sales by Day")
+        elif view_by == "Month":
+            return px.bar(sales_by_period, x='sale_date', y='sale_amount', title="Sales by Month")
+        else:  # Year
+            return px.bar(sales_by_period, x='sale_date', y='sale_amount', title="Sales by Year")
+
+    fig = chart("period", base + (view_by,), cross_key(),
+                lambda: sales_aggregates.totals_by(cross_filtered(period_cube), 'sale_date'), 'sale_date',
+                'sale_amount', figure)
+    st.plotly_chart(fig, use_container_width=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
+# Sales by Location; click bars to filter the other charts
+@st.fragment
+def sales_by_location(base):
+    st.header("📍 Sales by Location")
+    location_cube = overview_cube(base)
+    fig = chart("location", base, cross_key("location"),
+                lambda: sales_aggregates.totals_by(cross_filtered(location_cube, "location"), 'location'),
+                'location', 'sale_amount',
+                lambda sales_by_location: px.bar(sales_by_location, x='location', y='sale_amount', title="Sales by Location (click to filter)", labels={'sale_amount': 'Sales Amount', 'location': 'Location'}, color='sale_amount', color_continuous_scale=px.colors.sequential.Plasma))
+    event = st.plotly_chart(fig, key=f"dashboard_location_chart_{st.session_state.dashboard_chart_generation}",
+                            on_select="rerun", selection_mode="points")
+    follow_selection("location", event)
+
 
 # Most Sold Products
-st.header("🛒 Top Products Sold")
-top_products = filtered_data.groupby('product_id')['quantity'].sum().reset_index().sort_values(by='quantity', ascending=False)
-fig = px.bar(top_products, x='product_id', y='quantity', title="Top Products Sold", labels={'product_id': 'Product ID', 'quantity': 'Quantity Sold'}, color='quantity', color_continuous_scale=px.colors.sequential.Plasma)
-st.plotly_chart(fig)
+@st.fragment
+def top_products_sold(base):
+    st.header("🛒 Top Products Sold")
+    product_cube = cube(base, ['product_id'], 'quantity')
+    fig = chart("products", base, cross_key(),
+                lambda: sales_aggregates.totals_by(cross_filtered(product_cube), 'product_id', 'quantity').sort_values(by='quantity', ascending=False),
+                'product_id', 'quantity',
+                lambda top_products: px.bar(top_products, x='product_id', y='quantity', title="Top Products Sold", labels={'product_id': 'Product ID', 'quantity': 'Quantity Sold'}, color='quantity', color_continuous_scale=px.colors.sequential.Plasma))
+    st.plotly_chart(fig)
+
+
+# Per-SKU demand forecast
+@st.fragment
+def demand_forecast(forecast_inputs):
+    st.header(f"🔮 Demand Forecast (next {forecasting.FORECAST_HORIZON} days)")
+    product_forecasts = memo("forecast_by_product", forecast_inputs, lambda: forecasting.by_product(filtered_forecasts))
+    fig = memo("chart_forecast", forecast_inputs, lambda: px.bar(product_forecasts.head(20), x='product_id', y='units', title="Forecast Units by Product", labels={'product_id': 'Product ID', 'units': 'Forecast Units'}, color='revenue', color_continuous_scale=px.colors.sequential.Plasma))
+    st.plotly_chart(fig)
+    st.dataframe(product_forecasts.round(2), hide_index=True, use_container_width=True)
+
+
+# Sales Channel Analysis; click bars to filter the other charts
+@st.fragment
+def sales_by_channel(base):
+    st.header("💻 Sales by Channel")
+    channel_cube = overview_cube(base)
+    fig = chart("channel", base, cross_key("sale_channel"),
+                lambda: sales_aggregates.totals_by(cross_filtered(channel_cube, "sale_channel"), 'sale_channel'),
+                'sale_channel', 'sale_amount',
+                lambda sales_by_channel: px.bar(sales_by_channel, x='sale_channel', y='sale_amount', title="Sales Distribution by Channel (click to filter)", labels={'sale_amount': 'Sales Amount', 'sale_channel': 'Channel'}, color='sale_amount', color_continuous_scale=px.colors.sequential.Teal))
+    event = st.plotly_chart(fig, key=f"dashboard_channel_chart_{st.session_state.dashboard_chart_generation}",
+                            on_select="rerun", selection_mode="points")
+    follow_selection("sale_channel", event)
 
-# Sales Channel Analysis
-st.header("💻 Sales by Channel")
-sales_by_channel = filtered_data.groupby('sale_channel')['sale_amount'].sum().reset_index()
-fig = px.pie(sales_by_channel, names='sale_channel', values='sale_amount', title="Sales Distribution by Channel", color_discrete_sequence=px.colors.sequential.Teal)
-st.plotly_chart(fig)
 
 # Customer Demographics (Gender, Age)
-st.header("👥 Customer Demographics")
-gender_distribution = filtered_data.groupby('customer_gender')['sale_amount'].sum().reset_index()
-fig = px.pie(gender_distribution, names='customer_gender', values='sale_amount', title="Sales by Gender", color_discrete_sequence=px.colors.sequential.RdBu)
-st.plotly_chart(fig)
-
-age_distribution = filtered_data.groupby('customer_age')['sale_amount'].sum().reset_index()
-fig = px.bar(age_distribution, x='customer_age', y='sale_amount', title="Sales by Customer Age", labels={'customer_age': 'Customer Age', 'sale_amount': 'Sales Amount'}, color='sale_amount', color_continuous_scale=px.colors.sequential.Turbo)
-st.plotly_chart(fig)
-
-# Close MySQL connection
-cursor.close()
-mydb.close()
+@st.fragment
+def customer_demographics(base):
+    st.header("👥 Customer Demographics")
+    demographics_cube = cube(base, ['customer_gender', 'age_bucket'])
+    fig = chart("gender", base, cross_key(),
+                lambda: sales_aggregates.totals_by(cross_filtered(demographics_cube), 'customer_gender'),
+                'customer_gender', 'sale_amount',
+                lambda gender_distribution: px.pie(gender_distribution, names='customer_gender', values='sale_amount', title="Sales by Gender", color_discrete_sequence=px.colors.sequential.RdBu))
+    st.plotly_chart(fig)
+
+    fig = chart("age", base, cross_key(),
+                lambda: sales_aggregates.totals_by(cross_filtered(demographics_cube), 'age_bucket'),
+                'age_bucket', 'sale_amount',
+                lambda age_distribution: px.bar(age_distribution, x='age_bucket', y='sale_amount', title="Sales by Customer Age", labels={'age_bucket': 'Customer Age', 'sale_amount': 'Sales Amount'}, color='sale_amount', color_continuous_scale=px.colors.sequential.Turbo))
+    st.plotly_chart(fig)
+
+
+sales_overview(base)
+sales_by_location(base)
+top_products_sold(base)
+demand_forecast(forecast_inputs)
+sales_by_channel(base)
+customer_demographics(base)
@@ -1,30 +1,26 @@
 import streamlit as st
-import mysql.connector  
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
+import lazy
+import reference_data
+import reorder
+import stock_charts
+import stock_ledger
 
-
-# Database connection
-mydb = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",
-    database="inventory"
-)
-cursor = mydb.cursor()
+# Only the View Stocks and Reorder Alerts tables need pandas
+pd = lazy.module("pandas")
 
 st.title("Inventory Management")
 
-tab1, tab2, tab3 = st.tabs(['Add Stock', 'Update Stock', 'View Stocks'])
+# Only the selected section runs; st.tabs would execute every tab body on each rerun
+sections = ['Add Stock', 'Update Stock', 'View Stocks', 'Reorder Alerts']
+section = st.segmented_control("Section", sections, default=sections[0], key="inventory_section",
+                               label_visibility="collapsed") or sections[0]
 
-with tab1:
+if section == 'Add Stock':
     st.header("Add Stock for Product")
 
-    # Retrieve products from the database
-    cursor.execute("SELECT product_id, product_name FROM vendor_products")
-    products = cursor.fetchall()
+    # Product list shared with the catalog page (cached until a write)
+    products = reference_data.products()
 
     if products:
         product_options = {f"{prod[1]} (ID: {prod[0]})": prod[0] for prod in products}
@@ -41,64 +37,65 @@ with tab1:
             if quantity_to_add > 0:
                 product_id = product_options[selected_product]
 
-                # Insert stock entry into the product_stock table
-                add_stock_query = """
-                    INSERT INTO product_stock (product_id, quantity, minimum_stock, maximum_stock)
-                    VALUES (%s, %s, %s, %s)
-                """
-
-                cursor.execute(add_stock_query, (product_id, quantity_to_add, minimum_stock, maximum_stock))
-                mydb.commit()
-                st.success(f"Stock added successfully for {selected_product}!")
+                # Adds to the product's stock row (created on first use) and records the movement
+                new_total = stock_ledger.adjust(product_id, quantity_to_add, "restock")
+                if minimum_stock or maximum_stock:
+                    stock_ledger.set_levels(product_id, minimum_stock, maximum_stock)
+                st.success(f"Stock added successfully for {selected_product}! New quantity: {new_total}")
             else:
                 st.error("Please enter a valid quantity to add.")
     else:
         st.write("No products available to add stock.")
 
-with tab2:
+elif section == 'Update Stock':
     st.header("Update Stock for Products")
 
-    # Retrieve stocks from the database
-    cursor.execute(""" 
-        SELECT ps.stock_id, vp.product_name, ps.quantity 
-        FROM product_stock ps 
-        JOIN vendor_products vp ON ps.product_id = vp.product_id 
-    """)
-    stocks = cursor.fetchall()
+    # Stock levels shared with the View Stocks tab (cached until a write)
+    stocks = reference_data.stock_levels()
 
     if stocks:
-        # Create a dictionary to map product names to stock IDs
-        stock_options = {f"{stock[1]} (Stock ID: {stock[0]})": stock[0] for stock in stocks}
+        # Create a dictionary to map product names to product IDs (one stock row per product)
+        stock_options = {f"{stock[2]} (Stock ID: {stock[0]})": stock[1] for stock in stocks}
         selected_stock = st.selectbox("Select a Product to Update Stock", options=list(stock_options.keys()))
-
-        # Fetch current stock details
-        stock_id = stock_options[selected_stock]
-        cursor.execute("SELECT quantity FROM product_stock WHERE stock_id = %s", (stock_id,))
-        current_quantity = cursor.fetchone()[0]
-
-        # Input for updated stock quantity
-        new_quantity = st.number_input("Enter New Stock Quantity", value=current_quantity, min_value=0, format="%d")
+        product_id = stock_options[selected_stock]
+
+        # Quantity and version as first shown; the update is rejected if the row changed since
+        loaded = st.session_state.get("stock_loaded")
+        if loaded is None or loaded[0] != product_id:
+            loaded = st.session_state.stock_loaded = (product_id,) + tuple(stock_ledger.stock_version(product_id))
+        _, current_quantity, version = loaded
+        st.write(f"Current quantity: {current_quantity}")
+
+        mode = st.radio("Change", ["Adjust by", "Set quantity"], horizontal=True)
+        if mode == "Adjust by":
+            # Relative changes are applied atomically and never conflict
+            delta = st.number_input("Quantity to add (negative to remove)", value=0, step=1, format="%d")
+        else:
+            new_quantity = st.number_input("Enter New Stock Quantity", value=current_quantity, min_value=0,
+                                           format="%d", key=f"new_quantity_{product_id}_{version}")
 
         if st.button("Update Stock"):
-            update_stock_query = "UPDATE product_stock SET quantity = %s WHERE stock_id = %s"
-            cursor.execute(update_stock_query, (new_quantity, stock_id))
-            mydb.commit()
-            st.success("Stock updated successfully!")
+            try:
+                if mode == "Adjust by":
+                    new_total = stock_ledger.adjust(product_id, delta, "adjustment")
+                else:
+                    stock_ledger.set_quantity(product_id, new_quantity, version)
+                    new_total = new_quantity
+                st.success(f"Stock updated successfully! New quantity: {new_total}")
+            except (stock_ledger.StockConflict, stock_ledger.InsufficientStock) as e:
+                st.error(str(e))
+            # Start the next edit from the current row
+            del st.session_state.stock_loaded
     else:
         st.write("No stock records available to update.")
 
 
 
-with tab3:
+elif section == 'View Stocks':
     st.header("View Product Stocks")
 
-    # Retrieve products and their stock levels from the database
-    cursor.execute(""" 
-        SELECT vp.product_name, ps.quantity, ps.minimum_stock, ps.maximum_stock 
-        FROM product_stock ps 
-        JOIN vendor_products vp ON ps.product_id = vp.product_id 
-    """)
-    stock_data = cursor.fetchall()
+    # Products and their stock levels (same cached rows as the Update Stock tab)
+    stock_data = [stock[2:] for stock in reference_data.stock_levels()]
 
     if stock_data:
         # Create a DataFrame for better visualization
@@ -107,69 +104,40 @@ with tab3:
         # Display the stock table
         st.write(df)
 
-        # Create a candlestick-like visualization
-        fig = go.Figure()
-
-        # Add traces for current stock, minimum stock, and maximum stock
-        fig.add_trace(go.Bar(
-            x=df["Product Name"],
-            y=df["Current Stock"],
-            name="Current Stock",
-            marker_color='blue'
-        ))
-
-        fig.add_trace(go.Scatter(
-            x=df["Product Name"],
-            y=df["Minimum Stock"],
-            mode='lines+markers',
-            name='Minimum Stock',
-            line=dict(color='red', dash='dash')
-        ))
-
-        fig.add_trace(go.Scatter(
-            x=df["Product Name"],
-            y=df["Maximum Stock"],
-            mode='lines+markers',
-            name='Maximum Stock',
-            line=dict(color='green', dash='dash')
-        ))
-
-        # Update layout for better visualization
-        fig.update_layout(
-            title="Current Stock Levels",
-            xaxis_title="Products",
-            yaxis_title="Stock Quantity",
-            barmode='group',
-            template='plotly_white'
-        )
-
-        st.plotly_chart(fig)
-
+        # Client-rendered figures, built once per version of the stock rows
+        figures = stock_charts.stock_figures(stock_data)
+        st.plotly_chart(figures["levels"])
 
         st.subheader("Stock Distribution")
-        pie_fig, pie_ax = plt.subplots(figsize=(8, 8))
-        pie_ax.pie(df["Current Stock"], labels=df["Product Name"], autopct='%1.1f%%', startangle=90)
-        pie_ax.axis('equal')  # Equal aspect ratio ensures that pie chart is circular.
-        st.pyplot(pie_fig)
+        st.plotly_chart(figures["distribution"])
 
         # Visualization 3: Line chart for stock levels
         st.subheader("Stock Levels Over Products")
-        line_fig, line_ax = plt.subplots(figsize=(10, 6))
-        df.plot(x='Product Name', y=['Current Stock', 'Minimum Stock', 'Maximum Stock'], ax=line_ax, marker='o')
-        line_ax.set_title("Stock Levels Comparison")
-        line_ax.set_ylabel("Stock Quantity")
-        line_ax.set_xlabel("Products")
-        line_ax.legend(["Current Stock", "Minimum Stock", "Maximum Stock"])
-        st.pyplot(line_fig)
+        st.plotly_chart(figures["comparison"])
 
         # Visualization 4: Histogram of current stock levels
         st.subheader("Distribution of Current Stock Levels")
-        hist_fig, hist_ax = plt.subplots(figsize=(10, 6))
-        hist_ax.hist(df["Current Stock"], bins=10, alpha=0.7, color='blue')
-        hist_ax.set_title("Histogram of Current Stock Levels")
-        hist_ax.set_xlabel("Stock Quantity")
-        hist_ax.set_ylabel("Frequency")
-        st.pyplot(hist_fig)
+        st.plotly_chart(figures["histogram"])
 
     else:
         st.write("No stock records available to view.")
+
+
+elif section == 'Reorder Alerts':
+    st.header("Reorder Alerts")
+
+    # Kept current in the background from the stock ledger; nothing is rescanned here
+    engine = reorder.get_engine()
+    counts = engine.counts()
+    metric_cols = st.columns(3)
+    metric_cols[0].metric("Below minimum", counts["below_minimum"])
+    metric_cols[1].metric("Above maximum", counts["above_maximum"])
+    metric_cols[2].metric(f"Under {engine.cover_days:g} days of cover", counts["low_cover"])
+
+    at_risk = engine.at_risk(limit=200)
+    if at_risk:
+        st.dataframe(pd.DataFrame(at_risk, columns=reorder.REORDER_COLUMNS), hide_index=True)
+        st.download_button("Download reorder list (CSV)", engine.reorder_csv(), file_name="reorder_list.csv",
+                           mime="text/csv")
+    else:
+        st.write("No products are at risk.")
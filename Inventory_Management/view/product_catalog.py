@@ -1,21 +1,21 @@
 import streamlit as st
-import mysql.connector  
-import os
-
-# Database connection
-mydb = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",
-    database="inventory"
-)
-cursor = mydb.cursor()
+import io
+import math
+import db
+import bulk_io
+import cache
+import catalog
+import image_store
+import reference_data
 
 st.title("Product_catalog")
 
-tab1, tab2, tab3, tab4 = st.tabs(['Add Products', 'Remove Products', 'Update Products', 'View Products'])
+# Only the selected section runs; st.tabs would execute every tab body on each rerun
+sections = ['Add Products', 'Remove Products', 'Update Products', 'View Products', 'Bulk Import/Export']
+section = st.segmented_control("Section", sections, default=sections[0], key="catalog_section",
+                               label_visibility="collapsed") or sections[0]
 
-with tab1:
+if section == 'Add Products':
     # Streamlit interface
     st.header("Vendor Product Upload")
 
@@ -27,35 +27,33 @@ with tab1:
     image = st.file_uploader("Upload Product Image", type=["jpg", "jpeg", "png"])
 
     if st.button("Save Product"):
-        if product_name and category and mrp:
-            # Create the directory to store images if it doesn't exist
-            image_directory = "product_images"
-            if not os.path.exists(image_directory):
-                os.makedirs(image_directory)
-
-            # Save the uploaded image to the local directory
-            image_path = os.path.join(image_directory, image.name)
-            with open(image_path, "wb") as f:
-                f.write(image.getbuffer())
-
-            # SQL query to insert the product data into the database
-            query = """
-                INSERT INTO vendor_products (product_name, category, mrp, discount, image)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            cursor.execute(query, (product_name, category, mrp, discount, image_path))
-            mydb.commit()
-            st.success("Product added successfully with image!")
+        if product_name and category and mrp and image:
+            # Store the image under its content hash (identical uploads are kept once)
+            try:
+                image_path = image_store.save_image(image.getvalue(), image.name)
+            except image_store.read_errors():
+                # Not an image Pillow can read, or corrupt
+                image_path = None
+                st.error("The uploaded file is not a readable JPG or PNG image.")
+
+            if image_path is not None:
+                # SQL query to insert the product data into the database
+                query = """
+                    INSERT INTO vendor_products (product_name, category, mrp, discount, image)
+                    VALUES (%s, %s, %s, %s, %s)
+                """
+                db.execute(query, (product_name, category, mrp, discount, image_path))
+                cache.bump("vendor_products")
+                st.success("Product added successfully with image!")
         else:
             st.error("Please fill all fields and upload an image!")
 
 
-with tab2:
+elif section == 'Remove Products':
     st.header("Product Catalog - Remove Products")
 
-    # Retrieve products from the database
-    cursor.execute("SELECT product_id, product_name FROM vendor_products")
-    products = cursor.fetchall()
+    # Product list shared with the other tabs and pages (cached until a write)
+    products = reference_data.products()
 
     # Display the list of products for removal
     if products:
@@ -68,8 +66,8 @@ with tab2:
             
             # Delete the selected product from the database
             delete_query = "DELETE FROM vendor_products WHERE product_id = %s"
-            cursor.execute(delete_query, (product_id,))
-            mydb.commit()
+            db.execute(delete_query, (product_id,))
+            cache.bump("vendor_products")
             
             st.success(f"Product '{selected_product}' has been removed successfully.")
     else:
@@ -77,12 +75,11 @@ with tab2:
 
 
 
-with tab3:
+elif section == 'Update Products':
     st.header("Product Catalog - Update Products")
 
-    # Retrieve products from the database
-    cursor.execute("SELECT product_id, product_name FROM vendor_products")  # Changed 'id' to 'product_id'
-    products = cursor.fetchall()
+    # Product list shared with the other tabs and pages (cached until a write)
+    products = reference_data.products()
 
     if products:
         product_options = {f"{prod[1]} (ID: {prod[0]})": prod[0] for prod in products}
@@ -90,8 +87,7 @@ with tab3:
 
         # Fetch current product details for the selected product
         product_id = product_options[selected_product]
-        cursor.execute("SELECT product_name, category, mrp, discount, image FROM vendor_products WHERE product_id = %s", (product_id,))  # Changed 'id' to 'product_id'
-        product_data = cursor.fetchone()
+        product_data = db.query_one("SELECT product_name, category, mrp, discount, image FROM vendor_products WHERE product_id = %s", (product_id,))  # Changed 'id' to 'product_id'
 
         # Prefill current details in the form
         if product_data:
@@ -107,44 +103,55 @@ with tab3:
 
             if st.button("Update Product"):
                 # Handle image update if a new image is uploaded
+                # Keep the old image path if no new image is uploaded
+                image_path = current_image
+                image_saved = True
                 if image:
-                    image_directory = "product_images"
-                    if not os.path.exists(image_directory):
-                        os.makedirs(image_directory)
-                    
-                    # Save new image to the local directory
-                    image_path = os.path.join(image_directory, image.name)
-                    with open(image_path, "wb") as f:
-                        f.write(image.getbuffer())
-                else:
-                    # Keep the old image path if no new image is uploaded
-                    image_path = current_image
-
-                # SQL query to update the product details in the database
-                update_query = """
-                    UPDATE vendor_products
-                    SET product_name = %s, category = %s, mrp = %s, discount = %s, image = %s
-                    WHERE product_id = %s  # Changed 'id' to 'product_id'
-                """
-                cursor.execute(update_query, (product_name, category, mrp, discount, image_path, product_id))
-                mydb.commit()
-                st.success(f"Product '{product_name}' has been updated successfully.")
+                    try:
+                        image_path = image_store.save_image(image.getvalue(), image.name)
+                    except image_store.read_errors():
+                        image_saved = False
+                        st.error("The uploaded file is not a readable JPG or PNG image.")
+
+                if image_saved:
+                    # SQL query to update the product details in the database
+                    update_query = """
+                        UPDATE vendor_products
+                        SET product_name = %s, category = %s, mrp = %s, discount = %s, image = %s
+                        WHERE product_id = %s  # Changed 'id' to 'product_id'
+                    """
+                    db.execute(update_query, (product_name, category, mrp, discount, image_path, product_id))
+                    cache.bump("vendor_products")
+                    st.success(f"Product '{product_name}' has been updated successfully.")
     else:
         st.write("No products available to update.")
 
 
-with tab4:
+elif section == 'View Products':
     st.header("Product Catalog - View Products")
 
-    # Retrieve products from the database
-    cursor.execute("SELECT product_name, image FROM vendor_products")
-    products = cursor.fetchall()
+    # Filters and page size are applied in SQL; only the current page is fetched
+    filter_cols = st.columns([2, 3, 1])
+    category_filter = filter_cols[0].selectbox("Category", ["All"] + reference_data.categories(), key="catalog_category")
+    name_search = filter_cols[1].text_input("Search by name", key="catalog_search")
+    page_size = filter_cols[2].selectbox("Per page", catalog.PAGE_SIZES, key="catalog_page_size",
+                                         index=catalog.PAGE_SIZES.index(catalog.CATALOG_PAGE_SIZE))
+    category_filter = None if category_filter == "All" else category_filter
+
+    # Keyset cursors: the last product_id of every page before the current one
+    filters = (category_filter, name_search.strip(), page_size)
+    if st.session_state.get("catalog_filters") != filters:
+        st.session_state.catalog_filters = filters
+        st.session_state.catalog_cursors = [0]
+    cursors = st.session_state.catalog_cursors
+
+    products, has_next = catalog.product_page(cursors[-1], page_size, category_filter, name_search)
 
     if products:
         # Create a grid layout with columns
         for idx, product in enumerate(products):
-            product_name = product[0]
-            product_image = product[1]
+            product_name = product[1]
+            product_image = product[2]
 
             # Create a new row every 3 products
             if idx % 3 == 0:
@@ -153,11 +160,12 @@ with tab4:
             # Display each product in a card-like structure
             with cols[idx % 3]:
                 # Check if product image is a valid local path or a URL
+                thumbnail = image_store.thumbnail(product_image) if product_image and not product_image.startswith("http") else None
                 if product_image:
                     if product_image.startswith("http"):  # If it's a URL
                         st.image(product_image, use_column_width=True)
-                    elif os.path.isfile(product_image):  # If it's a local file
-                        st.image(product_image, use_column_width=True)
+                    elif thumbnail:  # Local file, served as a cached thumbnail
+                        st.image(thumbnail, use_column_width=True)
                     else:  # Handle missing image
                         st.image("https://via.placeholder.com/150?text=No+Image", use_column_width=True)
                         st.write("_Image not available_")
@@ -166,6 +174,49 @@ with tab4:
                     st.write("_Image not available_")
 
                 st.write(f"**{product_name}**")
+
+        matching = catalog.count_products(category_filter, name_search)
+        st.caption(f"Page {len(cursors)} of {max(1, math.ceil(matching / page_size))} ({matching} products)")
+        pager_cols = st.columns([1, 1, 4])
+        if pager_cols[0].button("Previous", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        if pager_cols[1].button("Next", disabled=not has_next):
+            cursors.append(products[-1][0])
+            st.rerun()
     else:
         st.write("No products available to view.")
 
+
+elif section == 'Bulk Import/Export':
+    st.header("Product Catalog - Bulk Import/Export")
+
+    kind = st.radio("Data", ["products", "stock"], horizontal=True)
+    if kind == "products":
+        st.caption("Columns: product_name, category, mrp, discount, image")
+    else:
+        st.caption("Columns: product_id, quantity, minimum_stock, maximum_stock")
+
+    upload = st.file_uploader("Upload CSV or Parquet file", type=["csv", "parquet"])
+    if upload and st.button("Import"):
+        progress_bar = st.progress(0.0, text="Importing...")
+        total_size = max(upload.size, 1)
+
+        def show_progress(report):
+            progress_bar.progress(min(upload.tell() / total_size, 1.0),
+                                  text=f"Read {report.rows_read} rows, written {report.rows_written}, errors {len(report.errors)}")
+
+        report = bulk_io.import_rows(kind, upload, progress=show_progress)
+        progress_bar.progress(1.0, text="Import finished")
+        st.success(f"Imported {report.rows_written} of {report.rows_read} rows.")
+        if report.errors:
+            st.warning(f"{len(report.errors)} rows were rejected.")
+            st.download_button("Download error report", report.error_csv(), file_name=f"{kind}_import_errors.csv",
+                               mime="text/csv")
+
+    export_format = st.selectbox("Export format", ["csv", "parquet"])
+    if st.button("Prepare export"):
+        buffer = io.BytesIO()
+        rows = bulk_io.export_rows(kind, buffer, export_format)
+        st.download_button(f"Download {rows} rows", buffer.getvalue(), file_name=f"{kind}.{export_format}")
+